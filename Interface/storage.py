@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import datetime
 from typing import Dict, List
 
@@ -9,6 +10,8 @@ import streamlit as st
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME   = os.getenv("MONGO_DB", "insightbot")
+ROOT_DIR  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", os.path.join(ROOT_DIR, "data", "embeddings"))
 
 @st.cache_resource(show_spinner=False)
 def get_db():
@@ -146,3 +149,13 @@ def log_event(event_type: str, meta: Dict = None):
             "meta": meta or {},
         }
     )
+
+@st.cache_resource(show_spinner=False)
+def get_embedding_store(model_name: str = "all-MiniLM-L6-v2"):
+    """Read-only, memory-mapped embedding store of the cleaning stage; None if nothing was embedded yet."""
+    sys.path.append(os.path.join(ROOT_DIR, "scripts"))
+    from embedding_store import EmbeddingStore
+    try:
+        return EmbeddingStore(model_name, root=EMBEDDINGS_DIR, readonly=True)
+    except FileNotFoundError:
+        return None
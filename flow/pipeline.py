@@ -2,8 +2,15 @@ from prefect import flow, task
 import subprocess
 
 @task(retries=2, retry_delay_seconds=60)
-def run_script(script_path):
-    subprocess.run(["python", script_path], check=True)
+def run_script(script_path, *args):
+    subprocess.run(["python", script_path, *args], check=True)
+
+@task
+def run_optional(script_path, *args):
+    # helpers and printouts: a non-zero exit is logged, the flow goes on
+    result = subprocess.run(["python", script_path, *args])
+    if result.returncode != 0:
+        print(f"⚠️ {script_path} {' '.join(args)} exited with {result.returncode}; continuing")
 
 @task(retries=2, retry_delay_seconds=60)
 def run_notebook(nb_path, out_path):
@@ -19,14 +26,22 @@ def daily_pipeline():
     
     # 1. Web scraping
     run_script("scripts/web_scraping.py")
+
+    # Model worker: keeps the embedding and enrichment models loaded for the
+    # cleaning stage and the notebook (optional: without it they load the
+    # models in-process)
+    run_optional("scripts/model_server.py", "start")
     
-    # 2. Data cleaning notebook
-    run_notebook("notebooks/data_cleaning.ipynb", 
-                 "notebooks/data_cleaning_out.ipynb")
+    # 2. Data cleaning: only raw rows newer than the last run
+    #    (python scripts/data_cleaning.py --full rebuilds clean_data.csv)
+    run_script("scripts/data_cleaning.py")
     
     # 3. Pattern model notebook
     run_notebook("notebooks/pattern_model.ipynb", 
                  "notebooks/pattern_model_out.ipynb")
+    run_optional("scripts/model_server.py", "stats")
+    run_optional("scripts/model_server.py", "stop")
+    run_optional("scripts/inference_cache.py", "info")
     
     # 4. MongoDB to CSV export
     run_script("scripts/mongo_to_csv.py")
@@ -0,0 +1,288 @@
+# -- coding: utf-8 --
+"""
+Benchmarks of the cleaning stage (scripts/data_cleaning.py) against the
+notebook's former row-wise df.apply code.
+
+--stage similarity (default): add_similarity_scores against the apply that
+called model.encode four times per row.
+
+Two datasets: the report dataset (data/report_data/data.csv, ~1.5k rows) and
+a synthetic one of --rows rows built from it by shuffling and dropping
+sentences, so most texts are distinct. The cleaned columns are cheap
+stand-ins (first four sentences, clean_title) so that only the similarity
+step is timed.
+
+  python scripts/bench_cleaning.py
+  python scripts/bench_cleaning.py --rows 100000 --rowwise-rows 300 --batch-size 256 --sample 0.05
+
+The row-wise baseline runs on the first --rowwise-rows rows only and is
+extrapolated to the full dataset (marked "~"); on the same rows the two
+methods must agree to within --tolerance.
+
+--stage summarize: summarize_texts (per-language tokenizers, capped LSA,
+--workers processes) against the apply that built a parser and summarizer
+per row, on the report dataset's content (--repeat times). English rows
+must give the same summaries.
+
+  python scripts/bench_cleaning.py --stage summarize --workers 1,4
+
+--stage backfill: peak memory of a full rebuild (data_cleaning.py --full)
+over synthetic raw CSVs of --sizes rows, streamed in --chunk-rows chunks
+and, for comparison, loaded as one DataFrame (chunk rows 0). Each run is a
+fresh subprocess; peak RSS comes from wait4 (Linux/macOS).
+
+  python scripts/bench_cleaning.py --stage backfill --sizes 10000,40000,160000 --chunk-rows 5000
+
+--stage normalize: the scripts/text_norm.py functions against the per-row
+code they replaced (two re.sub per title, regex whitespace cleanup, substring
+loop per paragraph), on the raw scrape (data/raw/data.csv, --repeat times).
+Outputs must be identical.
+
+  python scripts/bench_cleaning.py --stage normalize --repeat 20
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import data_cleaning as dc
+import text_norm
+
+CLEANER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cleaning.py")
+REPORT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "report_data", "data.csv")
+RAW_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "raw", "data.csv")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+def lead(text, n=4):
+    return " ".join(_SENTENCE.split(re.sub(r"\s+", " ", text).strip())[:n])
+
+def load_report(path=REPORT_DATA):
+    df = pd.read_csv(path)
+    df = df.dropna(subset=["title", "content"])[["title", "content"]].astype(str).reset_index(drop=True)
+    return with_cleaned(df)
+
+def with_cleaned(df):
+    df["cleaned_content"] = df["content"].map(lead)
+    df["cleaned_title"] = df["title"].map(dc.clean_title)
+    return df
+
+def synthetic(base, rows, seed=0):
+    """`rows` variants of the report rows: sentences shuffled, one in three dropped."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(base), size=rows)
+    titles, contents = [], []
+    for i, p in enumerate(picks):
+        sentences = _SENTENCE.split(base.at[p, "content"])
+        rng.shuffle(sentences)
+        keep = [s for s in sentences if rng.random() > 0.33] or sentences[:1]
+        contents.append(" ".join(keep))
+        titles.append(f"{base.at[p, 'title']} #{i}" if rng.random() < 0.5 else base.at[p, "title"])
+    return with_cleaned(pd.DataFrame({"title": titles, "content": contents}))
+
+def rowwise(df, model):
+    """The notebook's former cell: four single-text encode calls per row."""
+    from sentence_transformers import util
+    out = {}
+    for out_col, (a, b) in dc.SIMILARITY_COLUMNS.items():
+        out[out_col] = df.apply(
+            lambda row: util.cos_sim(
+                model.encode(row[a], convert_to_tensor=True),
+                model.encode(row[b], convert_to_tensor=True)
+            ).item(),
+            axis=1
+        )
+    return pd.DataFrame(out)
+
+def apply_summaries(texts, sentence_count=4):
+    """The notebook's former clean_and_summarize: new parser, tokenizer and summarizer per row, always English."""
+    from sumy.parsers.plaintext import PlaintextParser
+    from sumy.nlp.tokenizers import Tokenizer
+    from sumy.summarizers.lsa import LsaSummarizer
+    out = []
+    for text in texts:
+        cleaned_text = re.sub(r'\s+', ' ', text.replace('\n', ' ')).strip()
+        if len(cleaned_text.split()) < 50:
+            out.append(cleaned_text)
+            continue
+        try:
+            parser = PlaintextParser.from_string(cleaned_text, Tokenizer("english"))
+            summary_sentences = LsaSummarizer()(parser.document, sentence_count)
+            out.append(' '.join([str(sentence) for sentence in summary_sentences]))
+        except Exception:
+            out.append(cleaned_text)
+    return out
+
+def bench_summarize(args):
+    df = pd.read_csv(args.data).dropna(subset=["content"])
+    df = pd.concat([df] * args.repeat, ignore_index=True)
+    texts = df["content"].astype(str).tolist()
+    languages = df["language"].tolist() if "language" in df.columns else dc.detect_languages(texts)
+    print(f"=== summarize: {len(texts)} rows ===")
+
+    t0 = time.perf_counter()
+    ref = apply_summaries(texts)
+    t_ref = time.perf_counter() - t0
+    print(f"  {'row-wise apply':<24} {t_ref:9.1f}s  {len(texts) / t_ref:9.1f} rows/s")
+
+    english = [i for i, lang in enumerate(languages or ["en"] * len(texts)) if lang in ("en", "english")]
+    ok = True
+    for workers in [int(w) for w in args.workers.split(",")]:
+        t0 = time.perf_counter()
+        out = dc.summarize_texts(texts, languages, workers=workers)
+        sec = time.perf_counter() - t0
+        same = sum(out[i] == ref[i] for i in english)
+        ok &= same == len(english)
+        print(f"  {f'summarize_texts x{workers}':<24} {sec:9.1f}s  {len(texts) / sec:9.1f} rows/s  "
+              f"({same}/{len(english)} English rows identical)")
+    return ok
+
+def write_raw_csv(path, base, rows, seed=0):
+    """A synthetic raw-store CSV of `rows` rows, written in slices."""
+    step = 10_000
+    for start in range(0, rows, step):
+        part = synthetic(base, min(step, rows - start), seed + start)[["title", "content"]]
+        part.insert(0, "id", range(start + 1, start + 1 + len(part)))
+        part["source"] = "synthetic"
+        part["url"] = [f"https://example.com/{i}" for i in part["id"]]
+        part["fetched_at"] = "2025-09-09T21:22:01Z"
+        part["t_total_sec"] = 1.0
+        part["h1"] = part["title"]
+        part["h2"] = ""
+        part.to_csv(path, mode="a", index=False, header=start == 0)
+
+def peak_rss_mb(cmd):
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(proc.pid, 0)
+    return usage.ru_maxrss / 1024.0, os.waitstatus_to_exitcode(status)  # KiB on Linux
+
+def bench_backfill(args):
+    base = load_report(args.data)
+    tmp = tempfile.mkdtemp(prefix="bench-backfill-")
+    print(f"{'rows':>9} {'chunk rows':>10} {'peak RSS MB':>12} {'sec':>8}")
+    ok = True
+    for rows in [int(n) for n in args.sizes.split(",")]:
+        raw = os.path.join(tmp, f"raw-{rows}.csv")
+        write_raw_csv(raw, base, rows)
+        for chunk in (args.chunk_rows, 0):
+            out = os.path.join(tmp, f"out-{rows}-{chunk}", "clean_data.csv")
+            t0 = time.perf_counter()
+            rss, code = peak_rss_mb([sys.executable, CLEANER, "--full", "--input", raw, "--out", out,
+                                     "--workers", "1", "--chunk-rows", str(chunk)])
+            ok &= code == 0
+            print(f"{rows:>9} {chunk or 'all':>10} {rss:>12.0f} {time.perf_counter() - t0:>8.1f}"
+                  + ("" if code == 0 else f"  (exit {code})"))
+        os.remove(raw)
+    print(f"Outputs: {tmp}")
+    return ok
+
+def rowwise_title(title):
+    """The notebook's former clean_title."""
+    if not isinstance(title, str):
+        return ""
+    title = re.sub(r'\s*\(.*\)', '', title)
+    title = re.sub(r'\s*(?:\||—|–|:).*', '', title)
+    return title.strip()
+
+def rowwise_whitespace(text):
+    return re.sub(r'\s+', ' ', text.replace('\n', ' ')).strip()
+
+def rowwise_noise(t):
+    """The scraper's former nested is_noise."""
+    low = t.lower()
+    bad = ["copyright", "advertisement", "subscribe", "sign up", "newsletter"]
+    return any(b in low for b in bad)
+
+def bench_normalize(args):
+    df = pd.read_csv(args.data or RAW_DATA, encoding="utf-8-sig")
+    df = pd.concat([df] * args.repeat, ignore_index=True)
+    titles = df["title"]
+    contents = df["content"].dropna().astype(str)
+    paragraphs = pd.Series([p for c in contents for p in c.split("\n\n")])
+    print(f"=== normalize: {len(titles)} titles, {len(contents)} contents, {len(paragraphs)} paragraphs ===")
+    cases = [
+        ("clean_title", titles, lambda s: s.apply(rowwise_title), text_norm.clean_titles),
+        ("whitespace", contents, lambda s: s.apply(rowwise_whitespace), text_norm.normalize_whitespace_column),
+        ("is_noise", paragraphs, lambda s: s.apply(rowwise_noise), text_norm.noise_mask),
+    ]
+    ok = True
+    print(f"  {'':<12} {'per-row s':>10} {'column s':>10} {'speedup':>8}")
+    for name, values, old, new in cases:
+        t0 = time.perf_counter()
+        ref = old(values)
+        t_old = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        out = new(values)
+        t_new = time.perf_counter() - t0
+        same = ref.equals(out)
+        ok &= same
+        print(f"  {name:<12} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new if t_new else 0:>7.1f}x"
+              + ("" if same else f"  MISMATCH ({int((ref != out).sum())} rows)"))
+    return ok
+
+def bench(name, df, model, args):
+    print(f"\n=== {name}: {len(df)} rows ===")
+    n = min(args.rowwise_rows, len(df))
+    head = df.iloc[:n].copy()
+    t0 = time.perf_counter()
+    ref = rowwise(head, model)
+    t_row = (time.perf_counter() - t0) * len(df) / n if n else 0.0
+
+    dc.add_similarity_scores(head, model, batch_size=args.batch_size)
+    err = float(np.nanmax(np.abs(head[list(dc.SIMILARITY_COLUMNS)].to_numpy() - ref.to_numpy()))) if n else 0.0
+
+    t0 = time.perf_counter()
+    dc.add_similarity_scores(df, model, batch_size=args.batch_size)
+    t_batch = time.perf_counter() - t0
+
+    results = [("row-wise apply", t_row, n < len(df)), (f"batched ({args.batch_size})", t_batch, False)]
+    if args.sample:
+        t0 = time.perf_counter()
+        dc.add_similarity_scores(df, model, sample=args.sample, batch_size=args.batch_size)
+        results.append((f"batched, sample={args.sample}", time.perf_counter() - t0, False))
+
+    for label, sec, approx in results:
+        mark = "~" if approx else " "
+        print(f"  {label:<24} {mark}{sec:9.1f}s  {len(df) / sec if sec else 0:9.0f} rows/s")
+    print(f"  max |batched - row-wise| on {n} rows: {err:.2e}" + ("" if err <= args.tolerance else "  MISMATCH"))
+    return err <= args.tolerance
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stage", choices=["similarity", "summarize", "backfill", "normalize"], default="similarity")
+    ap.add_argument("--data", default=None, help="input CSV (default: report dataset; normalize: raw scrape)")
+    ap.add_argument("--rows", type=int, default=100_000, help="size of the synthetic dataset (0 to skip)")
+    ap.add_argument("--rowwise-rows", type=int, default=200)
+    ap.add_argument("--batch-size", type=int, default=dc.ENCODE_BATCH)
+    ap.add_argument("--sample", type=float, default=0.0, help="also time a QA sample (fraction or row count)")
+    ap.add_argument("--tolerance", type=float, default=1e-3)
+    ap.add_argument("--workers", default=f"1,{dc.SUMMARY_WORKERS}", help="summarize: comma-separated worker counts")
+    ap.add_argument("--repeat", type=int, default=1, help="summarize/normalize: repeat the dataset")
+    ap.add_argument("--sizes", default="10000,40000", help="backfill: comma-separated raw row counts")
+    ap.add_argument("--chunk-rows", type=int, default=5000, help="backfill: rows per chunk")
+    args = ap.parse_args(argv)
+    if args.stage == "normalize":
+        return 0 if bench_normalize(args) else 1
+    args.data = args.data or REPORT_DATA
+    if args.stage == "backfill":
+        return 0 if bench_backfill(args) else 1
+    if args.stage == "summarize":
+        return 0 if bench_summarize(args) else 1
+    if args.sample > 1:
+        args.sample = int(args.sample)
+
+    model = dc.get_model()
+    base = load_report(args.data)
+    ok = bench("report dataset", base.copy(), model, args)
+    if args.rows:
+        ok &= bench("synthetic", synthetic(base, args.rows), model, args)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
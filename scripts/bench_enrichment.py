@@ -0,0 +1,192 @@
+# -- coding: utf-8 --
+"""
+Benchmarks of the enrichment models (scripts/enrichment.py) against the
+notebook's former row-wise df.apply code.
+
+--stage context (default): classify_context against the apply that called
+the zero-shot pipeline once per article. Runs on the first --rows rows of the
+cleaned data (data/cleaned_data/clean_data.csv, whose content is the
+4-sentence summary the notebook classifies), for each of --batch-sizes, both
+length-sorted and in input order. Batched labels must match the per-row ones;
+the largest score difference is reported.
+
+  python scripts/bench_enrichment.py --rows 300 --batch-sizes 8,16,32
+
+--stage backends: each enrichment model (--models context,headline,sentiment)
+on every inference backend available here (scripts/inference_backend.py):
+load time, single-article latency (median over --latency-rows calls),
+batched throughput over --rows rows, and agreement with the torch backend's
+output (same label / same headline; context also reports the largest score
+difference). The ONNX export runs on first use and is not timed.
+
+  python scripts/bench_enrichment.py --stage backends --rows 200 --models context,sentiment
+
+--stage language: scripts/lang_id.py against the notebook's former
+df['content'].apply(detect) on --rows rows (default every row of
+--data): time of each, agreement with seeded langdetect overall and per
+language, how many rows each rule decided, and whether unseeded langdetect
+gives the same answers twice.
+
+  python scripts/bench_enrichment.py --stage language --data data/report_data/data.csv
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import enrichment as en
+import inference_backend as ib
+import lang_id
+
+CLEAN_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "cleaned_data", "clean_data.csv")
+
+def load_texts(path, rows):
+    df = pd.read_csv(path)
+    return df["content"].astype(str).head(rows or None).reset_index(drop=True)
+
+def rowwise_context(texts, classifier, labels):
+    """The notebook's former cell, keeping the full result for the score comparison."""
+    return [classifier(text, candidate_labels=labels) for text in texts]
+
+def score_gap(ref, out, labels):
+    return max((abs(dict(zip(r["labels"], r["scores"]))[label] - s[label])
+                for r, s in zip(ref, out["context_scores"]) for label in labels), default=0.0)
+
+def bench_context(args):
+    texts = load_texts(args.data, args.rows)
+    classifier = en.get_classifier(args.model)
+    labels = en.CONTEXT_LABELS
+    lengths = en.token_lengths(texts, classifier.tokenizer)
+    print(f"=== context: {len(texts)} rows, {args.model}, device {classifier.device} ===")
+    print(f"  tokens per article: median {int(np.median(lengths))}, max {int(lengths.max())}")
+
+    t0 = time.perf_counter()
+    ref = rowwise_context(texts, classifier, labels)
+    t_ref = time.perf_counter() - t0
+    ref_best = [r["labels"][0] for r in ref]
+    print(f"  {'row-wise apply':<24} {t_ref:9.1f}s  {len(texts) / t_ref:7.2f} rows/s")
+
+    ok = True
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        for sort in (True, False):
+            t0 = time.perf_counter()
+            out = en.classify_context(texts, classifier, labels, batch_size=batch_size, sort=sort)
+            sec = time.perf_counter() - t0
+            same = sum(a == b for a, b in zip(ref_best, out["context"]))
+            gap = score_gap(ref, out, labels)
+            ok &= same == len(texts) and gap <= args.tolerance
+            label = f"batch {batch_size}" + (", sorted" if sort else "")
+            print(f"  {label:<24} {sec:9.1f}s  {len(texts) / sec:7.2f} rows/s  {t_ref / sec:5.2f}x  "
+                  f"labels {same}/{len(texts)}, max score diff {gap:.1e}")
+    return ok
+
+def _run(kind, texts, pipe, batch_size):
+    if kind == "context":
+        return en.classify_context(texts, pipe, batch_size=batch_size)
+    if kind == "headline":
+        return en.headlines(texts, pipe, batch_size=batch_size)
+    return en.classify_sentiment(texts, pipe, batch_size=batch_size)
+
+def _agreement(kind, ref, out):
+    if kind == "context":
+        same = int((ref["context"] == out["context"]).sum())
+        gap = max((abs(a[k] - b[k]) for a, b in zip(ref["context_scores"], out["context_scores"]) for k in a),
+                  default=0.0)
+        return f"labels {same}/{len(out)} ({same / len(out):.1%}), max score diff {gap:.3f}"
+    same = sum(a == b for a, b in zip(ref, out))
+    return f"{'headlines' if kind == 'headline' else 'labels'} {same}/{len(out)} ({same / len(out):.1%})"
+
+def bench_backends(args):
+    texts = load_texts(args.data, args.rows)
+    models = {"context": ("zero-shot-classification", args.model),
+              "headline": ("summarization", args.summary_model),
+              "sentiment": ("sentiment-analysis", args.sentiment_model)}
+    backends = ["torch"] + (["onnx-int8"] if ib.onnx_available() else [])
+    print(f"=== backends: {len(texts)} rows; cuda {'yes' if ib.has_cuda() else 'no'}; auto -> {ib.select_backend('auto')} ===")
+    print(f"  {'model':<10} {'backend':<10} {'load s':>7} {'latency ms':>11} {'rows/s':>8}  agreement with torch")
+    for kind in args.models.split(","):
+        task, name = models[kind]
+        batch_size = en.GENERATE_BATCH if kind == "headline" else en.CLASSIFY_BATCH
+        ref = None
+        for backend in backends:
+            if backend == "onnx-int8":
+                ib.export_onnx(name, task)
+            t0 = time.perf_counter()
+            pipe = ib.load_pipeline(task, name, backend)
+            t_load = time.perf_counter() - t0
+            single = []
+            for text in texts[:args.latency_rows]:
+                t0 = time.perf_counter()
+                _run(kind, [text], pipe, 1)
+                single.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            out = _run(kind, texts, pipe, batch_size)
+            sec = time.perf_counter() - t0
+            agree = "(reference)" if ref is None else _agreement(kind, ref, out)
+            ref = out if ref is None else ref
+            print(f"  {kind:<10} {backend:<10} {t_load:>7.1f} {1000 * np.median(single):>11.0f} "
+                  f"{len(texts) / sec:>8.2f}  {agree}")
+            del pipe
+    return True
+
+def bench_language(args):
+    from langdetect import DetectorFactory
+    texts = [str(t) for t in load_texts(args.data, args.rows)]
+    print(f"=== language: {len(texts)} rows ===")
+
+    def langdetect_all(seed):
+        DetectorFactory.seed = seed
+        t0 = time.perf_counter()
+        out = [lang_id.langdetect_language(t) for t in texts]
+        return out, time.perf_counter() - t0
+
+    unseeded, t_ref = langdetect_all(None)
+    unseeded_again, _ = langdetect_all(None)
+    seeded, t_seeded = langdetect_all(0)
+    lang_id.script_histogram(texts[:1])  # lookup table built once per process, not timed
+    t0 = time.perf_counter()
+    codes, methods = lang_id.identify(texts)
+    sec = time.perf_counter() - t0
+    again, _ = lang_id.identify(texts)
+
+    print(f"  {'langdetect, unseeded':<24} {t_ref:8.2f}s  {len(texts) / t_ref:9.0f} rows/s  "
+          f"same answers twice: {sum(a == b for a, b in zip(unseeded, unseeded_again))}/{len(texts)}")
+    print(f"  {'langdetect, seed 0':<24} {t_seeded:8.2f}s  {len(texts) / t_seeded:9.0f} rows/s")
+    print(f"  {'lang_id':<24} {sec:8.2f}s  {len(texts) / sec:9.0f} rows/s  {t_ref / sec:6.1f}x  "
+          f"same answers twice: {sum(a == b for a, b in zip(codes, again))}/{len(texts)}")
+    print("  decided by: " + ", ".join(f"{m} {int((methods == m).sum())}" for m in lang_id.METHODS))
+    same = sum(a == b for a, b in zip(codes, seeded))
+    print(f"  agreement with seeded langdetect: {same}/{len(texts)} ({same / len(texts):.1%})")
+    for code in pd.Series(seeded).value_counts().index:
+        rows = [i for i, c in enumerate(seeded) if c == code]
+        same = sum(codes[i] == code for i in rows)
+        print(f"    {code:<4} {same:>6}/{len(rows):<6}")
+    for i in [i for i, (a, b) in enumerate(zip(codes, seeded)) if a != b][:10]:
+        print(f"    row {i}: lang_id {codes[i]} ({methods[i]}), langdetect {seeded[i]}: {texts[i][:70]!r}")
+    return True
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stage", choices=["context", "backends", "language"], default="context")
+    ap.add_argument("--data", default=CLEAN_DATA)
+    ap.add_argument("--rows", type=int, default=200, help="0: every row")
+    ap.add_argument("--model", default=en.CONTEXT_MODEL)
+    ap.add_argument("--batch-sizes", default=f"4,{en.CLASSIFY_BATCH},32", help="articles per batch, comma-separated")
+    ap.add_argument("--tolerance", type=float, default=1e-4)
+    ap.add_argument("--models", default="context,headline,sentiment", help="backends: comma-separated")
+    ap.add_argument("--summary-model", default=en.SUMMARY_MODEL)
+    ap.add_argument("--sentiment-model", default=en.SENTIMENT_MODEL)
+    ap.add_argument("--latency-rows", type=int, default=20, help="backends: single-article calls timed")
+    args = ap.parse_args(argv)
+    if args.stage == "backends":
+        return 0 if bench_backends(args) else 1
+    if args.stage == "language":
+        return 0 if bench_language(args) else 1
+    return 0 if bench_context(args) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
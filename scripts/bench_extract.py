@@ -0,0 +1,183 @@
+# -- coding: utf-8 --
+"""
+Micro-benchmark and parity check: BeautifulSoup reference functions vs the
+single-parse lxml engine (page_extract.py).
+
+A corpus is a directory of saved pages plus an index.jsonl with one
+{"file": ..., "url": ...} line per page. Build one from URLs already in the
+raw store, then run the benchmark over it:
+
+  python scripts/bench_extract.py --fetch 200 corpus/
+  python scripts/bench_extract.py corpus/ [--repeat 3]
+
+Reports pages/second for both engines and lists pages where the extracted
+fields (article check, title, content, h1, h2) differ. With --workers the
+ParsePool is measured too: fetch threads hand raw bytes to 1, 2, 4, ...
+parser processes, against the same threads parsing in-process (GIL-bound):
+
+  python scripts/bench_extract.py corpus/ --workers 1,2,4,8
+
+Workers use the engine chosen by SCRAPE_PARSER (bs4 by default, the
+CPU-heavy case; lxml is opt-in).
+
+The parity check also runs MALFORMED_PAGES, small articles with the broken
+markup real sites serve (unclosed <p>, block elements inside <p>), on which
+html.parser and libxml2 build different trees. Where the fields differ as
+documented in page_extract.py (KNOWN_DIVERGENCES) the case is listed as a
+known divergence; other differences are listed as unexpected. Only corpus
+mismatches make the exit status non-zero.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import page_extract
+import web_scraping as ws
+from parse_pool import ParsePool
+from raw_store import RawStore
+
+_P = "<p>Paragraph {} of the malformed test article, long enough to be kept as body text.</p>"
+_HEAD = ('<html><head><meta property="og:type" content="article"><meta property="og:title" content="Malformed">'
+         "</head><body>")
+
+def _paras(*nums, close=True):
+    return "".join((_P if close else _P[:-4]).format(n) for n in nums)
+
+# name -> page; og:type=article, so both engines treat them as articles
+MALFORMED_PAGES = {
+    "unclosed <p>": _HEAD + "<article><h1>H</h1>" + _paras(0, 1, 2, 3, close=False) + "</article></body></html>",
+    "<div> inside <p>": _HEAD + "<article><h1>H</h1><p>" + _paras(0, close=False)[3:] + "<div>"
+                        + _paras(1, close=False)[3:] + "</div> tail text</p>" + _paras(2) + "</article></body></html>",
+    "<ul> inside <p>": _HEAD + "<article><h1>H</h1><p>" + _paras(0, close=False)[3:] + "<ul><li>"
+                       + _paras(1, close=False)[3:] + "</li></ul> tail text</p></article></body></html>",
+    "<h2> inside <p>": _HEAD + "<p>" + _paras(0, close=False)[3:] + "<h2>Section</h2>" + _paras(1, close=False)[3:]
+                       + "</p>" + _paras(2) + "</body></html>",
+    "unclosed <h1>": _HEAD + "<article><h1>Headline" + _paras(0, 1, 2) + "</article></body></html>",
+    "unclosed <p> in <div>": _HEAD + "<div>" + _paras(0, close=False) + "<div>" + _paras(1, close=False)
+                             + "</div>" + _paras(2, close=False)[3:] + "</div></body></html>",
+    "<p> in table cells": _HEAD + "<table><tr><td>" + _paras(0, close=False) + "</td><td>" + _paras(1, close=False)
+                          + "</table></body></html>",
+}
+
+# case -> fields in which the engines are documented to differ (page_extract.py)
+KNOWN_DIVERGENCES = {
+    "unclosed <p>": {"content"},
+    "<div> inside <p>": {"content"},
+    "<ul> inside <p>": {"content"},
+    "<h2> inside <p>": {"content"},
+    "unclosed <h1>": {"h1"},
+    "unclosed <p> in <div>": {"content"},
+}
+
+def build_corpus(out_dir, n, seed=0):
+    os.makedirs(out_dir, exist_ok=True)
+    urls = [r["url"] for r in RawStore(ws.RAW_DIR).iter_rows() if r["url"]]
+    random.Random(seed).shuffle(urls)
+    session = ws.make_session()
+    saved = 0
+    with open(os.path.join(out_dir, "index.jsonl"), "a", encoding="utf-8") as idx:
+        for u in urls:
+            if saved >= n:
+                break
+            try:
+                r = session.get(u, timeout=ws.TIMEOUT, headers=ws.domain_headers(u))
+            except Exception:
+                continue
+            if r.status_code != 200 or "text/html" not in r.headers.get("Content-Type", ""):
+                continue
+            fn = f"{saved:05d}.html"
+            with open(os.path.join(out_dir, fn), "w", encoding="utf-8") as f:
+                f.write(r.text)
+            idx.write(json.dumps({"file": fn, "url": u}) + "\n")
+            saved += 1
+            print(f"[{saved}/{n}] {u}")
+    return saved
+
+def load_corpus(corpus_dir):
+    pages = []
+    with open(os.path.join(corpus_dir, "index.jsonl"), encoding="utf-8") as idx:
+        for line in idx:
+            e = json.loads(line)
+            with open(os.path.join(corpus_dir, e["file"]), encoding="utf-8") as f:
+                pages.append((e["url"], f.read()))
+    return pages
+
+def run(engine, pages, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = [engine(html, url) for url, html in pages]
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, out
+
+def run_threads(parse, bodies, threads):
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda b: parse(b[1], "utf-8", b[0]), bodies))
+    return time.perf_counter() - t0
+
+def bench_pool(pages, workers_list):
+    bodies = [(url, html.encode("utf-8")) for url, html in pages]
+    threads = 2 * max(workers_list)
+    t = run_threads(ws.parse_body, bodies, threads)
+    print(f"in-thread parse, {threads} fetch threads: {len(bodies) / t:8.1f} pages/s")
+    for w in workers_list:
+        with ParsePool(w) as pool:
+            run_threads(pool.analyze, bodies[: 2 * w], threads)  # start the workers
+            t = run_threads(pool.analyze, bodies, threads)
+        print(f"ParsePool {w:>2} processes           : {len(bodies) / t:8.1f} pages/s")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("corpus")
+    ap.add_argument("--fetch", type=int, default=0, help="first download N pages from stored article URLs")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workers", default="", help="comma-separated parser process counts, e.g. 1,2,4")
+    args = ap.parse_args(argv)
+
+    if args.fetch:
+        build_corpus(args.corpus, args.fetch)
+    pages = load_corpus(args.corpus)
+    mb = sum(len(h) for _, h in pages) / 1e6
+    print(f"Corpus: {len(pages)} pages, {mb:.1f} MB")
+
+    t_ref, ref = run(ws.analyze_page_bs4, pages, args.repeat)
+    t_new, new = run(page_extract.analyze_page, pages, args.repeat)
+    print(f"bs4 html.parser : {len(pages) / t_ref:8.1f} pages/s")
+    print(f"lxml single-pass: {len(pages) / t_new:8.1f} pages/s  ({t_ref / t_new:.1f}x)")
+
+    if args.workers:
+        bench_pool(pages, [int(w) for w in args.workers.split(",")])
+
+    mismatches = [(url, a, b) for (url, _), a, b in zip(pages, ref, new) if a != b]
+    print(f"Parity: {len(pages) - len(mismatches)}/{len(pages)} pages identical")
+    for url, a, b in mismatches[:20]:
+        print(f"  differs [{', '.join(_differing(a, b))}] {url}")
+
+    malformed = [(name, ws.analyze_page_bs4(html, "https://example.com/news/malformed"),
+                  page_extract.analyze_page(html, "https://example.com/news/malformed"))
+                 for name, html in MALFORMED_PAGES.items()]
+    identical = known = 0
+    for name, a, b in malformed:
+        fields = _differing(a, b) if a != b else []
+        if not fields:
+            identical += 1
+        elif set(fields) <= KNOWN_DIVERGENCES.get(name, set()):
+            known += 1
+            print(f"  known divergence [{', '.join(fields)}] {name}")
+        else:
+            print(f"  unexpected [{', '.join(fields)}] {name}")
+    print(f"Malformed markup: {identical}/{len(malformed)} cases identical, {known} known divergences")
+    return 0 if not mismatches else 1
+
+def _differing(a, b):
+    return ["is_article"] if (a is None) != (b is None) else [k for k in a if a[k] != b[k]]
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+# -- coding: utf-8 --
+"""
+End-to-end scraper benchmark on a recorded corpus (see replay.py).
+
+Starts the replay stand-in, then runs `web_scraping.py` once per mode in a
+fresh subprocess with an empty data directory (a cold run: no stored URLs,
+no feed cache, no learned strategies) and reports, per mode:
+
+  articles/sec       articles stored / crawl time (from the run's metrics file)
+  requests/article   requests the stand-in served / articles stored
+  peak RSS           of the scraper process (largest single process when
+                     parse workers are used)
+
+  python scripts/bench_scraper.py corpus/run1.jsonl.gz
+  python scripts/bench_scraper.py corpus/*.jsonl.gz --modes sequential,concurrent --latency-ms 80 --error-rate 0.02
+
+The politeness delay is real time; --delay overrides REQUEST_DELAY_SEC for
+all modes (e.g. 0 to measure the pipeline itself).
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRAPER = os.path.join(HERE, "web_scraping.py")
+REPLAY = os.path.join(HERE, "replay.py")
+
+MODES = {
+    "sequential-lxml": {"SCRAPE_MODE": "sequential", "SCRAPE_PARSER": "lxml"},
+    "sequential": {"SCRAPE_MODE": "sequential"},
+    "concurrent": {"SCRAPE_MODE": "concurrent"},
+    "concurrent-pool": {"SCRAPE_MODE": "concurrent", "SCRAPE_PARSE_WORKERS": str(os.cpu_count() or 2)},
+}
+
+def stats(base, reset=False):
+    with urllib.request.urlopen(f"{base}/__stats__" + ("?reset=1" if reset else ""), timeout=5) as r:
+        return json.loads(r.read())
+
+def start_replay(args):
+    cmd = [sys.executable, REPLAY, "serve", *args.corpus, "--port", str(args.port),
+           "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+           "--error-rate", str(args.error_rate), "--throttle", str(args.throttle)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    print(proc.stdout.readline().strip())
+    base = f"http://127.0.0.1:{args.port}"
+    for _ in range(50):
+        try:
+            stats(base)
+            return proc, base
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit("replay server did not start")
+
+def run_mode(name, overrides, base, args, log_dir):
+    data_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    env = dict(os.environ, SCRAPE_REPLAY=base, SCRAPE_RAW_DIR=data_dir, **overrides)
+    env.pop("SCRAPE_RECORD", None)
+    if args.delay is not None:
+        env["SCRAPE_REQUEST_DELAY"] = str(args.delay)
+    stats(base, reset=True)
+    with open(os.path.join(log_dir, f"{name}.log"), "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, SCRAPER], env=env, stdout=log, stderr=subprocess.STDOUT)
+        rss_mb = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            rss_mb = usage.ru_maxrss / 1024.0  # KiB on Linux
+        else:
+            proc.wait()
+        wall = time.perf_counter() - t0
+    served = stats(base)
+    metrics_files = sorted(glob.glob(os.path.join(data_dir, "state", "metrics", "*.json")))
+    metrics = {}
+    if metrics_files:
+        with open(metrics_files[-1], encoding="utf-8") as f:
+            metrics = json.load(f)
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+    articles = metrics.get("articles", 0)
+    crawl = metrics.get("elapsed_sec") or wall
+    return {
+        "mode": name,
+        "exit": proc.returncode,
+        "articles": articles,
+        "crawl_sec": round(crawl, 2),
+        "wall_sec": round(wall, 2),
+        "articles_per_sec": round(articles / crawl, 3) if crawl else 0.0,
+        "requests": served.get("requests", 0),
+        "requests_per_article": round(served.get("requests", 0) / articles, 2) if articles else None,
+        "peak_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "server": served,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("corpus", nargs="+", help="recorded corpus file(s) (*.jsonl.gz)")
+    ap.add_argument("--modes", default=",".join(MODES), help=f"comma-separated, from: {', '.join(MODES)}")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--throttle", type=float, default=0.0)
+    ap.add_argument("--delay", type=float, default=None, help="override REQUEST_DELAY_SEC")
+    ap.add_argument("--out", default="", help="also write the results as JSON")
+    args = ap.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        ap.error(f"unknown mode(s): {', '.join(unknown)}")
+
+    log_dir = tempfile.mkdtemp(prefix="bench-logs-")
+    server, base = start_replay(args)
+    results = []
+    try:
+        for name in modes:
+            print(f"--- {name} ...", flush=True)
+            results.append(run_mode(name, MODES[name], base, args, log_dir))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"\n{'mode':<16} {'articles':>8} {'crawl s':>8} {'art/s':>7} {'req/art':>8} {'RSS MB':>7}")
+    for r in results:
+        rpa = f"{r['requests_per_article']:.2f}" if r["requests_per_article"] is not None else "-"
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+        flag = "" if r["exit"] == 0 else f"  (exit {r['exit']})"
+        print(f"{r['mode']:<16} {r['articles']:>8} {r['crawl_sec']:>8.1f} {r['articles_per_sec']:>7.2f} {rpa:>8} {rss:>7}{flag}")
+    print(f"Logs: {log_dir}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    return 0 if all(r["exit"] == 0 for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,468 @@
+# -- coding: utf-8 --
+"""
+Cleaning stage for scraped articles (used by notebooks/data_cleaning.ipynb).
+
+  clean_and_summarize   whitespace cleanup + LSA summary of the content
+  summarize_texts       clean_and_summarize over a whole column, in worker processes
+  detect_languages      language of each row, which picks its summarization tokenizer
+  clean_title           strips "(...)" and " | Site" / " — Section" / ": ..." tails from titles
+                        (clean_titles for a column; both from scripts/text_norm.py)
+  add_similarity_scores semantic similarity of original vs cleaned text
+
+The similarity check embeds each text column with one batched
+SentenceTransformer.encode call instead of encoding row by row: the texts of
+a column pair (e.g. title and cleaned_title) are de-duplicated, encoded in
+batches of ENCODE_BATCH with normalized embeddings, and the per-row cosine
+similarity is then a row-wise dot product over the two embedding matrices.
+Titles that cleaning left unchanged are encoded once and score 1.0.
+
+Summarization reuses one sumy Tokenizer per language and one LsaSummarizer
+per process instead of building them for every row, picks the tokenizer from
+the row's language (English when sumy has none for it, as before), and caps
+the LSA sentence matrix at MAX_SENTENCES: the SVD grows with the square of
+the sentence count, so very long articles are summarized from their first
+MAX_SENTENCES sentences. Below the cap, English output is the same as the
+original per-row function. summarize_texts() splits a column into chunks of
+SUMMARY_CHUNK rows for a process pool; results keep the input order. Raw
+rows carry no language (the scraper does not record one), so
+detect_languages() tells it from the content with scripts/lang_id.py first.
+
+For QA on large inputs, `sample` scores only a random subset of rows (a
+fraction or a row count); the other rows get NaN.
+
+With an EmbeddingStore (scripts/embedding_store.py) passed as `store`, the
+vectors are kept: texts embedded on an earlier run are looked up instead of
+encoded again, and later stages can reuse them.
+
+Run as a script it is the pipeline's incremental cleaning stage: raw rows
+past the watermark (raw store id, or fetched_at for rows without one) are
+deduplicated against the hashes of everything cleaned before, summarized and
+appended to data/cleaned_data/clean_data.csv; see CleanState.
+
+  python scripts/data_cleaning.py            # new rows only
+  python scripts/data_cleaning.py --full     # backfill: rebuild from all raw rows
+  python scripts/data_cleaning.py --input data/raw/data1.csv --qa-sample 0.1
+
+Benchmark: scripts/bench_cleaning.py.
+"""
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import lang_id
+from embedding_store import EmbeddingStore
+from model_server import connect
+from raw_store import RawStore
+from text_norm import clean_title, clean_titles, normalize_whitespace
+from url_index import url_hash
+
+try:
+    from sumy.parsers.plaintext import PlaintextParser
+    from sumy.nlp.tokenizers import Tokenizer
+    from sumy.summarizers.lsa import LsaSummarizer
+    from sumy.models.dom import ObjectDocumentModel, Paragraph
+except ImportError:
+    PlaintextParser = Tokenizer = LsaSummarizer = ObjectDocumentModel = Paragraph = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+MODEL_NAME = os.getenv("CLEAN_MODEL", "all-MiniLM-L6-v2")
+ENCODE_BATCH = int(os.getenv("CLEAN_ENCODE_BATCH", "128"))
+MAX_SENTENCES = int(os.getenv("CLEAN_MAX_SENTENCES", "150"))
+SUMMARY_WORKERS = int(os.getenv("CLEAN_SUMMARY_WORKERS", str(os.cpu_count() or 1)))
+SUMMARY_CHUNK = 64
+RAW_DIR = os.getenv("SCRAPE_RAW_DIR", r"./data/raw")
+CLEAN_CSV = os.getenv("CLEAN_CSV", r"./data/cleaned_data/clean_data.csv")
+
+# language codes (scripts/lang_id.py) -> sumy tokenizer languages
+SUMY_LANGUAGES = {
+    "en": "english", "ar": "arabic", "ru": "russian", "uk": "ukrainian", "de": "german",
+    "fr": "french", "es": "spanish", "it": "italian", "pt": "portuguese", "nl": "dutch",
+    "cs": "czech", "sk": "slovak", "pl": "polish", "sv": "swedish", "da": "danish",
+    "no": "norwegian", "fi": "finnish", "tr": "turkish", "el": "greek", "he": "hebrew",
+    "zh": "chinese", "ja": "japanese", "ko": "korean", "th": "thai",
+}
+
+# Column pairs scored by add_similarity_scores: output column -> (original, cleaned)
+SIMILARITY_COLUMNS = {
+    "similarity_score_between_content_&_cleanedContent": ("content", "cleaned_content"),
+    "similarity_score_between_Title_&_Title": ("title", "cleaned_title"),
+}
+
+# ----------------------------------------------------
+# TEXT CLEANING
+_tokenizers = {}
+_summarizer = None
+
+def get_tokenizer(language="english"):
+    """Cached sumy Tokenizer for a language name or code; English when sumy cannot tokenize it."""
+    language = SUMY_LANGUAGES.get(str(language).lower(), str(language).lower())
+    if language not in _tokenizers:
+        try:
+            tokenizer = Tokenizer(language)
+            tokenizer.to_words(tokenizer.to_sentences("Probe sentence.")[0])  # optional deps fail on first use
+            _tokenizers[language] = tokenizer
+        except Exception:
+            _tokenizers[language] = get_tokenizer("english") if language != "english" else Tokenizer("english")
+    return _tokenizers[language]
+
+def get_summarizer():
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = LsaSummarizer()
+    return _summarizer
+
+def clean_and_summarize(text, sentence_count=4, language="english"):
+    """
+    Cleans text by removing newlines and other artifacts, then summarizes it.
+
+    Args:
+        text (str): The raw text content to be processed.
+        sentence_count (int): The desired number of sentences in the summary.
+        language (str): Language name or code, picks the sentence/word tokenizer.
+
+    Returns:
+        str: A cleaned and summarized version of the text.
+    """
+    if not isinstance(text, str):
+        # Handle potential non-string values in the column
+        return ""
+
+    # 1. Clean the text
+    cleaned_text = normalize_whitespace(text)
+
+    # If the text is too short, return it as is to avoid errors
+    if len(cleaned_text.split()) < 50:
+        return cleaned_text
+
+    # 2. Summarize the cleaned text
+    try:
+        parser = PlaintextParser.from_string(cleaned_text, get_tokenizer(language))
+        document = parser.document
+        if len(document.sentences) > MAX_SENTENCES:
+            document = ObjectDocumentModel([Paragraph(list(document.sentences[:MAX_SENTENCES]))])
+        summary_sentences = get_summarizer()(document, sentence_count)
+        summary = ' '.join([str(sentence) for sentence in summary_sentences])
+        return summary
+    except Exception as e:
+        # In case of any summarization error, return the cleaned text
+        print(f"Summarization error: {e}")
+        return cleaned_text
+
+def detect_languages(texts):
+    """
+    Language code of each text for picking its tokenizer (scripts/lang_id.py).
+    Without langdetect only the script rules run; the texts they leave
+    undecided get None, i.e. the English tokenizer.
+    """
+    return lang_id.detect_languages(texts, fallback=lang_id.detect is not None)
+
+def _summarize_chunk(texts, languages, sentence_count):
+    return [clean_and_summarize(t, sentence_count, lang) for t, lang in zip(texts, languages)]
+
+def summarize_texts(texts, languages=None, sentence_count=4, workers=SUMMARY_WORKERS, chunk_size=SUMMARY_CHUNK,
+                    pool=None):
+    """
+    clean_and_summarize over `texts` (per-text `languages`, default English),
+    in `workers` processes (or on an existing `pool`); workers <= 1 runs in
+    this process.
+    """
+    texts = list(texts)
+    languages = ["english"] * len(texts) if languages is None else [
+        lang if isinstance(lang, str) and lang else "english" for lang in languages]
+    if (pool is None and workers <= 1) or len(texts) <= chunk_size:
+        return _summarize_chunk(texts, languages, sentence_count)
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return summarize_texts(texts, languages, sentence_count, workers, chunk_size, pool)
+    starts = range(0, len(texts), chunk_size)
+    out = []
+    for part in pool.map(_summarize_chunk, [texts[i:i + chunk_size] for i in starts],
+                         [languages[i:i + chunk_size] for i in starts], [sentence_count] * len(starts)):
+        out.extend(part)
+    return out
+
+# ----------------------------------------------------
+# SEMANTIC SIMILARITY
+@lru_cache(maxsize=None)
+def get_model(name=MODEL_NAME):
+    if SentenceTransformer is None:
+        raise RuntimeError("sentence-transformers is not installed: pip install sentence-transformers")
+    return SentenceTransformer(name)
+
+def encode_unique(texts, model, batch_size=ENCODE_BATCH, store=None):
+    """
+    Embed `texts` with one encode call over their distinct values (through
+    `store` when given, so only texts it does not hold are encoded).
+
+    Returns (embeddings, inverse): unit-length float32 rows for the distinct
+    texts, and for every input text the row of its embedding.
+    """
+    inverse, uniq = pd.factorize(pd.Series(list(texts), dtype=object).astype(str))
+    if store is not None:
+        return store.encode(list(uniq), model, batch_size), inverse
+    emb = model.encode(list(uniq), batch_size=batch_size, convert_to_numpy=True,
+                       normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(emb, dtype=np.float32), inverse
+
+def pair_similarity(a, b, model, batch_size=ENCODE_BATCH, store=None):
+    """Cosine similarity of a[i] and b[i] for every i, as a float32 array."""
+    a, b = list(a), list(b)
+    emb, inverse = encode_unique(a + b, model, batch_size, store)
+    ea, eb = emb[inverse[:len(a)]], emb[inverse[len(a):]]
+    return np.einsum("ij,ij->i", ea, eb)  # embeddings are normalized: dot product = cosine
+
+def sample_index(index, sample=None, seed=0):
+    """All of `index`, or a random subset: `sample` is a fraction (0..1] or a row count."""
+    if sample is None:
+        return index
+    n = int(round(len(index) * sample)) if isinstance(sample, float) and sample <= 1.0 else int(sample)
+    n = max(0, min(n, len(index)))
+    rng = np.random.default_rng(seed)
+    return index[np.sort(rng.choice(len(index), size=n, replace=False))]
+
+def add_similarity_scores(df, model=None, sample=None, seed=0, batch_size=ENCODE_BATCH,
+                          columns=SIMILARITY_COLUMNS, store=None):
+    """
+    Add one similarity column per (original, cleaned) pair in `columns`
+    (by default the notebook's content and title scores). With `sample`,
+    only a random subset of rows is scored and the rest stay NaN.
+    """
+    model = model if model is not None else get_model()
+    rows = sample_index(df.index, sample, seed)
+    for out_col, (orig_col, clean_col) in columns.items():
+        scores = pd.Series(np.nan, index=df.index, dtype="float32")
+        if len(rows):
+            part = df.loc[rows]
+            scores.loc[rows] = pair_similarity(part[orig_col].astype(str), part[clean_col].astype(str),
+                                               model, batch_size, store)
+        df[out_col] = scores
+    return df
+
+# ----------------------------------------------------
+# INCREMENTAL STAGE
+class CleanState:
+    """
+    Watermark and dedup history of the incremental stage (<clean dir>/state):
+
+      watermark.json  max raw id / fetched_at processed so far, committed size
+                      of the output CSV and number of committed hashes
+      hashes.u64      64-bit hashes of the titles, contents and h1s of every
+                      row that survived each dedup step, append-only
+
+    Every chunk appends to the output CSV, then to hashes.u64, then replaces
+    watermark.json with the new sizes; the id / fetched_at marks only move
+    when the whole run is done. At open both files are cut back to the sizes
+    the watermark records. A run that dies is therefore simply run again:
+    rows of its committed chunks are dropped as duplicates of themselves, the
+    rest are cleaned.
+
+    The hashes are the only state that grows with the history, at 8 bytes
+    per kept key, kept as one sorted array for vectorized lookups.
+    """
+    def __init__(self, state_dir, out_csv):
+        self.dir = state_dir
+        self.out_csv = out_csv
+        self.watermark_path = os.path.join(state_dir, "watermark.json")
+        self.hash_path = os.path.join(state_dir, "hashes.u64")
+        os.makedirs(state_dir, exist_ok=True)
+        self.watermark = {"max_id": 0, "max_fetched_at": "", "out_bytes": 0, "hashes": 0, "rows": 0}
+        if os.path.isfile(self.watermark_path):
+            with open(self.watermark_path, "r", encoding="utf-8") as f:
+                self.watermark.update(json.load(f))
+        for path, size in ((out_csv, self.watermark["out_bytes"]), (self.hash_path, self.watermark["hashes"] * 8)):
+            if os.path.isfile(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+        known = np.fromfile(self.hash_path, dtype="<u8") if os.path.isfile(self.hash_path) else np.zeros(0, "<u8")
+        self._known = np.unique(known)
+        self._new = []
+
+    def is_new(self, df):
+        """Rows past the watermark: id above max_id, or fetched_at above max_fetched_at for rows without id."""
+        ids = pd.to_numeric(df["id"], errors="coerce")
+        fetched = df["fetched_at"].astype(str) if "fetched_at" in df.columns else pd.Series("", index=df.index)
+        return (ids > self.watermark["max_id"]) | (ids.isna() & (fetched > self.watermark["max_fetched_at"]))
+
+    def marks(self, df):
+        """(max id, max fetched_at) of a raw chunk, for advance()."""
+        ids = pd.to_numeric(df["id"], errors="coerce").dropna()
+        fetched = df["fetched_at"].dropna().astype(str) if "fetched_at" in df.columns else ()
+        return (int(ids.max()) if len(ids) else 0), (str(fetched.max()) if len(fetched) else "")
+
+    def advance(self, max_id, max_fetched_at):
+        self.watermark["max_id"] = max(self.watermark["max_id"], max_id)
+        self.watermark["max_fetched_at"] = max(self.watermark["max_fetched_at"], max_fetched_at)
+
+    def seen(self, keys):
+        if not len(self._known):
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self._known, keys), len(self._known) - 1)
+        return self._known[pos] == keys
+
+    def add(self, keys):
+        self._new.append(np.asarray(keys, dtype="<u8"))
+
+    def commit(self, rows):
+        new = np.concatenate(self._new) if self._new else np.zeros(0, "<u8")
+        with open(self.hash_path, "ab") as f:
+            f.write(new.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._known = np.union1d(self._known, new)
+        self._new = []
+        self.watermark["hashes"] += len(new)
+        self.watermark["rows"] += rows
+        self.watermark["out_bytes"] = os.path.getsize(self.out_csv) if os.path.isfile(self.out_csv) else 0
+        self.watermark["updated_at"] = datetime.now(timezone.utc).isoformat()
+        tmp = self.watermark_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.watermark, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.watermark_path)
+
+CHUNK_ROWS = int(os.getenv("CLEAN_CHUNK_ROWS", "5000"))
+DEDUP_COLUMNS = ["title", "content", "h1"]
+OUTPUT_COLUMNS = ["id", "source", "url", "cleaned_title", "fetched_at", "t_total_sec", "cleaned_content"]
+# The notebook's df.dropna() after dropping h2, i.e. over every column the scraper wrote. Columns only
+# some raw segments have (the legacy data.csv's published_at) must not drop the rows of the others.
+REQUIRED_COLUMNS = ["id", "source", "url", "title", "fetched_at", "t_total_sec", "content", "h1"]
+
+def _hashes(column, values):
+    return np.fromiter((url_hash(f"{column}\0{v}") for v in values.astype(str)), dtype=np.uint64, count=len(values))
+
+def dedup_rows(df, state, columns=DEDUP_COLUMNS):
+    """
+    The notebook's drop_duplicates on title, then content, then h1 (keep
+    first), applied across the new rows and everything cleaned before.
+    """
+    for col in columns:
+        if col not in df.columns:
+            continue
+        keys = _hashes(col, df[col])
+        dup = pd.Series(keys).duplicated().to_numpy() | state.seen(keys)
+        df, keys = df[~dup], keys[~dup]
+        state.add(keys)
+    return df
+
+def clean_rows(df, state, workers=SUMMARY_WORKERS, pool=None):
+    """Raw rows -> cleaned rows, with cleaned_title / cleaned_content."""
+    df = df.copy()
+    df["id"] = pd.to_numeric(df["id"], errors="coerce")
+    df = df.dropna(subset=["id"])
+    df["id"] = df["id"].astype(int)
+    df = dedup_rows(df, state, ["id"])
+    df[["content", "title"]] = df[["content", "title"]].astype(str)
+    df = dedup_rows(df, state)
+    if "dup_of" in df.columns:
+        # near-duplicates (syndicated copies) marked by the scraper
+        df = df[df["dup_of"].isna()].drop(columns=["dup_of"])
+    df = df.drop(columns=["h2"], errors="ignore")
+    df = df.dropna(subset=[c for c in REQUIRED_COLUMNS if c in df.columns])
+    languages = detect_languages(df["content"])
+    df["cleaned_content"] = summarize_texts(df["content"], languages, sentence_count=4, workers=workers, pool=pool)
+    df["cleaned_title"] = clean_titles(df["title"])
+    return df
+
+def raw_chunks(raw_dir=RAW_DIR, input_csv=None, after_id=None, chunk_rows=CHUNK_ROWS):
+    """Raw rows as DataFrames of at most `chunk_rows` rows (0: everything in one frame)."""
+    if input_csv:
+        if not chunk_rows:
+            yield pd.read_csv(input_csv)
+            return
+        yield from pd.read_csv(input_csv, chunksize=chunk_rows)
+        return
+    store = RawStore(raw_dir)
+    if not chunk_rows:
+        yield store.read_df(after_id=after_id)
+        return
+    yield from store.iter_chunks(chunk_rows, after_id=after_id)
+
+def _append_csv(path, df):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    header = not os.path.isfile(path) or os.path.getsize(path) == 0
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        df.to_csv(f, index=False, header=header)
+        f.flush()
+        os.fsync(f.fileno())
+
+def run_stage(raw_dir=RAW_DIR, out_csv=CLEAN_CSV, input_csv=None, full=False, workers=SUMMARY_WORKERS,
+              qa_sample=None, chunk_rows=CHUNK_ROWS):
+    """
+    Clean the raw rows past the watermark and append them to `out_csv`, one
+    chunk of `chunk_rows` raw rows at a time, so memory stays flat however
+    much there is to do. full=True forgets the watermark and history and
+    rebuilds `out_csv` (a backfill).
+    """
+    state_dir = os.path.join(os.path.dirname(out_csv) or ".", "state")
+    if full:
+        for path in (out_csv, os.path.join(state_dir, "watermark.json"), os.path.join(state_dir, "hashes.u64")):
+            if os.path.isfile(path):
+                os.remove(path)
+    state = CleanState(state_dir, out_csv)
+    wm = dict(state.watermark)
+    print(f"Watermark id={wm['max_id']} fetched_at={wm['max_fetched_at'] or '-'}")
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    n_raw = n_out = 0
+    max_id, max_fetched_at, scores = 0, "", []
+    embeddings = EmbeddingStore(MODEL_NAME) if qa_sample else None
+    model = connect() if qa_sample else None  # a running model worker saves loading the model here
+    if model is not None and model.model_name("embed") != MODEL_NAME:
+        model = None
+    try:
+        for raw in raw_chunks(raw_dir, input_csv, wm["max_id"] or None, chunk_rows):
+            raw = raw[state.is_new(raw)]
+            if raw.empty:
+                continue
+            chunk_id, chunk_fetched = state.marks(raw)
+            max_id, max_fetched_at = max(max_id, chunk_id), max(max_fetched_at, chunk_fetched)
+            df = clean_rows(raw, state, workers, pool)
+            if qa_sample and len(df):
+                add_similarity_scores(df, model, sample=qa_sample, store=embeddings)
+                scores.append(df[list(SIMILARITY_COLUMNS)].dropna())
+            out = df[OUTPUT_COLUMNS].rename(columns={"cleaned_title": "title", "cleaned_content": "content"})
+            _append_csv(out_csv, out)
+            state.commit(len(out))
+            n_raw += len(raw)
+            n_out += len(out)
+            print(f"  chunk: {len(out)} of {len(raw)} raw rows kept ({n_out} / {n_raw} this run)")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    if n_raw:
+        state.advance(max_id, max_fetched_at)
+        state.commit(0)
+    if scores:
+        print(pd.concat(scores).describe())
+    print(f"Cleaned {n_out} of {n_raw} new rows -> {out_csv} ({state.watermark['rows']} rows in total)")
+    return n_out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incremental cleaning stage: raw store -> clean_data.csv")
+    ap.add_argument("--raw-dir", default=RAW_DIR)
+    ap.add_argument("--input", default=None, help="read a raw CSV instead of the raw store")
+    ap.add_argument("--out", default=CLEAN_CSV)
+    ap.add_argument("--full", action="store_true", help="ignore the watermark and rebuild the output")
+    ap.add_argument("--workers", type=int, default=SUMMARY_WORKERS)
+    ap.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="raw rows per chunk (0: all at once)")
+    ap.add_argument("--qa-sample", type=float, default=None,
+                    help="print similarity scores for a sample of the new rows (fraction, or row count per chunk)")
+    args = ap.parse_args(argv)
+    qa = int(args.qa_sample) if args.qa_sample and args.qa_sample > 1 else args.qa_sample
+    run_stage(args.raw_dir, args.out, args.input, args.full, args.workers, qa, args.chunk_rows)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# -- coding: utf-8 --
+"""
+Persistent sentence-embedding store, so a text is encoded once per model.
+
+Vectors are keyed by a 64-bit hash of the model name plus the normalized text
+(NFC, whitespace collapsed), so an unchanged article maps to the vector
+computed on an earlier run and an edited one gets a new row. One directory
+per model (data/embeddings/<model>):
+
+  meta.json     model name, dimension, dtype
+  vectors.f16   float16 rows of `dim` values, append-only; memory-mapped
+  keys.u64      the key of each row, in row order (the key -> row index)
+
+Rows are unit-length (normalize_embeddings=True), so cosine similarity is a
+dot product. At open the keys are loaded and sorted once; a batch lookup is
+one vectorized binary search. encode() looks a batch of texts up, encodes
+only the missing distinct texts with one model.encode call, appends them
+(vectors first, then keys) and returns the rows for the whole batch. A
+crash between the two writes leaves vector rows without keys, or part of a
+row; a writer cuts both files back to the last row they have in common when
+it opens the store, so the next append starts in step again.
+
+Other stages and the dashboard open it with readonly=True: the vectors are
+mapped, not read, and nothing is written. One writer at a time; readers see
+the rows that were complete when they opened the store.
+
+  python scripts/embedding_store.py info [--model all-MiniLM-L6-v2]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import unicodedata
+
+import numpy as np
+
+from text_norm import normalize_whitespace
+from url_index import url_hash
+
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", r"./data/embeddings")
+DTYPE = np.float16
+
+def normalize_text(text):
+    return normalize_whitespace(unicodedata.normalize("NFC", str(text)))
+
+def text_key(text, model_name):
+    return url_hash(f"{model_name}\0{normalize_text(text)}")
+
+def model_dir(model_name, root=EMBEDDINGS_DIR):
+    return os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+
+class EmbeddingStore:
+    def __init__(self, model_name, root=EMBEDDINGS_DIR, dim=None, readonly=False):
+        self.model_name = model_name
+        self.dir = model_dir(model_name, root)
+        self.readonly = readonly
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.vec_path = os.path.join(self.dir, "vectors.f16")
+        self.key_path = os.path.join(self.dir, "keys.u64")
+        self.dim = dim
+        if os.path.isfile(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if dim is not None and meta["dim"] != dim:
+                raise ValueError(f"{self.dir} holds {meta['dim']}-d vectors, not {dim}-d")
+            self.dim = meta["dim"]
+        elif readonly:
+            raise FileNotFoundError(f"no embedding store for {model_name} in {root}")
+        self.encoded = 0
+        self.reused = 0
+        self._load()
+
+    def _load(self):
+        keys = np.zeros(0, "<u8")
+        if os.path.isfile(self.key_path):
+            keys = np.fromfile(self.key_path, dtype="<u8", count=os.path.getsize(self.key_path) // 8)
+        row_bytes = (self.dim or 0) * np.dtype(DTYPE).itemsize
+        rows = 0
+        if row_bytes and os.path.isfile(self.vec_path):
+            rows = os.path.getsize(self.vec_path) // row_bytes
+        n = min(len(keys), rows)  # the last row both files hold completely
+        if not self.readonly:
+            self._truncate(self.key_path, n * 8)
+            if row_bytes:
+                self._truncate(self.vec_path, n * row_bytes)
+        self._keys = keys[:n]
+        self._order = np.argsort(self._keys, kind="stable")
+        self._sorted = self._keys[self._order]
+        self._vectors = None
+        if n:
+            self._vectors = np.memmap(self.vec_path, dtype=DTYPE, mode="r", shape=(n, self.dim))
+
+    @staticmethod
+    def _truncate(path, size):
+        """Cut `path` back to `size` bytes: drops what an interrupted append left behind."""
+        if os.path.isfile(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def __len__(self):
+        return len(self._keys)
+
+    @property
+    def vectors(self):
+        """All rows as a read-only (n, dim) float16 memmap."""
+        if self._vectors is None:
+            return np.zeros((0, self.dim or 0), dtype=DTYPE)
+        return self._vectors
+
+    def keys(self, texts):
+        return np.fromiter((text_key(t, self.model_name) for t in texts), dtype=np.uint64)
+
+    def rows(self, keys):
+        """Row of each key, -1 where the store has none."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self._sorted):
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted, keys)
+        pos = np.minimum(pos, len(self._sorted) - 1)
+        found = self._sorted[pos] == keys
+        return np.where(found, self._order[pos], -1).astype(np.int64)
+
+    def lookup(self, texts):
+        """float32 (len(texts), dim) vectors and a mask of the texts that were found."""
+        rows = self.rows(self.keys(texts))
+        found = rows >= 0
+        out = np.zeros((len(rows), self.dim or 0), dtype=np.float32)
+        if found.any():
+            out[found] = self.vectors[rows[found]]
+        return out, found
+
+    def append(self, keys, vectors):
+        if self.readonly:
+            raise RuntimeError("embedding store opened read-only")
+        vectors = np.asarray(vectors)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "dtype": np.dtype(DTYPE).name}, f)
+        self._vectors = None  # drop the map before the file grows
+        with open(self.vec_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.key_path, "ab") as f:
+            f.write(np.asarray(keys, dtype="<u8").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._load()
+
+    def encode(self, texts, model, batch_size=128):
+        """
+        float32 (len(texts), dim) unit vectors for `texts`; only texts the
+        store does not hold yet are encoded (one batched call) and added.
+        """
+        texts = [str(t) for t in texts]
+        keys = self.keys(texts)
+        rows = self.rows(keys)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            new_keys, first = np.unique(keys[missing], return_index=True)
+            emb = model.encode([texts[missing[i]] for i in first], batch_size=batch_size,
+                               convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
+            self.append(new_keys, emb)
+            self.encoded += len(new_keys)
+            rows = self.rows(keys)
+        self.reused += len(texts) - len(missing)
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def summary(self):
+        return (f"Embedding store ({self.model_name}): {len(self)} vectors, "
+                f"{self.encoded} encoded / {self.reused} reused this session")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["info"])
+    ap.add_argument("--model", default="all-MiniLM-L6-v2")
+    ap.add_argument("--root", default=EMBEDDINGS_DIR)
+    args = ap.parse_args(argv)
+    store = EmbeddingStore(args.model, args.root, readonly=True)
+    mb = len(store) * store.dim * np.dtype(DTYPE).itemsize / 1e6
+    print(f"{store.dir}: {len(store)} vectors x {store.dim} ({np.dtype(DTYPE).name}, {mb:.1f} MB)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
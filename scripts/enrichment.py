@@ -0,0 +1,160 @@
+# -- coding: utf-8 --
+"""
+Enrichment-stage models (used by notebooks/pattern_model.ipynb).
+
+  classify_context   zero-shot context label and the full label-score vector
+  headlines          distilbart headline for each text
+  classify_sentiment XLM-R sentiment label for each text
+  detect_languages   language code for each text (scripts/lang_id.py)
+
+The models load through scripts/inference_backend.py: PyTorch on a GPU,
+int8-quantized ONNX Runtime on a CPU-only machine (ENRICH_BACKEND to force
+one). All three take whole columns, in length-sorted batches.
+
+The context classifier is an NLI model run as a zero-shot pipeline: every
+article is posed against each candidate label ("This example is {label}."),
+so one article costs len(labels) forward passes. Instead of calling the
+pipeline once per row, classify_context() hands it the whole column with
+batch_size = CLASSIFY_BATCH articles (times the number of labels, since the
+pipeline batches premise/hypothesis pairs). Articles are sorted by token
+length first, longest first, so the texts in a batch are about as long as
+each other and little of a batch is padding; results come back in input
+order. Premises are truncated to the model's maximum length exactly as in
+the per-row calls, so the labels are the same; scores agree up to float
+rounding in padded batches.
+
+Next to the best label ("context", what the notebook stored before) the
+result keeps every label's score ("context_scores", {label: score}), so a
+borderline article can be told from a clear one.
+
+Results can be cached across runs per article and model version:
+scripts/inference_cache.py.
+
+Benchmark: scripts/bench_enrichment.py.
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import lang_id
+from inference_backend import load_pipeline
+
+CONTEXT_MODEL = os.getenv("ENRICH_CONTEXT_MODEL", "typeform/distilbert-base-uncased-mnli")
+SUMMARY_MODEL = os.getenv("ENRICH_SUMMARY_MODEL", "sshleifer/distilbart-cnn-12-6")
+SENTIMENT_MODEL = os.getenv("ENRICH_SENTIMENT_MODEL", "cardiffnlp/twitter-xlm-roberta-base-sentiment")
+CONTEXT_LABELS = ["politics", "technology", "social", "sports", "economy"]
+CLASSIFY_BATCH = int(os.getenv("ENRICH_CLASSIFY_BATCH", "8"))
+GENERATE_BATCH = int(os.getenv("ENRICH_GENERATE_BATCH", "4"))
+MAX_TOKENS = 512
+HEADLINE_CHARS = 512
+HEADLINE_ARGS = {"max_length": 20, "min_length": 5, "do_sample": False}
+
+# ----------------------------------------------------
+# MODELS
+@lru_cache(maxsize=None)
+def get_classifier(name=CONTEXT_MODEL, backend=None):
+    return load_pipeline("zero-shot-classification", name, backend)
+
+@lru_cache(maxsize=None)
+def get_summarizer(name=SUMMARY_MODEL, backend=None):
+    return load_pipeline("summarization", name, backend)
+
+@lru_cache(maxsize=None)
+def get_sentiment(name=SENTIMENT_MODEL, backend=None):
+    return load_pipeline("sentiment-analysis", name, backend)
+
+def token_lengths(texts, tokenizer, max_tokens=MAX_TOKENS):
+    """Token count of each text, capped at what the model reads."""
+    limit = min(max_tokens, getattr(tokenizer, "model_max_length", max_tokens) or max_tokens)
+    ids = tokenizer(list(texts), add_special_tokens=False, truncation=True, max_length=limit)["input_ids"]
+    return np.fromiter((len(i) for i in ids), dtype=np.int64, count=len(ids))
+
+def _texts(texts):
+    index = texts.index if isinstance(texts, pd.Series) else None
+    return [t if isinstance(t, str) else str(t) for t in texts], index
+
+def length_order(texts, tokenizer):
+    """Indices of `texts`, longest first (stable, so equal lengths keep their order)."""
+    return np.argsort(-token_lengths(texts, tokenizer), kind="stable")
+
+# ----------------------------------------------------
+# CONTEXT CLASSIFICATION
+def classify_context(texts, classifier=None, labels=CONTEXT_LABELS, batch_size=CLASSIFY_BATCH, sort=True):
+    """
+    Zero-shot context of each text, batched and (sort=True) length-sorted.
+
+    Returns a DataFrame (the index of `texts` when it is a Series) with
+    "context", the best label, and "context_scores", {label: score} over all
+    `labels` in their given order.
+    """
+    texts, index = _texts(texts)
+    labels = list(labels)
+    best, scores = [None] * len(texts), [None] * len(texts)
+    if texts:
+        classifier = classifier or get_classifier()
+        order = length_order(texts, classifier.tokenizer) if sort else np.arange(len(texts))
+        outputs = classifier([texts[i] for i in order], candidate_labels=labels,
+                             batch_size=max(1, batch_size) * len(labels))
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        for i, out in zip(order, outputs):
+            by_label = dict(zip(out["labels"], out["scores"]))
+            best[i] = out["labels"][0]
+            scores[i] = {label: float(by_label[label]) for label in labels}
+    return pd.DataFrame({"context": best, "context_scores": scores}, index=index)
+
+# ----------------------------------------------------
+# HEADLINES
+def headlines(texts, summarizer=None, batch_size=GENERATE_BATCH):
+    """
+    A short generated headline for each text (from its first HEADLINE_CHARS
+    characters), as a list in input order; None where generation failed.
+    """
+    texts, _ = _texts(texts)
+    texts = [t[:HEADLINE_CHARS] for t in texts]
+    out = [None] * len(texts)
+    if not texts:
+        return out
+    summarizer = summarizer or get_summarizer()
+    order = length_order(texts, summarizer.tokenizer)
+    for start in range(0, len(order), batch_size):
+        part = order[start:start + batch_size]
+        try:
+            results = summarizer([texts[i] for i in part], batch_size=len(part), **HEADLINE_ARGS)
+        except Exception as e:
+            print(f"Headline error, retrying the batch row by row: {e}")
+            results = []
+            for i in part:
+                try:
+                    results.append(summarizer(texts[i], **HEADLINE_ARGS)[0])
+                except Exception:
+                    results.append(None)
+        for i, res in zip(part, results):
+            if isinstance(res, list):
+                res = res[0]
+            out[i] = res["summary_text"] if res else None
+    return out
+
+# ----------------------------------------------------
+# SENTIMENT
+def classify_sentiment(texts, classifier=None, batch_size=CLASSIFY_BATCH):
+    """Sentiment label of each text (truncated to MAX_TOKENS tokens), as a list in input order."""
+    texts, _ = _texts(texts)
+    out = [None] * len(texts)
+    if not texts:
+        return out
+    classifier = classifier or get_sentiment()
+    order = length_order(texts, classifier.tokenizer)
+    results = classifier([texts[i] for i in order], batch_size=batch_size, truncation=True, max_length=MAX_TOKENS)
+    for i, res in zip(order, results):
+        out[i] = res["label"]
+    return out
+
+# ----------------------------------------------------
+# LANGUAGE
+def detect_languages(texts):
+    """Language code of each text, as a list in input order: by script, langdetect where that is ambiguous."""
+    texts, _ = _texts(texts)
+    return lang_id.detect_languages(texts)
@@ -0,0 +1,104 @@
+# -- coding: utf-8 --
+"""
+Per-domain fetch-strategy learning for fetch_article.
+
+fetch_article can get an article through several variants, tried in order:
+"amp" (nytimes / washingtonpost only), "direct" and "proxy" (r.jina.ai).
+StrategyTable records, per domain and variant, how often it produced an
+article and how long it took, and persists that in a JSON file.
+
+Variants with MIN_SAMPLES attempts are ranked by success rate (then
+latency) and the ones that practically never work are dropped; variants not
+measured yet keep their default place behind them. A fetch therefore goes
+straight to the winner. Every PROBE_EVERY-th fetch of a domain uses the full
+default order again so the others are re-measured. Old observations are halved past MAX_WEIGHT
+attempts, so the table follows sites that change.
+
+Savings are estimated per fetch as (requests the default order would have
+needed, assuming the variants ranked below the winner fail) minus
+(requests actually made).
+"""
+import os
+import json
+import threading
+from urllib.parse import urlparse
+
+MIN_SAMPLES = 5
+DEAD_RATE = 0.05
+PROBE_EVERY = 20
+MAX_WEIGHT = 200
+
+def domain_of(url):
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+class StrategyTable:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.domains = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.domains = json.load(f)
+            except (OSError, ValueError):
+                self.domains = {}
+        self.fetches = 0
+        self.probes = 0
+        self.requests_made = 0
+        self.requests_default = 0
+
+    def _stats(self, domain, strategy):
+        d = self.domains.setdefault(domain, {"fetches": 0, "strategies": {}})
+        return d["strategies"].setdefault(strategy, {"attempts": 0, "successes": 0, "latency_sum": 0.0})
+
+    def plan(self, url, default):
+        """Order in which to try the `default` variants for this URL's domain."""
+        domain = domain_of(url)
+        with self._lock:
+            d = self.domains.setdefault(domain, {"fetches": 0, "strategies": {}})
+            d["fetches"] += 1
+            stats = {s: self._stats(domain, s) for s in default}
+            if all(st["attempts"] < MIN_SAMPLES for st in stats.values()):
+                return list(default)
+            if d["fetches"] % PROBE_EVERY == 0:
+                self.probes += 1
+                return list(default)
+            rate = {s: st["successes"] / st["attempts"] for s, st in stats.items() if st["attempts"] >= MIN_SAMPLES}
+            latency = {s: stats[s]["latency_sum"] / stats[s]["attempts"] for s in rate}
+
+        known = sorted(rate, key=lambda s: (-rate[s], latency[s], default.index(s)))
+        unknown = [s for s in default if s not in rate]
+        # Measured winners first, then not-yet-measured variants; measured dead ones are skipped.
+        plan = [s for s in known if rate[s] >= DEAD_RATE] + unknown
+        return plan or known[:1]
+
+    def record(self, url, strategy, ok, latency):
+        with self._lock:
+            st = self._stats(domain_of(url), strategy)
+            st["attempts"] += 1
+            st["successes"] += 1 if ok else 0
+            st["latency_sum"] += latency
+            if st["attempts"] > MAX_WEIGHT:
+                for k in st:
+                    st[k] /= 2
+
+    def record_fetch(self, default, winner, made):
+        """Account one fetch_article call: `winner` is the variant that produced the article (or None)."""
+        with self._lock:
+            self.fetches += 1
+            self.requests_made += made
+            self.requests_default += (default.index(winner) + 1) if winner in default else len(default)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.domains, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        saved = self.requests_default - self.requests_made
+        return (f"Fetch strategies: {self.requests_made} article requests for {self.fetches} links "
+                f"(default order ~{self.requests_default}, saved ~{saved}; {self.probes} re-probes)")
@@ -0,0 +1,242 @@
+# -- coding: utf-8 --
+"""
+Compressed, content-addressed archive of fetched article pages.
+
+With SCRAPE_ARCHIVE=1 the scraper stores every article body it reads (the
+bytes handed to the parser, before decoding) so that improved extraction
+rules can be re-run over old pages without fetching them again.
+
+Layout under the archive root (data/raw/archive):
+
+  packs/pack-*.zst   independently compressed bodies, appended back to back;
+  (or pack-*.zlib)   a pack is closed at PACK_BYTES
+  blobs.jsonl        one line per distinct body: sha256, pack, offset, length,
+                     size, codec
+  fetches.jsonl      one line per fetch: url, source, fetched_at, sha256,
+                     encoding, outcome (see read_body; "early-stop" and
+                     "capped" bodies are partial)
+
+Bodies are keyed by sha256, so a page fetched again unchanged costs one index
+line. Compression is zstd when the zstandard package is installed, zlib
+otherwise; the codec is recorded per body and a pack only holds one codec,
+named by its suffix (.zst / .zlib), so a run with the other codec starts a
+new pack instead of appending to the last one. A pack is written and flushed
+before its index line, so a crash can leave unreferenced bytes in a pack but
+never an index entry without its body.
+
+Re-extraction runs the current web_scraping.parse_body over the archive in
+worker processes (each reads its bodies straight from the packs) and writes
+the rows as a fresh raw store:
+
+  python scripts/html_archive.py info
+  python scripts/html_archive.py reextract OUT_DIR [--workers N] [--all-fetches]
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from raw_store import RawStore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PACK_BYTES = 256 * 1024 * 1024
+ZSTD_LEVEL = 9
+BATCH = 64
+CODEC = "zstd" if zstandard is not None else "zlib"
+PACK_SUFFIX = {"zstd": ".zst", "zlib": ".zlib"}
+
+def _compress(data):
+    if CODEC == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), "zstd"
+    return zlib.compress(data, 6), "zlib"
+
+def _decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("this archive holds zstd bodies: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _read_jsonl(path):
+    if not os.path.isfile(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # torn last line
+
+class HtmlArchive:
+    def __init__(self, root):
+        self.root = root
+        self.pack_dir = os.path.join(root, "packs")
+        self.blobs_path = os.path.join(root, "blobs.jsonl")
+        self.fetches_path = os.path.join(root, "fetches.jsonl")
+        os.makedirs(self.pack_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.blobs = {b["sha256"]: b for b in _read_jsonl(self.blobs_path)}
+        packs = sorted(n for n in os.listdir(self.pack_dir) if n.startswith("pack-"))
+        self._pack_seq = int(packs[-1][5:11]) if packs else 0
+        self._pack = None
+        self.stored = 0
+        self.deduped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _open_pack(self):
+        if self._pack is not None and self._pack.tell() < PACK_BYTES:
+            return self._pack
+        if self._pack is not None:
+            self._pack.close()
+            self._pack_seq += 1
+        elif not self._pack_seq or not os.path.isfile(self._pack_path(self._pack_seq)) \
+                or os.path.getsize(self._pack_path(self._pack_seq)) >= PACK_BYTES:
+            self._pack_seq += 1  # otherwise keep filling the last pack of an earlier run (same codec)
+        self._pack = open(self._pack_path(self._pack_seq), "ab")
+        return self._pack
+
+    def _pack_path(self, seq):
+        return os.path.join(self.pack_dir, f"pack-{seq:06d}{PACK_SUFFIX[CODEC]}")
+
+    def put(self, url, body, encoding=None, outcome="complete", source=""):
+        """Archive one fetched body; returns its sha256."""
+        sha = hashlib.sha256(body).hexdigest()
+        fetch = {"url": url, "source": source,
+                 "fetched_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                 "sha256": sha, "encoding": encoding, "outcome": outcome}
+        with self._lock:
+            known = sha in self.blobs
+        data, codec = (None, None) if known else _compress(body)
+        with self._lock:
+            if sha in self.blobs:
+                self.deduped += 1
+            else:
+                pack = self._open_pack()
+                offset = pack.tell()
+                pack.write(data)
+                pack.flush()
+                blob = {"sha256": sha, "pack": os.path.basename(pack.name), "offset": offset,
+                        "length": len(data), "size": len(body), "codec": codec}
+                with open(self.blobs_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(blob) + "\n")
+                self.blobs[sha] = blob
+                self.stored += 1
+                self.bytes_in += len(body)
+                self.bytes_out += len(data)
+            with open(self.fetches_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(fetch) + "\n")
+        return sha
+
+    def get(self, sha):
+        return read_blob(self.pack_dir, self.blobs[sha])
+
+    def fetches(self, latest_only=True):
+        """Fetch entries in archive order; by default only the newest one per URL."""
+        entries = [e for e in _read_jsonl(self.fetches_path) if e["sha256"] in self.blobs]
+        if not latest_only:
+            return entries
+        last = {e["url"]: i for i, e in enumerate(entries)}
+        return [e for i, e in enumerate(entries) if last[e["url"]] == i]
+
+    def summary(self):
+        ratio = f", {self.bytes_in / self.bytes_out:.1f}x compression" if self.bytes_out else ""
+        return (f"HTML archive: {self.stored} new bodies ({self.bytes_in / 1e6:.1f} MB -> "
+                f"{self.bytes_out / 1e6:.1f} MB{ratio}), {self.deduped} unchanged")
+
+    def close(self):
+        with self._lock:
+            if self._pack is not None:
+                self._pack.close()
+                self._pack = None
+
+def read_blob(pack_dir, blob):
+    with open(os.path.join(pack_dir, blob["pack"]), "rb") as f:
+        f.seek(blob["offset"])
+        return _decompress(f.read(blob["length"]), blob["codec"])
+
+# ----------------------------------------------------
+# RE-EXTRACTION
+_ws = None
+
+def _init_worker():
+    global _ws
+    import web_scraping
+    _ws = web_scraping
+
+def _extract_batch(pack_dir, items):
+    """items: [(fetch entry, blob)] -> [row or None], in order."""
+    out = []
+    for fetch, blob in items:
+        try:
+            page = _ws.parse_body(read_blob(pack_dir, blob), fetch.get("encoding"), fetch["url"])
+        except Exception:
+            page = None
+        row = _ws.article_row(page, fetch["url"])
+        if row is not None:
+            row["source"] = fetch.get("source", "")
+            row["fetched_at"] = fetch["fetched_at"]
+        out.append(row)
+    return out
+
+def reextract(archive, out_dir, workers=None, latest_only=True, segment_rows=20_000):
+    fetches = archive.fetches(latest_only)
+    items = [(f, archive.blobs[f["sha256"]]) for f in fetches]
+    batches = [items[i:i + BATCH] for i in range(0, len(items), BATCH)]
+    store = RawStore(out_dir, legacy_csv=None)
+    next_id, rows, n_articles = store.max_id + 1, [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # map() keeps archive order, so ids follow fetch order
+        for result in pool.map(_extract_batch, [archive.pack_dir] * len(batches), batches):
+            for row in result:
+                if row is None:
+                    continue
+                row["id"] = next_id; next_id += 1
+                rows.append(row)
+                if len(rows) >= segment_rows:
+                    store.append_segment(rows); n_articles += len(rows); rows = []
+    if rows:
+        store.append_segment(rows); n_articles += len(rows)
+    return len(items), n_articles
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--root", default=os.getenv("SCRAPE_ARCHIVE_DIR",
+                                                os.path.join(os.getenv("SCRAPE_RAW_DIR", r"./data/raw"), "archive")))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("info")
+    rp = sub.add_parser("reextract", help="run the current extraction over the archive into a new raw store")
+    rp.add_argument("out_dir")
+    rp.add_argument("--workers", type=int, default=None)
+    rp.add_argument("--all-fetches", action="store_true", help="every fetch, not only the newest per URL")
+    args = ap.parse_args(argv)
+
+    archive = HtmlArchive(args.root)
+    if args.cmd == "info":
+        size = sum(b["size"] for b in archive.blobs.values())
+        packed = sum(b["length"] for b in archive.blobs.values())
+        fetches = archive.fetches(latest_only=False)
+        print(f"{len(fetches)} fetches of {len(archive.fetches())} URLs, {len(archive.blobs)} distinct bodies")
+        print(f"{size / 1e6:.1f} MB raw -> {packed / 1e6:.1f} MB packed"
+              + (f" ({size / packed:.1f}x)" if packed else ""))
+        return 0
+
+    t0 = time.perf_counter()
+    n_pages, n_articles = reextract(archive, args.out_dir, args.workers, not args.all_fetches)
+    dt = time.perf_counter() - t0
+    print(f"Re-extracted {n_pages} pages -> {n_articles} articles in {args.out_dir} "
+          f"({dt:.1f}s, {n_pages / dt if dt else 0:.0f} pages/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# -- coding: utf-8 --
+"""
+On-disk conditional-GET cache for RSS feeds and listing pages.
+
+Per URL it keeps the validators of the last full response (ETag,
+Last-Modified), that response's body size, and for feeds the publish time
+of the newest item already turned into links. get() sends If-None-Match /
+If-Modified-Since; a 304 means nothing changed and the caller can go straight
+to "no new links" without parsing. Hit rate and bytes saved are counted per
+run. The JSON file is only rewritten by save(), at the end of a run.
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+def parse_item_date(text):
+    """RSS pubDate (RFC 822) or Atom updated/published (ISO 8601) -> aware datetime, or None."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        dt = parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError):
+        try:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+class FeedCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        self._current = set()
+        self.requests = 0
+        self.hits = 0
+        self.bytes_saved = 0
+        self.bytes_fetched = 0
+
+    def get(self, session, url, headers=None, **kwargs):
+        """
+        Conditional GET. Returns (response, not_modified). Validators are
+        stored for 200 responses; a 304 counts as a hit.
+        """
+        headers = dict(headers or {})
+        with self._lock:
+            entry = dict(self.entries.get(url) or {})
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        r = session.get(url, headers=headers, **kwargs)
+        with self._lock:
+            self.requests += 1
+            if r.status_code == 304:
+                self.hits += 1
+                self.bytes_saved += entry.get("bytes", 0)
+                self._current.add(url)
+                return r, True
+            if r.status_code == 200:
+                self.bytes_fetched += len(r.content)
+                e = self.entries.setdefault(url, {})
+                e["etag"] = r.headers.get("ETag")
+                e["last_modified"] = r.headers.get("Last-Modified")
+                e["bytes"] = len(r.content)
+        return r, False
+
+    def newest_item(self, url):
+        with self._lock:
+            return parse_item_date((self.entries.get(url) or {}).get("newest_item"))
+
+    def set_newest_item(self, url, dt):
+        with self._lock:
+            e = self.entries.setdefault(url, {})
+            old = parse_item_date(e.get("newest_item"))
+            if old is None or dt > old:
+                e["newest_item"] = dt.isoformat()
+
+    def mark_current(self, url):
+        """Record that `url` had nothing new this run (304 or only already-seen items)."""
+        with self._lock:
+            self._current.add(url)
+
+    def is_current(self, urls):
+        if not urls:
+            return False
+        urls = urls if isinstance(urls, list) else [urls]
+        with self._lock:
+            return all(u in self._current for u in urls)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        rate = 100.0 * self.hits / self.requests if self.requests else 0.0
+        return (f"HTTP cache: {self.hits}/{self.requests} not modified ({rate:.0f}% hit rate), "
+                f"{self.bytes_saved / 1e6:.2f} MB saved, {self.bytes_fetched / 1e6:.2f} MB fetched")
@@ -0,0 +1,232 @@
+# -- coding: utf-8 --
+"""
+Inference backends for the enrichment models (scripts/enrichment.py).
+
+  torch       the PyTorch model in fp32; on the GPU when CUDA is available
+  onnx-int8   ONNX Runtime on the CPU: the model is exported to ONNX once and
+              its weights dynamically quantized to int8 (activations are
+              quantized on the fly, so no calibration data is needed)
+
+ENRICH_BACKEND picks one ("torch", "onnx-int8"); the default "auto" uses
+torch on a CUDA GPU, onnx-int8 on a CPU-only machine when onnxruntime and
+optimum-onnx are installed, and torch on the CPU otherwise.
+
+load_pipeline() returns a transformers pipeline either way, so callers do
+not change. Summarization is the exception: transformers 5 dropped that
+pipeline task, so it gets a Summarizer, which does what the transformers 4
+summarization pipeline did (tokenize, generate with the model's summarization
+settings, decode) and is called the same way on both versions and backends.
+
+Exports are kept under ENRICH_ONNX_DIR (data/models/onnx), one directory per
+model and task:
+
+  <model>--<task>-int8/   quantized *.onnx files, config, tokenizer and
+                          generation config, meta.json (source model,
+                          revision, task) written last
+
+A directory without meta.json (an export that was interrupted) or with a
+different source revision is exported again. The fp32 export is an
+intermediate step and is deleted once quantized.
+
+  python scripts/inference_backend.py info
+  python scripts/inference_backend.py export typeform/distilbert-base-uncased-mnli --task zero-shot-classification
+
+Agreement with the torch models and latency per backend:
+scripts/bench_enrichment.py --stage backends.
+"""
+import os
+import re
+import sys
+import copy
+import json
+import shutil
+import argparse
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+try:
+    from transformers import pipeline, AutoTokenizer, AutoModelForSeq2SeqLM
+except ImportError:
+    pipeline = AutoTokenizer = AutoModelForSeq2SeqLM = None
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForSeq2SeqLM
+except ImportError:
+    onnxruntime = None
+
+BACKENDS = ("torch", "onnx-int8")
+BACKEND = os.getenv("ENRICH_BACKEND", "auto")
+# anchored to the repository: the pipeline runs pattern_model.ipynb from notebooks/
+ONNX_DIR = os.getenv("ENRICH_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                     "..", "data", "models", "onnx"))
+
+# pipeline task -> ONNX Runtime model class name
+ORT_CLASSES = {
+    "zero-shot-classification": "ORTModelForSequenceClassification",
+    "sentiment-analysis": "ORTModelForSequenceClassification",
+    "text-classification": "ORTModelForSequenceClassification",
+    "summarization": "ORTModelForSeq2SeqLM",
+}
+
+def has_cuda():
+    return torch is not None and torch.cuda.is_available()
+
+def onnx_available():
+    return onnxruntime is not None
+
+def select_backend(backend=None):
+    """The backend to use: `backend` (or ENRICH_BACKEND) unless it is "auto"."""
+    backend = backend or BACKEND
+    if backend == "auto":
+        if has_cuda():
+            return "torch"
+        return "onnx-int8" if onnx_available() else "torch"
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown inference backend {backend!r}; use one of {', '.join(BACKENDS)} or auto")
+    if backend == "onnx-int8" and not onnx_available():
+        raise RuntimeError("onnx-int8 needs onnxruntime and optimum: pip install onnxruntime optimum-onnx")
+    return backend
+
+# ----------------------------------------------------
+# ONNX EXPORT
+def export_dir(model_name, task, root=ONNX_DIR):
+    return os.path.join(root, re.sub(r"[^\w.-]+", "_", f"{model_name}--{task}") + "-int8")
+
+def model_revision(model_name):
+    """The commit of a hub model, or the config mtime of a local model directory."""
+    if os.path.isdir(model_name):
+        config = os.path.join(model_name, "config.json")
+        return f"local:{os.path.getmtime(config):.0f}" if os.path.isfile(config) else "local"
+    from transformers import AutoConfig
+    return getattr(AutoConfig.from_pretrained(model_name), "_commit_hash", None)
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def export_onnx(model_name, task, root=ONNX_DIR, force=False):
+    """Export `model_name` for `task` to ONNX and quantize it to int8 (once); returns the directory."""
+    if not onnx_available():
+        raise RuntimeError("ONNX export needs onnxruntime and optimum: pip install onnxruntime optimum-onnx")
+    out = export_dir(model_name, task, root)
+    revision = model_revision(model_name)
+    meta = _read_meta(out)
+    if not force and meta and meta.get("model") == model_name and meta.get("revision") == revision:
+        return out
+
+    fp32 = out + ".fp32"
+    for path in (out, fp32):
+        shutil.rmtree(path, ignore_errors=True)
+    ort_class = globals()[ORT_CLASSES[task]]
+    print(f"Exporting {model_name} ({task}) to ONNX ...")
+    ort_class.from_pretrained(model_name, export=True).save_pretrained(fp32)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(fp32)
+    os.makedirs(out)
+    for name in sorted(os.listdir(fp32)):
+        src = os.path.join(fp32, name)
+        if name.endswith(".onnx"):
+            print(f"  quantizing {name} to int8 ...")
+            quantize_dynamic(src, os.path.join(out, name), weight_type=QuantType.QInt8)
+        elif not name.endswith(".onnx_data"):  # external weights end up inside the quantized file
+            shutil.copy(src, out)
+    shutil.rmtree(fp32, ignore_errors=True)
+    with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "revision": revision, "task": task, "quantization": "dynamic int8",
+                   "onnxruntime": onnxruntime.__version__}, f, indent=2)
+    return out
+
+# ----------------------------------------------------
+# PIPELINES
+class Summarizer:
+    """
+    The transformers 4 summarization pipeline: texts are tokenized without
+    truncation (padded only when batched), generated with the model's
+    generation config plus its "summarization" task parameters and decoded
+    without special tokens. summarizer(text) -> [{"summary_text": ...}],
+    summarizer([texts]) -> [{"summary_text": ...}, ...].
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix = getattr(model.config, "prefix", None) or ""
+        self.generation_config = copy.deepcopy(model.generation_config)
+        params = (getattr(model.config, "task_specific_params", None) or {}).get("summarization")
+        if params:
+            self.generation_config.update(**params)
+
+    def __call__(self, texts, batch_size=None, **generate_kwargs):
+        single = isinstance(texts, str)
+        texts = [self.prefix + t for t in ([texts] if single else texts)]
+        batch_size = batch_size or max(1, len(texts))
+        config = self.generation_config
+        if generate_kwargs:
+            config = copy.deepcopy(config)
+            config.update(**generate_kwargs)
+        out = []
+        for start in range(0, len(texts), batch_size):
+            part = texts[start:start + batch_size]
+            inputs = self.tokenizer(part, padding=len(part) > 1, return_tensors="pt")
+            inputs.pop("token_type_ids", None)
+            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+            ids = self.model.generate(**inputs, generation_config=config)
+            out.extend({"summary_text": self.tokenizer.decode(i, skip_special_tokens=True,
+                                                              clean_up_tokenization_spaces=False)} for i in ids)
+        return out
+
+def load_pipeline(task, model_name, backend=None, root=ONNX_DIR, **kwargs):
+    """A transformers pipeline for `task` on the selected backend; kwargs go to pipeline()."""
+    if pipeline is None:
+        raise RuntimeError("transformers is not installed: pip install transformers torch")
+    backend = select_backend(backend)
+    if backend == "onnx-int8":
+        path = export_onnx(model_name, task, root)
+        model, tokenizer = globals()[ORT_CLASSES[task]].from_pretrained(path), AutoTokenizer.from_pretrained(path)
+    elif task == "summarization":
+        model, tokenizer = AutoModelForSeq2SeqLM.from_pretrained(model_name), AutoTokenizer.from_pretrained(model_name)
+        model = model.to("cuda" if has_cuda() else "cpu").eval()
+    else:
+        model, tokenizer = model_name, None
+    if task == "summarization":
+        pipe = Summarizer(model, tokenizer)
+    elif backend == "onnx-int8":
+        pipe = pipeline(task, model=model, tokenizer=tokenizer, **kwargs)
+    else:
+        pipe = pipeline(task, model=model_name, device=0 if has_cuda() else -1, **kwargs)
+    pipe.backend_name = backend
+    return pipe
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["info", "export"])
+    ap.add_argument("model", nargs="?")
+    ap.add_argument("--task", choices=sorted(ORT_CLASSES), default="zero-shot-classification")
+    ap.add_argument("--root", default=ONNX_DIR)
+    ap.add_argument("--force", action="store_true", help="export again even if up to date")
+    args = ap.parse_args(argv)
+    if args.cmd == "export":
+        if not args.model:
+            ap.error("export needs a model name")
+        print(export_onnx(args.model, args.task, args.root, force=args.force))
+        return 0
+    print(f"backend: {select_backend()} (ENRICH_BACKEND={BACKEND}; cuda {'yes' if has_cuda() else 'no'}, "
+          f"onnxruntime {'yes' if onnx_available() else 'no'})")
+    if os.path.isdir(args.root):
+        for name in sorted(os.listdir(args.root)):
+            meta = _read_meta(os.path.join(args.root, name))
+            if meta:
+                size = sum(os.path.getsize(os.path.join(args.root, name, f))
+                           for f in os.listdir(os.path.join(args.root, name)))
+                print(f"  {meta['model']} ({meta['task']}): {size / 1e6:.0f} MB, revision {meta['revision']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+# -- coding: utf-8 --
+"""
+Persistent cache of enrichment results (language, context, headline,
+sentiment), so an article is run through a model once per model version.
+
+pattern_model.ipynb enriches every row of clean_data.csv on every run,
+including the articles an earlier run already enriched. Results are kept in
+one SQLite file (ENRICH_CACHE, data/cache/enrichment.sqlite), one row per
+
+  (task, model, revision, params, content)
+
+  content   64-bit hash of the normalized text (NFC, whitespace collapsed,
+            as in scripts/embedding_store.py)
+  model     the model name, e.g. typeform/distilbert-base-uncased-mnli
+  revision  the model's hub commit (inference_backend.model_revision) and
+            the backend it ran on, e.g. "<commit>/onnx-int8" (the model
+            server's, as its stats report it, when the results come from
+            a ModelClient); the langdetect version for language
+            identification (scripts/lang_id.py)
+  params    everything else that changes the output (labels, max tokens,
+            generation arguments), as sorted JSON
+
+with the result as JSON. A lookup hashes the texts, fetches the rows that
+exist and hands only the missing distinct texts to the model, in one batch;
+an unchanged article does not reach the model at all, and when every row
+hits the model is never loaded. Upgrading one model changes its revision
+only, so only that model's results are computed again. Failed headlines
+(None) are not stored.
+
+Eviction runs when the cache is closed: rows not used for
+ENRICH_CACHE_MAX_AGE_DAYS are deleted, then the least recently used rows
+until the stored results fit in ENRICH_CACHE_MAX_MB. Results of a replaced
+model version are no longer touched, so they age out first. Every run's hits
+and misses per task are printed and kept in the file (runs table).
+
+  cache = InferenceCache()
+  nlp = CachedModels(model_server.connect() or enrichment, cache)
+  nlp.classify_context(df["content"])      # same calls and shapes as enrichment
+  cache.close()                            # evict, record and print the run
+
+  python scripts/inference_cache.py info   # size per model version, last runs
+  python scripts/inference_cache.py evict [--max-mb 200]
+  python scripts/inference_cache.py clear [--task headline]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import unicodedata
+from importlib import metadata
+
+import pandas as pd
+
+from text_norm import normalize_whitespace
+from url_index import url_hash
+
+CACHE_PATH = os.getenv("ENRICH_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "..", "data", "cache", "enrichment.sqlite"))
+MAX_MB = float(os.getenv("ENRICH_CACHE_MAX_MB", "200"))
+MAX_AGE_DAYS = float(os.getenv("ENRICH_CACHE_MAX_AGE_DAYS", "180"))
+ROW_OVERHEAD = 64   # bytes per row besides the result: key columns, index entries
+QUERY_CHUNK = 500   # keys per IN (...) lookup
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    task TEXT NOT NULL, model TEXT NOT NULL, revision TEXT NOT NULL, params TEXT NOT NULL,
+    content TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL,
+    PRIMARY KEY (task, model, revision, params, content));
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+CREATE TABLE IF NOT EXISTS runs (
+    started REAL NOT NULL, task TEXT NOT NULL, model TEXT NOT NULL, revision TEXT NOT NULL,
+    hits INTEGER NOT NULL, misses INTEGER NOT NULL);
+"""
+
+def content_key(text):
+    return f"{url_hash(normalize_whitespace(unicodedata.normalize('NFC', str(text)))):016x}"
+
+class InferenceCache:
+    def __init__(self, path=CACHE_PATH, max_mb=MAX_MB, max_age_days=MAX_AGE_DAYS):
+        self.path = path
+        self.max_bytes = int(max_mb * 1e6)
+        self.max_age = max_age_days * 86400
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")  # only takes effect on a new file
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.executescript(SCHEMA)
+        self.started = time.time()
+        self.counts = {}  # (task, model, revision) -> [hits, misses]
+
+    def lookup(self, task, model, revision, params, texts, compute):
+        """
+        Results of `compute` for `texts` (a list in input order), from the
+        cache where present. `compute` gets the missing distinct texts as a
+        list and returns one JSON-serializable result per text.
+        """
+        texts = [t if isinstance(t, str) else str(t) for t in texts]
+        params = json.dumps(params, sort_keys=True)
+        keys = [content_key(t) for t in texts]
+        found = {}
+        distinct = list(dict.fromkeys(keys))
+        for start in range(0, len(distinct), QUERY_CHUNK):
+            part = distinct[start:start + QUERY_CHUNK]
+            rows = self.db.execute(
+                f"SELECT content, value FROM results WHERE task = ? AND model = ? AND revision = ? AND params = ? "
+                f"AND content IN ({','.join('?' * len(part))})", (task, model, revision, params, *part))
+            found.update((k, json.loads(v)) for k, v in rows)
+        now = time.time()
+        with self.db:
+            self.db.executemany("UPDATE results SET used = ? WHERE task = ? AND model = ? AND revision = ? "
+                                "AND params = ? AND content = ?",
+                                [(now, task, model, revision, params, k) for k in found])
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            results = compute(list(missing.values()))
+            rows = []
+            for key, value in zip(missing, results):
+                found[key] = value
+                if value is not None:
+                    value = json.dumps(value, ensure_ascii=False)
+                    rows.append((task, model, revision, params, key, value, len(value) + ROW_OVERHEAD, now))
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        hits = sum(key not in missing for key in keys)
+        count = self.counts.setdefault((task, model, revision), [0, 0])
+        count[0] += hits
+        count[1] += len(keys) - hits
+        return [found[key] for key in keys]
+
+    def evict(self, max_bytes=None, max_age=None):
+        """Drop rows unused for max_age seconds, then the least recently used ones beyond max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        with self.db:
+            aged = self.db.execute("DELETE FROM results WHERE used < ?", (time.time() - max_age,)).rowcount
+            over = self.db.execute(
+                "DELETE FROM results WHERE rowid IN (SELECT rowid FROM (SELECT rowid, "
+                "SUM(size) OVER (ORDER BY used DESC, rowid DESC) AS kept FROM results) WHERE kept > ?)",
+                (max_bytes,)).rowcount
+        if aged or over:
+            self.db.execute("PRAGMA incremental_vacuum")
+        return aged, over
+
+    def size(self):
+        rows, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return rows, size
+
+    def report(self):
+        print("Inference cache:")
+        total = [0, 0]
+        for (task, model, revision), (hits, misses) in self.counts.items():
+            n = hits + misses
+            total[0] += hits
+            total[1] += misses
+            print(f"  {task:<10} {model:<45} {hits:>6}/{n:<6} hits ({hits / n if n else 0:.1%}), {misses} computed")
+        n = sum(total)
+        rows, size = self.size()
+        print(f"  total      {total[0]}/{n} hits ({total[0] / n if n else 0:.1%}); "
+              f"{rows} results, {size / 1e6:.1f} of {self.max_bytes / 1e6:.0f} MB")
+
+    def close(self):
+        """Evict, record this run's hit counts, print them."""
+        aged, over = self.evict()
+        with self.db:
+            self.db.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                                [(self.started, *k, *v) for k, v in self.counts.items()])
+        self.report()
+        if aged or over:
+            print(f"  evicted {aged} results unused for {self.max_age / 86400:.0f} days, {over} over the size limit")
+        self.db.close()
+
+# ----------------------------------------------------
+# CACHED ENRICHMENT
+def _revision(model_name, backend=None):
+    """Hub commit and backend of a model; `backend` defaults to the one this process would load it on."""
+    import inference_backend as ib
+    try:
+        revision = ib.model_revision(model_name)
+    except Exception:
+        revision = None
+    return f"{revision or 'unknown'}/{backend or ib.select_backend()}"
+
+class CachedModels:
+    """
+    The enrichment calls of `models` (scripts/enrichment.py, or a
+    model_server.ModelClient) with their results cached in `cache`; same
+    arguments and return shapes.
+    """
+
+    def __init__(self, models, cache=None):
+        import enrichment as en
+        self.models = models
+        self.cache = cache or InferenceCache()
+        self._en = en
+        self._revisions = {}
+
+    def _model(self, op):
+        if hasattr(self.models, "model_name"):
+            return self.models.model_name(op)
+        en = self._en
+        return {"classify": en.CONTEXT_MODEL, "summarize": en.SUMMARY_MODEL, "sentiment": en.SENTIMENT_MODEL}[op]
+
+    def _lookup(self, task, op, params, texts, compute):
+        model = self._model(op)
+        if model not in self._revisions:
+            backend = None
+            if hasattr(self.models, "backend"):
+                # a model server computes with its own backend, not the one this process would pick
+                backend = self.models.backend(op) or "unknown"
+            self._revisions[model] = _revision(model, backend)
+        return self.cache.lookup(task, model, self._revisions[model], params, texts, compute)
+
+    def classify_context(self, texts, labels=None):
+        en = self._en
+        index = texts.index if isinstance(texts, pd.Series) else None
+        labels = list(labels or en.CONTEXT_LABELS)
+
+        def compute(missing):
+            out = self.models.classify_context(missing, labels=labels)
+            return [{"context": c, "context_scores": s} for c, s in zip(out["context"], out["context_scores"])]
+
+        rows = self._lookup("context", "classify", {"labels": labels, "max_tokens": en.MAX_TOKENS}, texts, compute)
+        return pd.DataFrame({"context": [r["context"] for r in rows],
+                             "context_scores": [r["context_scores"] for r in rows]}, index=index)
+
+    def headlines(self, texts):
+        en = self._en
+        params = {"chars": en.HEADLINE_CHARS, **en.HEADLINE_ARGS}
+        return self._lookup("headline", "summarize", params, texts, self.models.headlines)
+
+    def classify_sentiment(self, texts):
+        return self._lookup("sentiment", "sentiment", {"max_tokens": self._en.MAX_TOKENS}, texts,
+                            self.models.classify_sentiment)
+
+    def detect_languages(self, texts):
+        import lang_id
+        try:
+            version = "langdetect-" + metadata.version("langdetect")
+        except metadata.PackageNotFoundError:
+            version = "unknown"
+        params = {"script_share": lang_id.SCRIPT_SHARE, "english_share": lang_id.ENGLISH_SHARE,
+                  "english_words": lang_id.ENGLISH_WORDS}
+        return self.cache.lookup("language", "lang_id", version, params, texts, self._en.detect_languages)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["info", "evict", "clear"])
+    ap.add_argument("--path", default=CACHE_PATH)
+    ap.add_argument("--max-mb", type=float, default=MAX_MB)
+    ap.add_argument("--max-age-days", type=float, default=MAX_AGE_DAYS)
+    ap.add_argument("--task", help="clear: only this task (language, context, headline, sentiment)")
+    args = ap.parse_args(argv)
+    if not os.path.isfile(args.path):
+        print(f"No inference cache at {args.path}")
+        return 0
+    cache = InferenceCache(args.path, args.max_mb, args.max_age_days)
+    if args.cmd == "evict":
+        aged, over = cache.evict()
+        print(f"Evicted {aged} results unused for {args.max_age_days:g} days, {over} over {args.max_mb:g} MB")
+    elif args.cmd == "clear":
+        with cache.db:
+            n = cache.db.execute("DELETE FROM results" + (" WHERE task = ?" if args.task else ""),
+                                 (args.task,) if args.task else ()).rowcount
+        cache.db.execute("PRAGMA incremental_vacuum")
+        print(f"Deleted {n} results")
+
+    rows, size = cache.size()
+    print(f"{args.path}: {rows} results, {size / 1e6:.1f} of {args.max_mb:g} MB")
+    for task, model, revision, n, size, used in cache.db.execute(
+            "SELECT task, model, revision, COUNT(*), SUM(size), MAX(used) FROM results "
+            "GROUP BY task, model, revision ORDER BY task, MAX(used) DESC"):
+        print(f"  {task:<10} {model:<45} {revision:<50} {n:>7} results {size / 1e6:7.2f} MB  "
+              f"last used {time.strftime('%Y-%m-%d', time.localtime(used))}")
+    runs = cache.db.execute("SELECT started, task, hits, misses FROM runs WHERE started IN "
+                            "(SELECT DISTINCT started FROM runs ORDER BY started DESC LIMIT 5) "
+                            "ORDER BY started DESC, task").fetchall()
+    if runs:
+        print("Recent runs:")
+    for started, task, hits, misses in runs:
+        n = hits + misses
+        print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(started))}  {task:<10} "
+              f"{hits:>6}/{n:<6} hits ({hits / n if n else 0:.1%})")
+    cache.db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# -- coding: utf-8 --
+"""
+Language identification for the enrichment stage, by Unicode script first.
+
+The corpus is English, Arabic and Russian (the dashboard labels en / ar / ru
+and everything else "Other"), and those three are written in different
+scripts, so the script of the letters decides nearly every article without a
+statistical model. langdetect, which the notebook ran on every row, is kept
+for the rest; it is seeded (DetectorFactory.seed = 0), so its answers no
+longer change from run to run.
+
+A batch is identified at once: the texts are concatenated, encoded as
+UTF-32 and every code point is mapped to a script class through one lookup
+table; np.bincount over (text, class) gives the letter histogram of every
+text in one call. Then, per text:
+
+  Arabic script >= SCRIPT_SHARE of the letters, none of the letters that
+      only Persian / Urdu use (پ چ ژ گ ک ی ے ...)          -> "ar"
+  Cyrillic >= SCRIPT_SHARE, none of the letters that only Ukrainian,
+      Belarusian, Serbian or Macedonian use (і ї є ґ ў ј љ ...) -> "ru"
+  Latin >= SCRIPT_SHARE and at least ENGLISH_SHARE of the first
+      ENGLISH_WORDS words are English function words (the, of, and, is,
+      ...; words that are not also common in other Latin-script languages)
+                                                                -> "en"
+  anything else (another script, mixed scripts, Latin text that is not
+  clearly English, no letters)                                  -> langdetect
+
+so a Spanish or Tagalog article still gets its own code from langdetect, and
+text langdetect cannot place (no letters) gets None instead of an exception.
+
+Agreement with langdetect and the speedup: scripts/bench_enrichment.py
+--stage language.
+"""
+import sys
+import unicodedata
+
+import numpy as np
+
+try:
+    from langdetect import DetectorFactory, detect
+    from langdetect.lang_detect_exception import LangDetectException
+    DetectorFactory.seed = 0
+except ImportError:
+    detect = None
+
+SCRIPT_SHARE = 0.6
+ENGLISH_SHARE = 0.15
+ENGLISH_WORDS = 200
+BATCH = 2000  # texts per concatenated buffer
+
+# script classes (histogram columns)
+NONE, LATIN, CYRILLIC, CYRILLIC_OTHER, ARABIC, ARABIC_OTHER, OTHER = range(7)
+SCRIPTS = ("none", "latin", "cyrillic", "cyrillic-other", "arabic", "arabic-other", "other")
+METHODS = ("script", "english-words", "langdetect")
+
+ENGLISH_FUNCTION_WORDS = frozenset(
+    "the of and is are was were be been that this these those with for from by which who whom whose have has "
+    "had will would should could can it its their they them there his her she he you your we our my not but "
+    "than then when what how if or an as all more most one new like just out up about after into over said "
+    "says also because while where".split())
+_CYRILLIC_OTHER = "іїєґўјљњћџђѓќѕІЇЄҐЎЈЉЊЋЏЂЃЌЅ"
+_ARABIC_OTHER = "پچژگکیےۓٹڈڑںھہۃ"
+
+def _script_table():
+    table = np.full(sys.maxunicode + 1, NONE, dtype=np.uint8)
+    for cp in range(0x10000):
+        ch = chr(cp)
+        if not unicodedata.category(ch).startswith("L"):
+            continue
+        if cp < 0x250 or 0x1E00 <= cp < 0x1F00 or 0xFF21 <= cp < 0xFF5B:
+            table[cp] = LATIN
+        elif 0x400 <= cp < 0x530 or 0x2DE0 <= cp < 0x2E00 or 0xA640 <= cp < 0xA6A0:
+            table[cp] = CYRILLIC
+        elif 0x600 <= cp < 0x700 or 0x750 <= cp < 0x780 or 0x8A0 <= cp < 0x900 or 0xFB50 <= cp < 0xFE00 \
+                or 0xFE70 <= cp < 0xFF00:
+            table[cp] = ARABIC
+        else:
+            table[cp] = OTHER
+    table[0x10000:] = OTHER  # astral planes: no Latin, Cyrillic or Arabic letters there
+    for ch in _CYRILLIC_OTHER:
+        table[ord(ch)] = CYRILLIC_OTHER
+    for ch in _ARABIC_OTHER:
+        table[ord(ch)] = ARABIC_OTHER
+    return table
+
+_TABLE = None
+
+def script_histogram(texts):
+    """(len(texts), len(SCRIPTS)) int array: code points of each script class per text."""
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = _script_table()
+    texts = [t if isinstance(t, str) else str(t) for t in texts]
+    out = np.zeros((len(texts), len(SCRIPTS)), dtype=np.int64)
+    for start in range(0, len(texts), BATCH):
+        part = texts[start:start + BATCH]
+        cp = np.frombuffer("".join(part).encode("utf-32-le", "surrogatepass"), dtype="<u4")
+        lengths = np.fromiter(map(len, part), dtype=np.int64, count=len(part))
+        row = np.repeat(np.arange(len(part)), lengths)
+        out[start:start + len(part)] = np.bincount(row * len(SCRIPTS) + _TABLE[cp],
+                                                   minlength=len(part) * len(SCRIPTS)).reshape(len(part), -1)
+    return out
+
+def english_share(text, words=ENGLISH_WORDS):
+    """Share of the first `words` words that are English function words."""
+    tokens = text.lower().split(None, words)[:words]
+    if not tokens:
+        return 0.0
+    hits = 0
+    for token in tokens:
+        if token.strip(".,;:!?\"'()[]“”‘’") in ENGLISH_FUNCTION_WORDS:
+            hits += 1
+    return hits / len(tokens)
+
+def langdetect_language(text):
+    """Seeded langdetect, None when it finds no features."""
+    if detect is None:
+        raise RuntimeError("langdetect is not installed: pip install langdetect")
+    try:
+        return detect(text)
+    except LangDetectException:
+        return None
+
+def identify(texts, fallback=True):
+    """
+    Language code of each text and how it was decided: two object arrays
+    in input order, codes and METHODS entries. fallback=False leaves the
+    texts the rules cannot decide at None instead of running langdetect.
+    """
+    texts = [t if isinstance(t, str) else str(t) for t in texts]
+    hist = script_histogram(texts)
+    letters = hist[:, LATIN:].sum(axis=1)
+    share = hist / np.maximum(letters, 1)[:, None]
+    arabic = (share[:, ARABIC] + share[:, ARABIC_OTHER] >= SCRIPT_SHARE) & (hist[:, ARABIC_OTHER] == 0)
+    russian = (share[:, CYRILLIC] + share[:, CYRILLIC_OTHER] >= SCRIPT_SHARE) & (hist[:, CYRILLIC_OTHER] == 0)
+    latin = share[:, LATIN] >= SCRIPT_SHARE
+
+    codes = np.full(len(texts), None, dtype=object)
+    methods = np.full(len(texts), "langdetect", dtype=object)
+    codes[arabic], methods[arabic] = "ar", "script"
+    codes[russian], methods[russian] = "ru", "script"
+    for i in np.flatnonzero(latin):
+        if english_share(texts[i]) >= ENGLISH_SHARE:
+            codes[i], methods[i] = "en", "english-words"
+    if fallback:
+        for i in np.flatnonzero(methods == "langdetect"):
+            codes[i] = langdetect_language(texts[i])
+    return codes, methods
+
+def detect_languages(texts, fallback=True):
+    """Language code of each text (None where none can be told), as a list in input order."""
+    return list(identify(texts, fallback)[0])
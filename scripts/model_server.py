@@ -0,0 +1,414 @@
+# -- coding: utf-8 --
+"""
+Long-lived local worker that keeps the pipeline's models loaded.
+
+Every pipeline run used to start fresh processes (the cleaning stage, the
+pattern_model notebook kernel) that loaded SentenceTransformer, the MNLI
+classifier, distilbart and XLM-R from disk again; on a small daily batch the
+loading took longer than the work. The worker loads each model once, on its
+first request (or in the background at start with --preload), and serves
+them over HTTP on 127.0.0.1:
+
+  POST /embed       {"texts": [...]}                 -> unit-length float32 vectors
+  POST /classify    {"texts": [...], "labels": [...]} -> {"context", "context_scores"} per text
+  POST /summarize   {"texts": [...]}                 -> headline per text
+  POST /sentiment   {"texts": [...]}                 -> sentiment label per text
+  GET  /stats                                        -> backend, queue depth and latency per model
+  POST /shutdown
+
+Each model has a queue and one batching thread. Requests from all callers
+are coalesced into micro-batches: when a request arrives the thread waits up
+to --max-wait-ms for more, then runs one call over at most --max-batch texts
+(requests for classify are only merged when their labels match), and splits
+the results back. Inside a micro-batch the enrichment functions
+(scripts/enrichment.py) still sort by length and pick the backend
+(scripts/inference_backend.py); embeddings come from data_cleaning.get_model.
+
+Clients: connect() returns a ModelClient when a worker answers, else None.
+Its classify_context / headlines / classify_sentiment take the same texts and
+return the same shapes as the enrichment functions, so a caller can do
+
+  nlp = model_server.connect() or enrichment
+  nlp.classify_context(df["content"])
+
+and its encode() has the SentenceTransformer signature, so it can stand in
+for the model in data_cleaning.add_similarity_scores / EmbeddingStore.encode.
+Large columns are sent in CLIENT_CHUNK-text requests so callers interleave.
+
+  python scripts/model_server.py serve [--preload embed,classify] [--port 8790]
+  python scripts/model_server.py start     # serve in the background unless one is running
+  python scripts/model_server.py stats
+  python scripts/model_server.py stop
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+import subprocess
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import requests
+
+SERVER_URL = os.getenv("ENRICH_SERVER_URL", "http://127.0.0.1:8790")
+MAX_BATCH = int(os.getenv("ENRICH_SERVER_MAX_BATCH", "64"))
+MAX_WAIT_MS = float(os.getenv("ENRICH_SERVER_MAX_WAIT_MS", "20"))
+LOG_PATH = os.getenv("ENRICH_SERVER_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                       "..", "data", "model_server.log"))
+CLIENT_CHUNK = 256
+OPS = ("embed", "classify", "summarize", "sentiment")
+
+# ----------------------------------------------------
+# MODELS (imported lazily: the client side needs none of them)
+def _model_name(op):
+    if op == "embed":
+        import data_cleaning as dc
+        return dc.MODEL_NAME
+    import enrichment as en
+    return {"classify": en.CONTEXT_MODEL, "summarize": en.SUMMARY_MODEL, "sentiment": en.SENTIMENT_MODEL}[op]
+
+def _backend(op):
+    """The inference backend this process runs `op` on (None for embeddings)."""
+    if op == "embed":
+        return None
+    import inference_backend as ib
+    return ib.select_backend()
+
+def _load(op):
+    import enrichment as en
+    if op == "embed":
+        import data_cleaning as dc
+        return dc.get_model()
+    return {"classify": en.get_classifier, "summarize": en.get_summarizer, "sentiment": en.get_sentiment}[op]()
+
+def _run(op, model, texts, params):
+    import enrichment as en
+    if op == "embed":
+        import data_cleaning as dc
+        return list(model.encode(texts, batch_size=dc.ENCODE_BATCH, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False).astype(np.float32))
+    if op == "classify":
+        out = en.classify_context(texts, model, params.get("labels") or en.CONTEXT_LABELS)
+        return [{"context": c, "context_scores": s} for c, s in zip(out["context"], out["context_scores"])]
+    if op == "summarize":
+        return en.headlines(texts, model)
+    return en.classify_sentiment(texts, model)
+
+class _Request:
+    __slots__ = ("texts", "params", "key", "submitted", "done", "result", "error")
+
+    def __init__(self, texts, params):
+        self.texts = texts
+        self.params = params
+        self.key = json.dumps(params, sort_keys=True)
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class ModelWorker:
+    """One model: a request queue and the thread that runs it in micro-batches."""
+
+    def __init__(self, op, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, preload=False):
+        self.op = op
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.model = None
+        self.model_name = _model_name(op)
+        try:
+            self.serves_backend = _backend(op)
+        except Exception as e:  # reported again when the model is loaded
+            self.serves_backend = None
+            print(f"{op}: no inference backend: {e}")
+        self.load_sec = None
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._load_lock = threading.Lock()
+        self._preload = preload
+        self._latency = deque(maxlen=2000)
+        self.requests = self.texts = self.batches = self.errors = 0
+        self.compute_sec = 0.0
+        threading.Thread(target=self._loop, name=f"model-{op}", daemon=True).start()
+
+    def load(self):
+        with self._load_lock:
+            if self.model is None:
+                t0 = time.perf_counter()
+                self.model = _load(self.op)
+                self.load_sec = time.perf_counter() - t0
+                print(f"[{self.op}] loaded {self.model_name} in {self.load_sec:.1f}s", flush=True)
+        return self.model
+
+    def submit(self, texts, params=None):
+        req = _Request(list(texts), params or {})
+        with self._cond:
+            self._queue.append(req)
+            self._cond.notify()
+        req.done.wait()
+        if req.error is not None:
+            raise RuntimeError(req.error)
+        return req.result
+
+    def _take(self):
+        """Block for a request, wait up to max_wait for company, pop one micro-batch."""
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = time.perf_counter() + self.max_wait
+            while sum(len(r.texts) for r in self._queue) < self.max_batch:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            first = self._queue.popleft()
+            batch, n = [first], len(first.texts)
+            for req in list(self._queue):
+                if n >= self.max_batch:
+                    break
+                if req.key == first.key and n + len(req.texts) <= self.max_batch:
+                    self._queue.remove(req)
+                    batch.append(req)
+                    n += len(req.texts)
+            return batch
+
+    def _loop(self):
+        if self._preload:
+            try:
+                self.load()
+            except Exception as e:
+                print(f"[{self.op}] preload failed: {e}", flush=True)
+        while True:
+            batch = self._take()
+            texts = [t for req in batch for t in req.texts]
+            try:
+                model = self.load()
+                t0 = time.perf_counter()
+                results = _run(self.op, model, texts, batch[0].params) if texts else []
+                self.compute_sec += time.perf_counter() - t0
+                error = None
+            except Exception as e:
+                results, error = None, f"{type(e).__name__}: {e}"
+                self.errors += 1
+            now = time.perf_counter()
+            start = 0
+            for req in batch:
+                if error is None:
+                    req.result = results[start:start + len(req.texts)]
+                    start += len(req.texts)
+                req.error = error
+                self._latency.append(now - req.submitted)
+                req.done.set()
+            self.requests += len(batch)
+            self.texts += len(texts)
+            self.batches += 1
+
+    def stats(self):
+        with self._cond:
+            queued = list(self._queue)
+        lat = np.array(self._latency) * 1000 if self._latency else None
+        return {
+            "model": self.model_name, "loaded": self.model is not None,
+            "backend": getattr(self.model, "backend_name", "torch") if self.model is not None else None,
+            "serves_backend": self.serves_backend,
+            "load_sec": self.load_sec,
+            "queue_requests": len(queued), "queue_texts": sum(len(r.texts) for r in queued),
+            "requests": self.requests, "texts": self.texts, "batches": self.batches, "errors": self.errors,
+            "mean_batch": self.texts / self.batches if self.batches else 0.0,
+            "latency_ms_p50": float(np.percentile(lat, 50)) if lat is not None else None,
+            "latency_ms_p95": float(np.percentile(lat, 95)) if lat is not None else None,
+            "compute_ms_per_text": 1000 * self.compute_sec / self.texts if self.texts else None,
+        }
+
+# ----------------------------------------------------
+# HTTP SERVER
+def _pack(vectors):
+    arr = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+    return {"dtype": "float32", "shape": list(arr.shape), "data": base64.b64encode(arr.tobytes()).decode("ascii")}
+
+def _unpack(obj):
+    return np.frombuffer(base64.b64decode(obj["data"]), dtype=obj["dtype"]).reshape(obj["shape"])
+
+class ModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, preload=()):
+        super().__init__(addr, _Handler)
+        self.started = time.time()
+        self.workers = {op: ModelWorker(op, max_batch, max_wait_ms, op in preload) for op in OPS}
+
+    def stats(self):
+        return {"uptime_sec": round(time.time() - self.started, 1),
+                "models": {op: w.stats() for op, w in self.workers.items()}}
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._reply(200, self.server.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        op = self.path.strip("/")
+        if op == "shutdown":
+            self._reply(200, {"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if op not in OPS:
+            self._reply(404, {"error": f"unknown operation {op!r}"})
+            return
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            params = {"labels": list(req["labels"])} if op == "classify" and req.get("labels") else {}
+            results = self.server.workers[op].submit([str(t) for t in req.get("texts", [])], params)
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"results": _pack(results) if op == "embed" else results})
+
+def serve(host="127.0.0.1", port=8790, preload=(), max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+    srv = ModelServer((host, port), max_batch, max_wait_ms, preload)
+    print(f"Model server on http://{host}:{port} (max batch {max_batch}, max wait {max_wait_ms:g} ms)", flush=True)
+    try:
+        srv.serve_forever()
+    finally:
+        srv.server_close()
+
+# ----------------------------------------------------
+# CLIENT
+class ModelClient:
+    def __init__(self, url=SERVER_URL, timeout=600):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, op, texts, **extra):
+        r = self.session.post(f"{self.url}/{op}", json={"texts": texts, **extra}, timeout=self.timeout)
+        if r.status_code != 200:
+            raise RuntimeError(f"model server {op}: {r.json().get('error', r.status_code)}")
+        return r.json()["results"]
+
+    def _chunked(self, op, texts, **extra):
+        texts = [t if isinstance(t, str) else str(t) for t in texts]
+        out = []
+        for i in range(0, len(texts), CLIENT_CHUNK):
+            out.extend(self._post(op, texts[i:i + CLIENT_CHUNK], **extra))
+        return out
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, normalize_embeddings=True,
+               show_progress_bar=False, **kwargs):
+        """SentenceTransformer.encode stand-in: unit-length float32 rows."""
+        texts = [texts] if isinstance(texts, str) else [str(t) for t in texts]
+        parts = [_unpack(self._post("embed", texts[i:i + CLIENT_CHUNK]))
+                 for i in range(0, len(texts), CLIENT_CHUNK)]
+        return np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    def classify_context(self, texts, labels=None):
+        index = texts.index if isinstance(texts, pd.Series) else None
+        rows = self._chunked("classify", list(texts), **({"labels": list(labels)} if labels else {}))
+        return pd.DataFrame({"context": [r["context"] for r in rows],
+                             "context_scores": [r["context_scores"] for r in rows]}, index=index)
+
+    def headlines(self, texts):
+        return self._chunked("summarize", list(texts))
+
+    def classify_sentiment(self, texts):
+        return self._chunked("sentiment", list(texts))
+
+    def stats(self):
+        return self.session.get(f"{self.url}/stats", timeout=10).json()
+
+    def model_name(self, op):
+        return self.stats()["models"][op]["model"]
+
+    def backend(self, op):
+        """The backend the worker runs `op` on, loaded or not (what a result cache must key on)."""
+        return self.stats()["models"][op]["serves_backend"]
+
+    def shutdown(self):
+        self.session.post(f"{self.url}/shutdown", timeout=10)
+
+def connect(url=SERVER_URL, timeout=2.0):
+    """A ModelClient when a worker answers at `url`, else None."""
+    client = ModelClient(url)
+    try:
+        client.session.get(f"{client.url}/stats", timeout=timeout).raise_for_status()
+    except requests.RequestException:
+        return None
+    return client
+
+def print_stats(stats):
+    print(f"Model server up {stats['uptime_sec']:.0f}s")
+    print(f"  {'op':<10} {'model':<45} {'backend':<10} {'queue':>6} {'requests':>9} {'mean batch':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'ms/text':>8}")
+    fmt = lambda v: f"{v:.0f}" if v is not None else "-"
+    for op, s in stats["models"].items():
+        print(f"  {op:<10} {s['model']:<45} {s['backend'] or '(idle)':<10} {s['queue_texts']:>6} "
+              f"{s['requests']:>9} {s['mean_batch']:>10.1f} {fmt(s['latency_ms_p50']):>8} "
+              f"{fmt(s['latency_ms_p95']):>8} {fmt(s['compute_ms_per_text']):>8}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["serve", "start", "stats", "stop"])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=int(SERVER_URL.rsplit(":", 1)[-1]))
+    ap.add_argument("--preload", default="", help=f"comma-separated models to load at start: {','.join(OPS)}")
+    ap.add_argument("--max-batch", type=int, default=MAX_BATCH, help="texts per micro-batch")
+    ap.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="how long a batch waits for more requests")
+    ap.add_argument("--log", default=LOG_PATH, help="start: log file")
+    args = ap.parse_args(argv)
+    url = f"http://{args.host}:{args.port}"
+    preload = [op for op in args.preload.split(",") if op]
+
+    if args.cmd == "serve":
+        serve(args.host, args.port, preload, args.max_batch, args.max_wait_ms)
+        return 0
+    client = connect(url)
+    if args.cmd == "stats":
+        if client is None:
+            print(f"No model server at {url}")
+            return 1
+        print_stats(client.stats())
+        return 0
+    if args.cmd == "stop":
+        if client is not None:
+            client.shutdown()
+            print(f"Stopped the model server at {url}")
+        return 0
+
+    if client is not None:
+        print(f"Model server already running at {url}")
+        return 0
+    cmd = [sys.executable, os.path.abspath(__file__), "serve", "--host", args.host, "--port", str(args.port),
+           "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)]
+    if preload:
+        cmd += ["--preload", ",".join(preload)]
+    os.makedirs(os.path.dirname(os.path.abspath(args.log)), exist_ok=True)
+    with open(args.log, "a", encoding="utf-8") as log:
+        subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                         start_new_session=True)
+    for _ in range(120):
+        time.sleep(0.5)
+        if connect(url) is not None:
+            print(f"Model server started at {url} (log: {args.log})")
+            return 0
+    print(f"Model server did not come up; see {args.log}")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
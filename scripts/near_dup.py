@@ -0,0 +1,170 @@
+# -- coding: utf-8 --
+"""
+Near-duplicate detection for scraped articles (MinHash + LSH).
+
+Syndicated wire stories reach several sources with small edits, so exact
+matching on title/content misses them. Every article body is reduced to its
+set of word 3-gram shingles and summarized by a MinHash signature of
+NUM_PERM values; the fraction of equal signature values estimates the
+Jaccard similarity of two bodies. Bodies at or above THRESHOLD are the same
+story.
+
+Lookup is banded LSH: the signature is cut into BANDS bands of ROWS values
+and each band is hashed to a 64-bit bucket key. Two bodies with Jaccard 0.8
+share at least one bucket with probability ~0.9998; unrelated bodies almost
+never do, so a lookup compares against a handful of candidates whatever the
+size of the corpus.
+
+(A 64-bit SimHash with Hamming-distance bands was tried first, but on our
+articles a ~2% body edit already moves it by 5-10 bits, about as far as
+unrelated stories, so it could not separate the two.)
+
+On disk, <prefix>.sig holds one record per indexed article: int64 id plus the
+uint32 signature. Records added during a run are only appended by commit(),
+which main() calls once the run's rows are in the store, so the index never
+refers to ids that were not stored. At open the bucket keys
+of all records go into one sorted array (binary search per band); records
+added during the run are kept in a dict. Not thread-safe: use it from one
+thread.
+"""
+import os
+import re
+
+import numpy as np
+
+from url_index import url_hash
+
+SHINGLE = 3
+MIN_TOKENS = 30  # shorter bodies give unstable signatures; don't index them
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = 0.8
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_DTYPE = np.dtype([("id", "<i8"), ("sig", "<u4", (NUM_PERM,))])
+_SEEDS = np.array([url_hash(f"minhash-{i}") for i in range(NUM_PERM)], dtype=np.uint64)
+_BAND_SALT = np.array([url_hash(f"band-{b}") for b in range(BANDS)], dtype=np.uint64)
+
+def _mix(x):
+    # splitmix64 finalizer, vectorized over a uint64 array
+    with np.errstate(over="ignore"):
+        x = x ^ (x >> np.uint64(30)); x = x * np.uint64(0xBF58476D1CE4E5B9)
+        x = x ^ (x >> np.uint64(27)); x = x * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def shingle_hashes(text):
+    """uint64 hashes of the distinct word 3-grams of `text`, or None for short texts."""
+    tokens = _TOKEN.findall((text or "").lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    # Hash each distinct token once, then combine neighbours into shingle hashes.
+    cache = {}
+    h = np.fromiter((cache[t] if t in cache else cache.setdefault(t, url_hash(t)) for t in tokens),
+                    dtype=np.uint64, count=len(tokens))
+    n = len(h) - SHINGLE + 1
+    shingles = h[:n]
+    for k in range(1, SHINGLE):
+        shingles = _mix(shingles) ^ h[k:n + k]
+    return np.unique(shingles)
+
+def minhash(text):
+    """uint32[NUM_PERM] MinHash signature of `text`, or None for short texts."""
+    shingles = shingle_hashes(text)
+    if shingles is None:
+        return None
+    return (_mix(shingles[:, None] ^ _SEEDS[None, :]).min(axis=0) >> np.uint64(32)).astype(np.uint32)
+
+def band_keys(sigs):
+    """(n, NUM_PERM) signatures -> (n, BANDS) uint64 bucket keys, salted per band."""
+    v = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    key = _BAND_SALT[None, :]
+    for r in range(ROWS):
+        key = _mix(key ^ v[:, :, r])
+    return key
+
+def similarity(a, b):
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+class NearDupIndex:
+    def __init__(self, path_prefix):
+        self.path = path_prefix + ".sig"
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+        self.is_new = not os.path.isfile(self.path)
+
+        data = b""
+        if not self.is_new:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        recs = np.frombuffer(data[: len(data) - len(data) % _DTYPE.itemsize], dtype=_DTYPE)  # drop a torn last write
+        self._ids = recs["id"]
+        self._sigs = recs["sig"]
+        keys = band_keys(self._sigs).ravel()
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+        self._delta = {}       # bucket key -> [(id, sig)] for records added this run
+        self._n_delta = 0
+        self._pending = []
+        self._log = open(self.path, "ab")
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._ids) + self._n_delta
+
+    def _candidates(self, keys):
+        rows = set()
+        for key in keys:
+            lo = np.searchsorted(self._keys, key, side="left")
+            hi = np.searchsorted(self._keys, key, side="right")
+            rows.update(int(i) // BANDS for i in self._order[lo:hi])
+        for r in rows:
+            yield int(self._ids[r]), self._sigs[r]
+        for key in keys:
+            yield from self._delta.get(int(key), ())
+
+    def find(self, sig):
+        """Id of the most similar indexed article with similarity >= THRESHOLD, or None."""
+        best = None
+        for cid, csig in self._candidates(band_keys(sig[None, :])[0]):
+            s = similarity(sig, csig)
+            if s >= THRESHOLD and (best is None or (-s, cid) < best):
+                best = (-s, cid)
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best[1]
+
+    def add(self, sig, article_id):
+        for key in band_keys(sig[None, :])[0]:
+            self._delta.setdefault(int(key), []).append((article_id, sig))
+        self._n_delta += 1
+        self._pending.append((article_id, sig))
+
+    def seed(self, rows):
+        """Index already-stored rows (id + content); returns how many were indexed."""
+        n = 0
+        for r in rows:
+            sig = minhash(r.get("content"))
+            if sig is not None and r.get("id") is not None:
+                self.add(sig, r["id"])
+                n += 1
+        self.commit()
+        return n
+
+    def commit(self):
+        """Append the records added since the last commit to <prefix>.sig."""
+        if not self._pending:
+            return
+        recs = np.zeros(len(self._pending), dtype=_DTYPE)
+        recs["id"] = [i for i, _ in self._pending]
+        recs["sig"] = np.stack([s for _, s in self._pending])
+        self._log.write(recs.tobytes())
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._pending = []
+
+    def close(self):
+        """Uncommitted records (a run that never reached the store) are dropped."""
+        self._log.close()
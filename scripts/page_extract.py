@@ -0,0 +1,211 @@
+# -- coding: utf-8 --
+"""
+Single-parse article extraction on lxml.
+
+analyze_page() parses a document once and collects, in one walk of the tree,
+everything is_article_page / extract_title / extract_content and the h1/h2
+fields of fetch_article need. The rules are the same as the BeautifulSoup
+functions in web_scraping.py (which stay the reference implementation):
+
+  - og:type == article, or a JSON-LD (News)Article, or
+    <article> + <h1> + 3 paragraphs longer than 60 chars
+  - bbc.com /news/ and nytimes.com section[name=articleBody] special cases
+  - title from og:title, else the first <h1>
+  - body from section[name=articleBody] paragraphs, else the first <article>,
+    else every <p>; short and boilerplate paragraphs dropped
+
+Text is gathered like bs4's get_text(): comments and the contents of
+script/style/template elements are skipped, each string is stripped.
+JSON-LD blocks are only json.loads'd when they can mention an article type.
+
+The two parsers agree on well-formed pages but not on malformed markup,
+which real sites serve:
+
+  - unclosed <p>: html.parser nests each following <p> inside the open one,
+    so bs4 joins them into one paragraph; libxml2 closes the <p> first;
+  - <div>, <ul>, <h2> ... inside <p>: libxml2 closes the <p> at the block
+    element, so the block's text and the text after it are no longer in
+    that paragraph (and may not be in any <p>); html.parser keeps them in;
+  - text after an unclosed <h1> ends up in bs4's h1 field.
+
+So content / h1 / h2 can differ from the bs4 engine, which is why
+web_scraping.py keeps bs4 as the default (SCRAPE_PARSER=lxml to opt in).
+scripts/bench_extract.py checks both on a saved corpus and on these cases.
+
+With a `timings` dict, analyze_page stores the seconds spent in "parse"
+(tree building and the collection walk), "detect" and "extract".
+"""
+import json
+import time
+
+import lxml.html
+from lxml import etree
+
+from text_norm import keep_paragraphs
+
+_SKIP_TEXT = frozenset(["script", "style", "template"])
+_ARTICLE_TYPES = {"newsarticle", "article"}
+
+def _parse(html):
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an XML encoding declaration, or NUL/control characters
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+        try:
+            return lxml.html.document_fromstring(html.replace("\x00", "").encode("utf-8"), parser=parser)
+        except (ValueError, etree.ParserError):
+            return None
+    except etree.ParserError:
+        return None
+
+def _strings(el, parts):
+    t = el.text
+    if t:
+        t = t.strip()
+        if t: parts.append(t)
+    for child in el:
+        tag = child.tag
+        if isinstance(tag, str) and tag not in _SKIP_TEXT:
+            _strings(child, parts)
+        tail = child.tail
+        if tail:
+            tail = tail.strip()
+            if tail: parts.append(tail)
+    return parts
+
+def _ld_is_article(text):
+    if not text:
+        return False
+    low = text.lower()
+    if "article" not in low and "\\u" not in low:
+        return False
+    try:
+        data = json.loads(text)
+        items = data if isinstance(data, list) else [data]
+        for obj in items:
+            if not isinstance(obj, dict): continue
+            graph = obj.get("@graph")
+            if isinstance(graph, list):
+                for g in graph:
+                    if str(g.get("@type", "")).lower() in _ARTICLE_TYPES:
+                        return True
+            if str(obj.get("@type", "")).lower() in _ARTICLE_TYPES:
+                return True
+    except Exception:
+        pass
+    return False
+
+def analyze_page(html, url=None, timings=None):
+    """
+    Return {"title", "content", "h1", "h2"} for an article page, or None when
+    the page is not an article (same decision as is_article_page). title and
+    content may still be None, exactly like extract_title/extract_content.
+    h1/h2 are lists of heading texts.
+    """
+    t0 = time.perf_counter()
+    root = _parse(html)
+    if root is None:
+        if timings is not None: timings["parse"] = time.perf_counter() - t0
+        return None
+
+    og_type = og_title = None
+    ld_texts, h1s, h2s = [], [], []
+    all_ps, article_ps, section_ps, any_section_ps = [], [], [], []
+    first_article = first_section = None
+    in_article = in_section = in_any_section = 0
+
+    for event, el in etree.iterwalk(root, events=("start", "end")):
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue
+        if event == "end":
+            if el is first_article: in_article = 0
+            if tag == "section" and el.get("name") == "articleBody":
+                in_any_section -= 1
+                if el is first_section: in_section = 0
+            continue
+
+        if tag == "p":
+            all_ps.append(el)
+            if in_article: article_ps.append(el)
+            if in_section: section_ps.append(el)
+            if in_any_section: any_section_ps.append(el)
+        elif tag == "meta":
+            prop = el.get("property")
+            if prop == "og:type" and og_type is None:
+                og_type = el
+            elif prop == "og:title" and og_title is None:
+                og_title = el
+        elif tag == "script":
+            if (el.get("type") or "").lower() == "application/ld+json":
+                ld_texts.append(el.text)
+        elif tag == "h1":
+            h1s.append(el)
+        elif tag == "h2":
+            h2s.append(el)
+        elif tag == "article":
+            if first_article is None:
+                first_article, in_article = el, 1
+        elif tag == "section" and el.get("name") == "articleBody":
+            in_any_section += 1
+            if first_section is None:
+                first_section, in_section = el, 1
+
+    t1 = time.perf_counter()
+    if timings is not None: timings["parse"] = t1 - t0
+
+    parts = {}
+    def strings(el):
+        p = parts.get(el)
+        if p is None:
+            p = parts[el] = _strings(el, [])
+        return p
+
+    # ---- article check (is_article_page) ----
+    def long_count(ps):
+        return sum(1 for p in ps if len("".join(strings(p))) > 60)
+
+    is_article = og_type is not None and (og_type.get("content") or "").lower() == "article"
+    if not is_article:
+        is_article = any(_ld_is_article(t) for t in ld_texts)
+    if not is_article:
+        has_h1 = bool(h1s)
+        n_long = long_count(all_ps)
+        is_article = (first_article is not None and has_h1 and n_long >= 3) or \
+            bool(url and "bbc.com" in url and "/news/" in url and (has_h1 or n_long >= 3)) or \
+            bool(url and "nytimes.com" in url and first_section is not None and long_count(any_section_ps) >= 3)
+    t2 = time.perf_counter()
+    if timings is not None: timings["detect"] = t2 - t1
+    if not is_article:
+        return None
+
+    # ---- title (extract_title) ----
+    if og_title is not None and og_title.get("content"):
+        title = og_title.get("content").strip()
+    else:
+        title = "".join(strings(h1s[0])) if h1s else None
+
+    # ---- body (extract_content) ----
+    def paragraphs(ps):
+        return keep_paragraphs(" ".join(strings(p)) for p in ps)
+
+    content = None
+    if first_section is not None:
+        paras = paragraphs(section_ps)
+        if paras:
+            content = "\n\n".join(paras)
+    if content is None:
+        paras = paragraphs(article_ps if first_article is not None else all_ps)
+        content = "\n\n".join(paras) if paras else None
+
+    page = {
+        "title": title,
+        "content": content,
+        "h1": [" ".join(strings(h)) for h in h1s],
+        "h2": [" ".join(strings(h)) for h in h2s],
+    }
+    if timings is not None: timings["extract"] = time.perf_counter() - t2
+    return page
@@ -0,0 +1,72 @@
+# -- coding: utf-8 --
+"""
+Process-pool parse stage for the scraper.
+
+Fetch threads only do network I/O: they hand the raw response body
+(bytes + declared encoding) to ParsePool.analyze(), which runs decoding,
+the article check and extraction (web_scraping.analyze_page) in a worker
+process and returns the page dict. Parsing therefore scales with the number
+of processes instead of being bound to one core by the GIL.
+
+At most `max_pending` bodies are queued or being parsed at any time; a fetch
+thread that finds the queue full blocks until a slot frees up, which keeps
+memory bounded however fast the fetchers are.
+"""
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+_analyze = None
+
+def _init_worker():
+    global _analyze
+    import web_scraping
+    _analyze = web_scraping.parse_body
+
+def _run(content, encoding, url):
+    timings = {}
+    return _analyze(content, encoding, url, timings), timings
+
+class ParsePool:
+    def __init__(self, workers, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending or 2 * workers
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        # spawn: the crawl is multi-threaded, and forking a threaded process is unsafe
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         mp_context=multiprocessing.get_context("spawn"))
+        self.jobs = 0
+        self.bytes = 0
+
+    def analyze(self, content, encoding, url, timings=None):
+        """Parse one body in a worker; blocks while max_pending bodies are in flight."""
+        t0 = time.perf_counter()
+        self._slots.acquire()
+        try:
+            with self._lock:
+                self.jobs += 1
+                self.bytes += len(content)
+            t1 = time.perf_counter()
+            page, worker_timings = self._pool.submit(_run, content, encoding, url).result()
+        finally:
+            self._slots.release()
+        if timings is not None:
+            timings.update(worker_timings)
+            # queueing for a slot, plus pickling / IPC around the worker's own stages
+            timings["parse_wait"] = t1 - t0
+            timings["parse_ipc"] = max(0.0, time.perf_counter() - t1 - sum(worker_timings.values()))
+        return page
+
+    def summary(self):
+        return f"Parse pool: {self.jobs} pages ({self.bytes / 1e6:.1f} MB) parsed by {self.workers} processes"
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,307 @@
+# -- coding: utf-8 --
+"""
+Append-only, segmented store for raw scraped articles.
+
+Layout under the store root (data/raw):
+
+  manifest.json          ordered list of live segments + id watermark info
+  segments/seg-*.csv     one segment per scraper run (or per compaction)
+  data.csv               pre-existing history, adopted as the first segment
+
+Each run writes its rows to a new segment (temp file, fsync, rename) and only
+then publishes it in the manifest (again temp + fsync + os.replace). A crash
+at any point leaves the previous manifest and every segment it lists intact;
+a half-written segment is never referenced and is cleaned up later.
+
+Readers pass an id watermark to iter_rows() / read_df() and only open the
+segments holding newer rows. compact() merges runs of small segments into one;
+the merged-away files are kept until the next compaction so readers holding
+an older manifest can finish.
+
+Usage (the store under SCRAPE_RAW_DIR, data/raw by default, as for the scraper):
+  python scripts/raw_store.py info
+  python scripts/raw_store.py compact
+  python scripts/raw_store.py export OUT.csv [--after-id N]
+"""
+import os
+import csv
+import sys
+import json
+import threading
+from datetime import datetime, timezone
+
+FIELDS = ["id", "source", "url", "title", "fetched_at", "t_total_sec", "content", "h1", "h2", "dup_of"]
+COMPACT_TARGET_ROWS = 20_000
+MANIFEST_VERSION = 1
+
+def _utcnow():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _parse_row(row):
+    return {
+        "id": int(row.get("id") or 0) if row.get("id") else None,
+        "source": row.get("source") or "",
+        "url": (row.get("url") or "").strip(),
+        "title": (row.get("title") or "").strip(),
+        "fetched_at": row.get("fetched_at") or "",
+        "t_total_sec": float(row.get("t_total_sec") or 0) if row.get("t_total_sec") else 0,
+        "content": row.get("content") or "",
+        "h1": row.get("h1") or "",
+        "h2": row.get("h2") or "",
+        "dup_of": int(row["dup_of"]) if row.get("dup_of") else None,
+    }
+
+def _write_csv(path, rows):
+    """Write rows to `path` atomically and durably; return (count, min_id, max_id)."""
+    tmp = path + ".tmp"
+    n, min_id, max_id = 0, None, None
+    with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: r.get(k, "") for k in FIELDS})
+            n += 1
+            iid = r.get("id")
+            if isinstance(iid, int):
+                min_id = iid if min_id is None else min(min_id, iid)
+                max_id = iid if max_id is None else max(max_id, iid)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path))
+    return n, min_id, max_id
+
+class RawStore:
+    def __init__(self, root, legacy_csv="data.csv"):
+        self.root = root
+        self.seg_dir = os.path.join(root, "segments")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.seg_dir, exist_ok=True)
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"version": MANIFEST_VERSION, "next_seq": 1, "segments": [], "retired": []}
+            legacy = os.path.join(root, legacy_csv) if legacy_csv else None
+            if legacy and os.path.isfile(legacy):
+                self.manifest["segments"].append(self._describe(legacy_csv, legacy=True))
+            self._save_manifest()
+        self._remove_orphans()
+
+    # ---------------- manifest ----------------
+    def _path(self, entry):
+        return os.path.join(self.root, entry["name"])
+
+    def _describe(self, name, legacy=False):
+        n, min_id, max_id = 0, None, None
+        for r in self._read_segment(os.path.join(self.root, name)):
+            n += 1
+            if r["id"] is not None:
+                min_id = r["id"] if min_id is None else min(min_id, r["id"])
+                max_id = r["id"] if max_id is None else max(max_id, r["id"])
+        return {"name": name, "rows": n, "min_id": min_id, "max_id": max_id,
+                "created_at": _utcnow(), "legacy": legacy}
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.manifest_path)
+        _fsync_dir(self.root)
+
+    def _remove_orphans(self):
+        """Delete segment files no manifest entry references (crashed writes)."""
+        live = {e["name"] for e in self.manifest["segments"]} | set(self.manifest.get("retired", []))
+        for fn in os.listdir(self.seg_dir):
+            name = f"segments/{fn}"
+            if name not in live:
+                try:
+                    os.remove(os.path.join(self.seg_dir, fn))
+                except OSError:
+                    pass
+
+    @property
+    def segments(self):
+        return list(self.manifest["segments"])
+
+    @property
+    def max_id(self):
+        return max((e["max_id"] or 0 for e in self.manifest["segments"]), default=0)
+
+    @property
+    def row_count(self):
+        return sum(e["rows"] for e in self.manifest["segments"])
+
+    # ---------------- write ----------------
+    def append_segment(self, rows):
+        """Write `rows` as a new segment and publish it. Returns the manifest entry (or None)."""
+        rows = list(rows)
+        if not rows:
+            return None
+        with self._lock:
+            seq = self.manifest["next_seq"]
+            self.manifest["next_seq"] = seq + 1
+        name = f"segments/seg-{seq:06d}.csv"
+        n, min_id, max_id = _write_csv(os.path.join(self.root, name), rows)
+        entry = {"name": name, "rows": n, "min_id": min_id, "max_id": max_id,
+                 "created_at": _utcnow(), "legacy": False}
+        with self._lock:
+            self.manifest["segments"].append(entry)
+            self._save_manifest()
+        return entry
+
+    # ---------------- read ----------------
+    @staticmethod
+    def _read_segment(path):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                yield _parse_row(row)
+
+    def segments_after(self, after_id=None):
+        segs = self.segments
+        if after_id is None:
+            return segs
+        return [e for e in segs if e["max_id"] is None or e["max_id"] > after_id]
+
+    def iter_rows(self, after_id=None):
+        """Yield rows with id > after_id, opening only segments that can hold them."""
+        for e in self.segments_after(after_id):
+            for r in self._read_segment(self._path(e)):
+                if after_id is None or (r["id"] or 0) > after_id:
+                    yield r
+
+    def columns(self, after_id=None):
+        """FIELDS, then the columns only some segments have (the legacy data.csv's published_at), in header order."""
+        cols = list(FIELDS)
+        for e in self.segments_after(after_id):
+            with open(self._path(e), "r", encoding="utf-8-sig", newline="") as f:
+                header = next(csv.reader(f), [])
+            cols.extend(c for c in header if c not in cols)
+        return cols
+
+    def read_df(self, after_id=None, **read_csv_kwargs):
+        """
+        Rows with id > after_id as one DataFrame. Every segment is reindexed
+        to columns(), so a column missing from a segment is NaN there rather
+        than each frame bringing its own schema into the concat.
+        """
+        import pandas as pd
+        cols = self.columns(after_id)
+        frames = [pd.read_csv(self._path(e), encoding="utf-8-sig", **read_csv_kwargs).reindex(columns=cols)
+                  for e in self.segments_after(after_id)]
+        if not frames:
+            return pd.DataFrame(columns=cols)
+        df = pd.concat(frames, ignore_index=True)
+        if after_id is not None:
+            df = df[pd.to_numeric(df["id"], errors="coerce") > after_id]
+        return df
+
+    def iter_chunks(self, chunk_rows, after_id=None, **read_csv_kwargs):
+        """
+        Rows with id > after_id as DataFrames of at most `chunk_rows` rows,
+        segment by segment, with the same columns as read_df().
+        """
+        import pandas as pd
+        cols = self.columns(after_id)
+        for e in self.segments_after(after_id):
+            for df in pd.read_csv(self._path(e), encoding="utf-8-sig", chunksize=chunk_rows, **read_csv_kwargs):
+                df = df.reindex(columns=cols)
+                if after_id is not None:
+                    df = df[pd.to_numeric(df["id"], errors="coerce") > after_id]
+                if len(df):
+                    yield df
+
+    def export_csv(self, path, after_id=None):
+        return _write_csv(path, self.iter_rows(after_id))[0]
+
+    # ---------------- compaction ----------------
+    def _compaction_groups(self, target_rows):
+        groups, cur, cur_rows = [], [], 0
+        for e in self.segments:
+            if e.get("legacy") or e["rows"] >= target_rows:
+                if len(cur) > 1: groups.append(cur)
+                cur, cur_rows = [], 0
+                continue
+            cur.append(e); cur_rows += e["rows"]
+            if cur_rows >= target_rows:
+                if len(cur) > 1: groups.append(cur)
+                cur, cur_rows = [], 0
+        if len(cur) > 1:
+            groups.append(cur)
+        return groups
+
+    def compact(self, target_rows=COMPACT_TARGET_ROWS):
+        """Merge consecutive small segments. Returns the number of segments merged away."""
+        with self._lock:
+            stale = self.manifest.get("retired", [])
+            self.manifest["retired"] = []
+            self._save_manifest()
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+
+        merged_away = 0
+        for group in self._compaction_groups(target_rows):
+            with self._lock:
+                seq = self.manifest["next_seq"]
+                self.manifest["next_seq"] = seq + 1
+            name = f"segments/seg-{seq:06d}.csv"
+            rows = (r for e in group for r in self._read_segment(self._path(e)))
+            n, min_id, max_id = _write_csv(os.path.join(self.root, name), rows)
+            entry = {"name": name, "rows": n, "min_id": min_id, "max_id": max_id,
+                     "created_at": _utcnow(), "legacy": False, "compacted_from": len(group)}
+            with self._lock:
+                names = [e["name"] for e in group]
+                segs = self.manifest["segments"]
+                pos = [e["name"] for e in segs].index(names[0])
+                segs[pos:pos + len(group)] = [entry]
+                self.manifest["retired"] = self.manifest.get("retired", []) + names
+                self._save_manifest()
+            merged_away += len(group)
+        return merged_away
+
+    def compact_in_background(self, target_rows=COMPACT_TARGET_ROWS):
+        """Run compact() on a (non-daemon) thread; the caller may join() it."""
+        t = threading.Thread(target=self.compact, args=(target_rows,), name="raw-store-compact")
+        t.start()
+        return t
+
+# ----------------------------------------------------
+# CLI
+def main(argv):
+    root = os.getenv("SCRAPE_RAW_DIR", r"./data/raw")
+    store = RawStore(root)
+    cmd = argv[1] if len(argv) > 1 else "info"
+    if cmd == "info":
+        for e in store.segments:
+            print(f"{e['name']:<32} rows={e['rows']:<7} ids={e['min_id']}..{e['max_id']}")
+        print(f"segments={len(store.segments)} rows={store.row_count} max_id={store.max_id}")
+    elif cmd == "compact":
+        print(f"Merged {store.compact()} segments")
+    elif cmd == "export" and len(argv) > 2:
+        after_id = int(argv[argv.index("--after-id") + 1]) if "--after-id" in argv else None
+        print(f"Exported {store.export_csv(argv[2], after_id)} rows to {argv[2]}")
+    else:
+        print(__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
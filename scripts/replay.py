@@ -0,0 +1,246 @@
+# -- coding: utf-8 --
+"""
+Record / replay of the scraper's HTTP traffic, for repeatable benchmarks.
+
+Record: run the scraper with SCRAPE_RECORD set to a corpus file. Every
+response the scraper receives (feeds, listing pages, AMP / direct / proxy
+article fetches, each redirect hop) is appended to it as one gzip'd JSON line
+with URL, status, headers and body:
+
+  SCRAPE_RECORD=corpus/run1.jsonl.gz python scripts/web_scraping.py
+
+Replay: serve a corpus from a local HTTP stand-in and point the scraper at it
+with SCRAPE_REPLAY. Requests keep their original URLs everywhere in the
+scraper (politeness, caches, strategies); only the transport adapter sends
+them to the stand-in as GET /<original url>:
+
+  python scripts/replay.py serve corpus/run1.jsonl.gz --port 8765 --latency-ms 80
+  SCRAPE_REPLAY=http://127.0.0.1:8765 SCRAPE_RAW_DIR=/tmp/raw python scripts/web_scraping.py
+
+The stand-in answers conditional GETs from the recorded ETag / Last-Modified,
+returns 404 for URLs that were never recorded, and can add latency, random
+503s (--error-rate) and per-host 429 throttling (--throttle requests/sec).
+GET /__stats__ returns its request counters as JSON (?reset=1 clears them).
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import atexit
+import base64
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+RECORD_PATH = os.getenv("SCRAPE_RECORD", "")
+REPLAY_URL = os.getenv("SCRAPE_REPLAY", "").rstrip("/")
+
+# Recorded bodies are stored decoded, so these must not be replayed as-is
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+# ----------------------------------------------------
+# RECORD
+class Recorder:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = gzip.open(path, "at", encoding="utf-8")
+        self.count = 0
+        atexit.register(self.close)
+
+    def write(self, url, resp):
+        line = json.dumps({
+            "url": url,
+            "status": resp.status_code,
+            "headers": dict(resp.headers),
+            "body": base64.b64encode(resp.content).decode("ascii"),
+        })
+        with self._lock:
+            self._f.write(line + "\n")
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+def recorder():
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = Recorder(RECORD_PATH)
+        return _recorder
+
+class RecordingAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        resp = super().send(request, **kwargs)
+        recorder().write(request.url, resp)  # reads the body
+        return resp
+
+# ----------------------------------------------------
+# REPLAY (client side)
+class ReplayAdapter(HTTPAdapter):
+    def send(self, request, **kwargs):
+        original = request.url
+        request.url = f"{REPLAY_URL}/{original}"
+        try:
+            resp = super().send(request, **kwargs)
+        finally:
+            request.url = original
+        resp.url = original  # relative redirects resolve against the original URL
+        return resp
+
+def adapter_class():
+    """Transport adapter for make_session: replay wins over record, default is HTTPAdapter."""
+    if REPLAY_URL:
+        return ReplayAdapter
+    if RECORD_PATH:
+        return RecordingAdapter
+    return HTTPAdapter
+
+# ----------------------------------------------------
+# REPLAY (server side)
+def load_corpus(paths):
+    """url -> (status, headers, body); with several recordings of a URL the last one wins."""
+    responses = {}
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    break  # truncated tail of an interrupted recording
+                headers = {k: v for k, v in e["headers"].items() if k.lower() not in _DROP_HEADERS}
+                responses[e["url"]] = (e["status"], headers, base64.b64decode(e["body"]))
+    return responses
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, responses, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, throttle=0.0, seed=0):
+        super().__init__(addr, ReplayHandler)
+        self.responses = responses
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = {}  # host -> (second, requests in it)
+        self.stats = Counter()
+
+    def draw(self):
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000.0 if self.latency_ms else 0.0
+            return delay, self._rng.random() < self.error_rate
+
+    def throttled(self, host):
+        if not self.throttle:
+            return False
+        sec = int(time.monotonic())
+        with self._lock:
+            start, n = self._window.get(host, (sec, 0))
+            if start != sec:
+                start, n = sec, 0
+            self._window[host] = (start, n + 1)
+            return n >= self.throttle
+
+    def count(self, status, nbytes):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[f"status_{status}"] += 1
+            self.stats["bytes"] += nbytes
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        srv = self.server
+        if self.path.startswith("/__stats__"):
+            body = json.dumps(dict(srv.stats)).encode()
+            if "reset=1" in self.path:
+                with srv._lock:
+                    srv.stats.clear()
+            return self._send(200, {"Content-Type": "application/json"}, body)
+
+        url = self.path[1:]
+        delay, fail = srv.draw()
+        if delay:
+            time.sleep(delay)
+        if srv.throttled(urlparse(url).netloc):
+            status, headers, body = 429, {"Retry-After": "1"}, b""
+        elif fail:
+            status, headers, body = 503, {}, b""
+        elif url not in srv.responses:
+            status, headers, body = 404, {"Content-Type": "text/plain"}, b"not recorded"
+        else:
+            status, headers, body = srv.responses[url]
+            low = {k.lower(): v for k, v in headers.items()}
+            etag, modified = low.get("etag"), low.get("last-modified")
+            if (etag and self.headers.get("If-None-Match") == etag) or \
+                    (modified and self.headers.get("If-Modified-Since") == modified):
+                status, body = 304, b""
+        srv.count(status, len(body))
+        self._send(status, headers, body)
+
+def serve(paths, host="127.0.0.1", port=8765, **options):
+    responses = load_corpus(paths)
+    srv = ReplayServer((host, port), responses, **options)
+    print(f"Replaying {len(responses)} recorded responses on http://{host}:{srv.server_port}", flush=True)
+    return srv
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("serve", help="serve recorded corpora")
+    sp.add_argument("corpus", nargs="+")
+    sp.add_argument("--host", default="127.0.0.1")
+    sp.add_argument("--port", type=int, default=8765)
+    sp.add_argument("--latency-ms", type=float, default=0.0, help="mean added latency per response")
+    sp.add_argument("--jitter-ms", type=float, default=0.0, help="std-dev of the added latency")
+    sp.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    sp.add_argument("--throttle", type=float, default=0.0, help="max requests/sec per original host, then 429")
+    sp.add_argument("--seed", type=int, default=0)
+    ip = sub.add_parser("info", help="summarize a corpus")
+    ip.add_argument("corpus", nargs="+")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "info":
+        responses = load_corpus(args.corpus)
+        hosts = Counter(urlparse(u).netloc for u in responses)
+        mb = sum(len(b) for _, _, b in responses.values()) / 1e6
+        print(f"{len(responses)} responses, {mb:.1f} MB, {len(hosts)} hosts")
+        for h, n in hosts.most_common(20):
+            print(f"  {n:5d} {h}")
+        return 0
+
+    srv = serve(args.corpus, args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                error_rate=args.error_rate, throttle=args.throttle, seed=args.seed)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# -- coding: utf-8 --
+"""
+Write-ahead journal for a scraper run, so an interrupted run can resume.
+
+Every link the crawl finishes is appended to the journal (flush + fsync)
+before anything else happens with it: the site, the link and either the
+extracted article or the error. When all links of a site are done, a site
+record is appended: that is the site's cursor.
+
+If the process dies, the next run finds the journal and resumes it: sites
+with a cursor are not discovered again, links already in the journal are not
+fetched again (their journaled results are used, so ids are given out in the
+same order as in an uninterrupted run), and only the rest is crawled.
+
+At the end of a run main() writes all articles to the raw store as one
+segment, then updates the seen-URL / near-duplicate indexes, then calls
+finish(), which deletes the journal. The start record holds the store's
+max_id at the time; a journal whose run already reached the store (crash
+after the segment was written) is recognized by a larger max_id and is only
+used to bring the indexes up to date.
+"""
+import os
+import json
+import threading
+from datetime import datetime, timezone
+
+class RunJournal:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.base_id = None
+        self.started_at = None
+        self._results = {}     # link -> (article or None, error)
+        self._site_links = {}  # site -> links in journal order
+        self._sites_done = set()
+        if os.path.isfile(path):
+            self._load()
+        self._f = None
+        self.resumed_links = 0
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break  # torn last write
+                t = rec.get("t")
+                if t == "start":
+                    self.base_id, self.started_at = rec["base_id"], rec["at"]
+                elif t == "fetch":
+                    if rec["link"] not in self._results:
+                        self._site_links.setdefault(rec["site"], []).append(rec["link"])
+                    self._results[rec["link"]] = (rec["art"], rec["error"])
+                elif t == "site":
+                    self._sites_done.add(rec["site"])
+
+    @property
+    def exists(self):
+        return self.base_id is not None
+
+    def _append(self, rec):
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def start(self, base_id):
+        """Open for appending; a fresh journal gets its start record."""
+        fresh = not self.exists
+        self._f = open(self.path, "a", encoding="utf-8")
+        if fresh:
+            self.base_id = base_id
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self._append({"t": "start", "base_id": base_id, "at": self.started_at})
+
+    def discard(self):
+        """Forget an old journal (its run already reached the store)."""
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self.__init__(self.path)
+
+    # ---------------- cursor ----------------
+    def site_done(self, site):
+        return site in self._sites_done
+
+    def links(self, site):
+        return list(self._site_links.get(site, ()))
+
+    def all_articles(self):
+        return [art for art, _ in self._results.values() if art]
+
+    def article_links(self):
+        return [link for link, (art, _) in self._results.items() if art]
+
+    def result(self, link):
+        """(article copy or None, error) for a link finished before the interruption, else None."""
+        with self._lock:
+            hit = self._results.get(link)
+            if hit is None:
+                return None
+            self.resumed_links += 1
+        art, error = hit
+        return (dict(art) if art else None), error
+
+    def record(self, site, link, art, error=None):
+        row = None
+        if art:
+            row = {k: v for k, v in art.items() if k not in ("id", "source", "dup_of")}
+        with self._lock:
+            if link not in self._results:
+                self._site_links.setdefault(site, []).append(link)
+            self._results[link] = (row, error)
+        self._append({"t": "fetch", "site": site, "link": link, "art": row, "error": error})
+
+    def mark_site_done(self, site):
+        with self._lock:
+            self._sites_done.add(site)
+        self._append({"t": "site", "site": site})
+
+    def summary(self):
+        return (f"Resuming run started {self.started_at[:19]}: {len(self._results)} links "
+                f"({len(self.all_articles())} articles) journaled, {len(self._sites_done)} sites complete")
+
+    def finish(self):
+        """The run's articles are in the store: drop the journal."""
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,182 @@
+# -- coding: utf-8 --
+"""
+Per-stage timing metrics for a scraper run.
+
+The hook API is deliberately cheap: fetch_article appends
+(stage, seconds, bytes) tuples to trace["stages"] while it works (a
+perf_counter() pair per stage, no locks), and the crawl loop hands the
+finished trace to Metrics.observe() together with the site name. Stages:
+
+  ttfb           request sent -> response headers (includes connect/TLS;
+                 requests does not expose connect time on its own)
+  download       headers -> full body, with body bytes
+  decode, parse  bytes -> str, str -> tree (+ the single collection walk)
+  detect         article check
+  extract        title / body / headings
+  variant:<v>    one whole attempt (amp / direct / proxy)
+  fallback       time spent in attempts after the first one
+  discover       feed / listing link discovery (per site)
+  sleep          politeness delay (sequential mode)
+  host_wait      HostLimiter wait in front of a request (concurrent mode;
+                 also summed per host)
+  parse_wait,    with a ParsePool: waiting for a free slot, and pickling /
+  parse_ipc      transfer around the worker's own decode/parse/... stages
+  total          one whole fetch_article call
+
+Article downloads are also counted from trace["downloads"]: bytes on the
+wire (compressed) and after decoding, and how each body read ended
+(complete / early-stop / capped / too-large / skipped-status / skipped-type).
+
+Each (site, stage) pair gets a log-bucketed histogram. write() dumps
+everything as JSON; report() prints the slowest URLs and sites.
+"""
+import os
+import json
+import heapq
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+TOP_N = 10
+
+class Histogram:
+    __slots__ = ("counts", "n", "total", "max", "bytes")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def observe(self, seconds, nbytes=0):
+        ms = seconds * 1000.0
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.n += 1
+        self.total += seconds
+        self.bytes += nbytes
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bucket bound (seconds) below which a fraction q of observations fall."""
+        if not self.n:
+            return None
+        target, acc = q * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS_MS[i] / 1000.0 if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {"n": self.n, "sum_sec": round(self.total, 4), "max_sec": round(self.max, 4),
+                "bytes": self.bytes, "p50_sec": self.quantile(0.5), "p90_sec": self.quantile(0.9),
+                "counts": self.counts}
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = datetime.now(timezone.utc)
+        self.sites = {}
+        self.slow_urls = []  # min-heap of (seconds, url, site)
+        self.host_wait_sec = {}
+        self.downloads = Counter()
+
+    def _hist(self, site, stage):
+        stages = self.sites.setdefault(site, {})
+        h = stages.get(stage)
+        if h is None:
+            h = stages[stage] = Histogram()
+        return h
+
+    def observe_stage(self, site, stage, seconds, nbytes=0):
+        with self._lock:
+            self._hist(site, stage).observe(seconds, nbytes)
+
+    def observe(self, site, url, seconds, trace):
+        """Fold one fetch_article trace (plus its total time) into the run metrics."""
+        with self._lock:
+            for stage, sec, nbytes in trace.get("stages", ()):
+                self._hist(site, stage).observe(sec, nbytes)
+            self._hist(site, "total").observe(seconds)
+            for wire, body, outcome in trace.get("downloads", ()):
+                self.downloads["requests"] += 1
+                self.downloads["wire_bytes"] += wire
+                self.downloads["body_bytes"] += body
+                self.downloads[outcome] += 1
+            item = (seconds, url, site)
+            if len(self.slow_urls) < TOP_N:
+                heapq.heappush(self.slow_urls, item)
+            elif item > self.slow_urls[0]:
+                heapq.heapreplace(self.slow_urls, item)
+
+    def add_host_waits(self, waits):
+        with self._lock:
+            for host, sec in waits.items():
+                self.host_wait_sec[host] = self.host_wait_sec.get(host, 0.0) + sec
+
+    def as_dict(self, **extra):
+        with self._lock:
+            return {
+                "started": self.started.isoformat(),
+                "finished": datetime.now(timezone.utc).isoformat(),
+                "buckets_ms": list(BUCKETS_MS) + ["inf"],
+                "sites": {s: {st: h.as_dict() for st, h in stages.items()} for s, stages in self.sites.items()},
+                "slowest_urls": [{"url": u, "site": s, "sec": round(t, 3)} for t, u, s in sorted(self.slow_urls, reverse=True)],
+                "host_wait_sec": {h: round(v, 3) for h, v in self.host_wait_sec.items()},
+                "downloads": dict(self.downloads),
+                **extra,
+            }
+
+    def write(self, directory, **extra):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"run-{self.started.strftime('%Y%m%dT%H%M%SZ')}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(**extra), f, indent=1)
+        os.replace(tmp, path)
+        return path
+
+    def stage_totals(self):
+        totals = {}
+        with self._lock:
+            for stages in self.sites.values():
+                for st, h in stages.items():
+                    t = totals.setdefault(st, [0, 0.0, 0])
+                    t[0] += h.n; t[1] += h.total; t[2] += h.bytes
+        return totals
+
+    def bandwidth_summary(self):
+        d = self.downloads
+        aborted = d["too-large"] + d["capped"] + d["skipped-status"] + d["skipped-type"]
+        return (f"Bandwidth: {d['requests']} article requests, {d['wire_bytes'] / 1e6:.1f} MB on the wire "
+                f"({d['body_bytes'] / 1e6:.1f} MB decoded); early stop {d['early-stop']}, aborted {aborted} "
+                f"(too-large {d['too-large']}, capped {d['capped']}, "
+                f"status {d['skipped-status']}, content-type {d['skipped-type']})")
+
+    def report(self, n=TOP_N):
+        lines = ["", "=== TIMING ===", self.bandwidth_summary()]
+        for st, (cnt, sec, nbytes) in sorted(self.stage_totals().items(), key=lambda kv: -kv[1][1]):
+            mb = f" {nbytes / 1e6:8.2f} MB" if nbytes else ""
+            lines.append(f"  {st:<16} n={cnt:<6} {sec:9.2f}s{mb}")
+        with self._lock:
+            per_site = sorted(((stages["total"].total, s, stages["total"].n) for s, stages in self.sites.items()
+                               if "total" in stages), reverse=True)[:n]
+            slow = sorted(self.slow_urls, reverse=True)[:n]
+            waits = sorted(((v, h) for h, v in self.host_wait_sec.items()), reverse=True)[:n]
+        lines.append("Slowest sites (fetch time):")
+        for t, s, cnt in per_site:
+            lines.append(f"  {s:<18} {t:8.2f}s over {cnt} links ({t / cnt:.2f}s avg)")
+        lines.append("Slowest URLs:")
+        for t, u, s in slow:
+            lines.append(f"  {t:7.2f}s [{s}] {u}")
+        if waits:
+            lines.append("Most politeness wait (per host):")
+            for v, h in waits:
+                lines.append(f"  {v:8.2f}s {h}")
+        return "\n".join(lines)
@@ -0,0 +1,140 @@
+# -- coding: utf-8 --
+"""
+Per-site health ledger and circuit breaker for the scraper.
+
+For every site and run the ledger keeps: links found, articles extracted,
+error classes (as reported by fetch_article), per-link latency percentiles
+and the time spent on the site (link discovery + fetches). The last
+RUNS_KEPT runs are persisted in a JSON file.
+
+A run counts as a failure when links were fetched but none gave an article,
+or when link discovery found nothing although the feed was not simply
+unchanged (see FeedCache). Runs with nothing new to fetch are neutral. After
+FAIL_THRESHOLD consecutive failures the breaker opens and the site is
+skipped until a retry time that doubles with every further failure
+(BASE_BACKOFF_HOURS, capped at MAX_BACKOFF_HOURS). When the retry time has
+passed the site is crawled once more: one article closes the breaker again.
+The time saved by skipping is estimated from the site's recent busy time.
+"""
+import os
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+FAIL_THRESHOLD = 3
+BASE_BACKOFF_HOURS = 24
+MAX_BACKOFF_HOURS = 24 * 30
+RUNS_KEPT = 30
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def percentile(values, q):
+    if not values:
+        return None
+    v = sorted(values)
+    k = min(len(v) - 1, max(0, int(round(q / 100.0 * (len(v) - 1)))))
+    return round(v[k], 3)
+
+class SiteRun:
+    """Collects one site's numbers during a run."""
+    def __init__(self, name):
+        self.name = name
+        self.links = 0
+        self.unchanged = False
+        self.articles = 0
+        self.busy_sec = 0.0
+        self.errors = Counter()
+        self.latencies = []
+
+    def discovered(self, n_links, seconds, unchanged=False):
+        self.links = n_links
+        self.unchanged = unchanged
+        self.busy_sec += seconds
+        if not n_links and not unchanged:
+            self.errors["no-links"] += 1
+
+    @property
+    def failed(self):
+        if self.articles:
+            return False
+        return bool(self.latencies) or (not self.links and not self.unchanged)
+
+    def fetched(self, ok, seconds, error=None):
+        self.latencies.append(seconds)
+        self.busy_sec += seconds
+        if ok:
+            self.articles += 1
+        else:
+            self.errors[error or "unknown"] += 1
+
+    def as_record(self):
+        return {
+            "at": _now().isoformat(),
+            "links": self.links,
+            "articles": self.articles,
+            "busy_sec": round(self.busy_sec, 3),
+            "errors": dict(self.errors),
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p90": percentile(self.latencies, 90),
+            "latency_p99": percentile(self.latencies, 99),
+        }
+
+class HealthLedger:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.sites = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.sites = json.load(f)
+            except (OSError, ValueError):
+                self.sites = {}
+        self.skipped = []
+        self.saved_sec = 0.0
+
+    def _site(self, name):
+        return self.sites.setdefault(name, {"runs": [], "failures": 0, "open_until": None})
+
+    def should_skip(self, name):
+        """True while the site's breaker is open; also accounts the time saved."""
+        with self._lock:
+            s = self._site(name)
+            if not s["open_until"] or _now() >= datetime.fromisoformat(s["open_until"]):
+                return False
+            recent = [r["busy_sec"] for r in s["runs"][-5:]]
+            self.skipped.append(name)
+            self.saved_sec += sum(recent) / len(recent) if recent else 0.0
+            return True
+
+    def record(self, run):
+        with self._lock:
+            s = self._site(run.name)
+            s["runs"] = (s["runs"] + [run.as_record()])[-RUNS_KEPT:]
+            if run.articles:
+                s["failures"], s["open_until"] = 0, None
+                return
+            if not run.failed:
+                return
+            s["failures"] += 1
+            if s["failures"] >= FAIL_THRESHOLD:
+                hours = min(MAX_BACKOFF_HOURS, BASE_BACKOFF_HOURS * 2 ** (s["failures"] - FAIL_THRESHOLD))
+                s["open_until"] = (_now() + timedelta(hours=hours)).isoformat()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.sites, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        lines = [f"Circuit breaker: {len(self.skipped)} sites skipped, ~{self.saved_sec:.0f}s saved"
+                 + (f" ({', '.join(self.skipped)})" if self.skipped else "")]
+        for name, s in sorted(self.sites.items()):
+            if s["open_until"]:
+                lines.append(f"  open: {name} after {s['failures']} failed runs, retry after {s['open_until'][:16]}")
+        return "\n".join(lines)
@@ -0,0 +1,88 @@
+# -- coding: utf-8 --
+"""
+Text normalization shared by the scraper, the cleaning stage and the exports.
+
+Each transformation has a scalar form (one string) and a column form (a
+pandas Series or any iterable of values; a Series comes back as a Series
+with the same index, anything else as a list). Outputs are identical to the
+functions they replace:
+
+  normalize_whitespace  re.sub(r'\\s+', ' ', text.replace('\\n', ' ')).strip()
+  clean_title           re.sub(r'\\s*\\(.*\\)', '', t), then
+                        re.sub(r'\\s*(?:\\||—|–|:).*', '', t), then strip();
+                        "" for non-strings
+  is_noise              any(b in t.lower() for b in NOISE_WORDS)
+  keep_paragraphs       paragraphs longer than 60 chars that are not noise
+
+How they are made cheaper:
+
+  - whitespace runs are collapsed with " ".join(text.split()): str.split()
+    splits on exactly the characters re's \\s matches (str.isspace) and drops
+    leading/trailing runs, so this is the regex + strip in one C call;
+  - the title regexes are compiled once and only run on titles that contain
+    a "(" or one of the separators (the others cannot match); one
+    substring test per title is far cheaper than two re.sub calls;
+  - is_noise lowercases once and tests the words with a plain loop that
+    returns on the first hit (no generator). A combined regex alternation
+    was measured and is about twice as slow as substring tests here; the
+    lowercasing is most of what is left.
+
+Arrow string kernels (pyarrow.compute / string[pyarrow]) are not used: they
+run RE2, whose \\s is ASCII-only and whose "." and case rules differ from
+Python's re, so their output would not be identical on non-ASCII text.
+
+  python scripts/bench_cleaning.py --stage normalize   # against the per-row functions
+"""
+import re
+
+NOISE_WORDS = ("copyright", "advertisement", "subscribe", "sign up", "newsletter")
+MIN_PARAGRAPH = 60
+
+_PARENS = re.compile(r"\s*\(.*\)")
+_TAIL = re.compile(r"\s*(?:\||—|–|:).*")
+_TAIL_CHARS = ("|", "—", "–", ":")
+
+def _column(fn, values):
+    if hasattr(values, "map") and hasattr(values, "index"):
+        return values.map(fn)
+    return [fn(v) for v in values]
+
+# ----------------------------------------------------
+# WHITESPACE
+def normalize_whitespace(text):
+    """Runs of whitespace (newlines included) -> one space, ends stripped."""
+    return " ".join(text.split())
+
+def normalize_whitespace_column(values):
+    return _column(normalize_whitespace, values)
+
+# ----------------------------------------------------
+# TITLES
+def clean_title(title):
+    if not isinstance(title, str):
+        return ""
+    if "(" in title:
+        title = _PARENS.sub("", title)
+    if any(c in title for c in _TAIL_CHARS):
+        title = _TAIL.sub("", title)
+    return title.strip()
+
+def clean_titles(values):
+    return _column(clean_title, values)
+
+# ----------------------------------------------------
+# BOILERPLATE PARAGRAPHS
+def is_noise(text):
+    low = text.lower()
+    for word in NOISE_WORDS:
+        if word in low:
+            return True
+    return False
+
+def noise_mask(values):
+    """Boolean mask (Series or list) of the values that are boilerplate."""
+    return _column(is_noise, values)
+
+def keep_paragraphs(texts):
+    """The paragraphs an article body keeps: longer than MIN_PARAGRAPH chars and not boilerplate."""
+    return [t for t in texts if len(t) > MIN_PARAGRAPH and not is_noise(t)]
@@ -0,0 +1,182 @@
+# -- coding: utf-8 --
+"""
+Persistent seen-URL index for the scraper.
+
+Keys are canonical URLs (see canonical_url in web_scraping.py), stored as
+64-bit blake2b hashes in three files:
+
+  <prefix>.idx    sorted uint64 hashes, memory-mapped (nothing is loaded at open)
+  <prefix>.log    hashes appended since the last merge
+  <prefix>.bloom  Bloom filter over all hashes, answers most misses without
+                  touching the sorted file
+
+A lookup is a Bloom probe plus, on a possible hit, a binary search over the
+mapped file, so its cost stays flat at millions of URLs. close() folds the log
+into the sorted file through a temp file + os.replace, so a crash leaves the
+previous file and the log intact. Not thread-safe: use it from one thread.
+"""
+import os
+import mmap
+import math
+import struct
+import bisect
+import hashlib
+from array import array
+
+BLOOM_FALSE_POSITIVE = 0.01
+BLOOM_MIN_CAPACITY = 100_000
+_BLOOM_HEADER = struct.Struct("<QQI")
+
+def url_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate=BLOOM_FALSE_POSITIVE):
+        self.capacity = capacity
+        self.nbits = max(64, int(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.nhashes = max(1, round(self.nbits / capacity * math.log(2)))
+        self.bits = bytearray((self.nbits + 7) // 8)
+
+    def _positions(self, h):
+        # Double hashing on the two halves of the 64-bit key.
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self.nhashes):
+            yield (h1 + i * h2) % self.nbits
+
+    def add(self, h):
+        for p in self._positions(h):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def might_contain(self, h):
+        for p in self._positions(h):
+            if not self.bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def save(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(self.capacity, self.nbits, self.nhashes))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            capacity, nbits, nhashes = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+            bits = f.read()
+        bf = cls.__new__(cls)
+        bf.capacity, bf.nbits, bf.nhashes = capacity, nbits, nhashes
+        if len(bits) != (nbits + 7) // 8:
+            raise ValueError("truncated bloom file")
+        bf.bits = bytearray(bits)
+        return bf
+
+class SeenUrlIndex:
+    def __init__(self, path_prefix):
+        self.idx_path = path_prefix + ".idx"
+        self.log_path = path_prefix + ".log"
+        self.bloom_path = path_prefix + ".bloom"
+        os.makedirs(os.path.dirname(path_prefix) or ".", exist_ok=True)
+
+        self.is_new = not (os.path.isfile(self.idx_path) or os.path.isfile(self.log_path))
+        self._mm = None
+        self._base = ()
+        if os.path.isfile(self.idx_path) and os.path.getsize(self.idx_path) >= 8:
+            with open(self.idx_path, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._base = memoryview(self._mm).cast("Q")
+
+        self._delta = set()
+        if os.path.isfile(self.log_path):
+            log = array("Q")
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+            log.frombytes(data[: len(data) - len(data) % 8])  # drop a torn last write
+            self._delta.update(log)
+        self._log = open(self.log_path, "ab")
+
+        self._bloom = self._open_bloom()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._base) + len(self._delta)
+
+    def _open_bloom(self):
+        try:
+            bf = BloomFilter.load(self.bloom_path)
+            if len(self) <= bf.capacity:
+                # The saved filter already covers the sorted file; only the log is new.
+                for h in self._delta:
+                    bf.add(h)
+                return bf
+        except (OSError, ValueError, struct.error):
+            pass
+        return self._rebuild_bloom()
+
+    def _rebuild_bloom(self, keys=None):
+        keys = [self._base, self._delta] if keys is None else [keys]
+        bf = BloomFilter(max(BLOOM_MIN_CAPACITY, 2 * sum(len(k) for k in keys)))
+        for part in keys:
+            for h in part:
+                bf.add(h)
+        return bf
+
+    def _in_base(self, h):
+        i = bisect.bisect_left(self._base, h)
+        return i < len(self._base) and self._base[i] == h
+
+    def _has(self, h):
+        return self._bloom.might_contain(h) and (h in self._delta or self._in_base(h))
+
+    def __contains__(self, key: str):
+        found = self._has(url_hash(key))
+        if found: self.hits += 1
+        else: self.misses += 1
+        return found
+
+    def add(self, key: str) -> bool:
+        h = url_hash(key)
+        if self._has(h):
+            return False
+        self._delta.add(h)
+        self._log.write(struct.pack("<Q", h))
+        self._bloom.add(h)
+        return True
+
+    def update(self, keys):
+        return sum(1 for k in keys if self.add(k))
+
+    def flush(self):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def close(self):
+        """Merge the log into the sorted file and persist the Bloom filter."""
+        self.flush()
+        self._log.close()
+        if self._delta:
+            merged = array("Q", sorted(self._delta.union(self._base)))
+            if len(merged) > self._bloom.capacity:
+                # Resize at the end of a run rather than at the next startup.
+                self._bloom = self._rebuild_bloom(merged)
+            tmp = self.idx_path + ".tmp"
+            with open(tmp, "wb") as f:
+                merged.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            self._release_base()
+            os.replace(tmp, self.idx_path)
+            open(self.log_path, "wb").close()
+            self._delta = set()
+        else:
+            self._release_base()
+        self._bloom.save(self.bloom_path)
+
+    def _release_base(self):
+        if self._mm is not None:
+            self._base.release()
+            self._mm.close()
+            self._mm = None
+        self._base = ()
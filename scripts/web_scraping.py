@@ -3,15 +3,35 @@ import re
 import os
 import json
 import time
-import csv
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse, parse_qs, urlunparse
 from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 from urllib3.util.retry import Retry
 from datetime import datetime, timezone
 import xml.etree.ElementTree as ET
 
+from fetch_strategy import StrategyTable, domain_of
+from html_archive import HtmlArchive
+from http_cache import FeedCache, parse_item_date
+from near_dup import NearDupIndex, minhash
+from parse_pool import ParsePool
+from raw_store import RawStore
+import replay
+from run_journal import RunJournal
+from scrape_metrics import Metrics
+from site_health import HealthLedger, SiteRun
+from text_norm import keep_paragraphs
+try:
+    import page_extract  # lxml engine
+except ImportError:
+    page_extract = None
+from url_index import SeenUrlIndex
+
 # ----------------------------------------------------
 # SETTINGS
 HEADERS = {
@@ -22,12 +42,53 @@ HEADERS = {
     ),
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "en-US,en;q=0.9",
+    # gzip/deflate, plus br / zstd when brotli / zstandard are installed
+    "Accept-Encoding": ACCEPT_ENCODING,
     "Cache-Control": "no-cache",
     "Pragma": "no-cache",
 }
 TIMEOUT = 5
 MAX_LINKS_PER_SITE = 100
-REQUEST_DELAY_SEC = 0.5
+REQUEST_DELAY_SEC = float(os.getenv("SCRAPE_REQUEST_DELAY", "0.5"))
+
+# "sequential" visits sites one by one; "concurrent" crawls sites in parallel
+# with REQUEST_DELAY_SEC applied per host instead of after every article.
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "sequential")
+MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", "16"))
+PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+
+# "bs4": BeautifulSoup html.parser (the reference); "lxml": single-parse engine in page_extract.py,
+# faster but not identical on malformed markup (see page_extract.py), so opt-in until
+# bench_extract.py shows parity on a real corpus
+PARSER_ENGINE = os.getenv("SCRAPE_PARSER", "bs4")
+# >0: decode/parse/extract in that many worker processes (see parse_pool.py)
+PARSE_WORKERS = int(os.getenv("SCRAPE_PARSE_WORKERS", "0"))
+# Article bodies are streamed: status and Content-Type are checked before any
+# body is read, reading stops at the domain's byte cap (BODY_CAP_BYTES, else
+# MAX_BODY_BYTES; SCRAPE_BODY_CAPS="domain=bytes,..." overrides), and with
+# EARLY_STOP once the closing </article> of a page whose <head> declares an
+# article has arrived, if that <article> holds the page's first <h1> and the
+# page has no articleBody section (which extract_content prefers and which
+# can come after a teaser <article>). Off by default: everything after the
+# article, e.g. the h2s of related links, is not read, so the stored h2
+# column is not the same as from the whole page.
+MAX_BODY_BYTES = int(os.getenv("SCRAPE_MAX_BODY_BYTES", str(3 * 1024 * 1024)))
+BODY_CAP_BYTES = {
+    "nytimes.com": 6 * 1024 * 1024,
+    "washingtonpost.com": 6 * 1024 * 1024,
+}
+BODY_CAP_BYTES.update({d.strip(): int(n) for d, n in
+                       (kv.split("=", 1) for kv in os.getenv("SCRAPE_BODY_CAPS", "").split(",") if "=" in kv)})
+EARLY_STOP = os.getenv("SCRAPE_EARLY_STOP", "0") == "1"
+# Keep every article body read in a compressed archive for later
+# re-extraction (see html_archive.py). Leave SCRAPE_EARLY_STOP off to
+# archive whole pages.
+ARCHIVE_PAGES = os.getenv("SCRAPE_ARCHIVE", "0") == "1"
+CHUNK_BYTES = 64 * 1024
+
+# Near-duplicate bodies (MinHash, see near_dup.py): "mark" keeps them with
+# dup_of = id of the earlier article, "drop" doesn't store them, "off" skips the check
+NEAR_DUP_MODE = os.getenv("SCRAPE_NEAR_DUP", "mark")
 
 # ----------------------------------------------------
 # SITES
@@ -161,8 +222,58 @@ SITES = [
 
 # ----------------------------------------------------
 # NETWORK HELPERS
-def make_session():
-    s = requests.Session()
+class HostLimiter:
+    """
+    Per-host politeness for concurrent crawling: at most `per_host` requests
+    in flight to one host, and request starts spaced `delay` seconds apart.
+    """
+    def __init__(self, delay=None, per_host=None):
+        self.delay = REQUEST_DELAY_SEC if delay is None else delay
+        self.per_host = per_host or PER_HOST_CONCURRENCY
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_at = {}
+        self.waited = {}  # host -> seconds spent waiting for a slot or the spacing delay
+
+    def _slot(self, host):
+        with self._lock:
+            sem = self._slots.get(host)
+            if sem is None:
+                sem = self._slots[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    @contextmanager
+    def acquire(self, url):
+        host = urlparse(url).netloc.lower()
+        sem = self._slot(host)
+        t0 = time.monotonic()
+        sem.acquire()
+        try:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_at.get(host, 0.0))
+                self._next_at[host] = start + self.delay
+                self.waited[host] = self.waited.get(host, 0.0) + (start - t0)
+            if start > now:
+                time.sleep(start - now)
+            yield start - t0
+        finally:
+            sem.release()
+
+class PoliteSession(requests.Session):
+    """Session whose every request (feeds, listings, AMP, proxy) goes through a HostLimiter."""
+    def __init__(self, limiter):
+        super().__init__()
+        self.limiter = limiter
+
+    def request(self, method, url, *args, **kwargs):
+        with self.limiter.acquire(url) as waited:
+            r = super().request(method, url, *args, **kwargs)
+            r.host_wait = waited
+            return r
+
+def make_session(limiter=None):
+    s = PoliteSession(limiter) if limiter else requests.Session()
     retries = Retry(
         total=2,
         backoff_factor=0.5,
@@ -170,7 +281,11 @@ def make_session():
         allowed_methods=frozenset(["GET"]),
         raise_on_status=False,
     )
-    s.mount("https://", HTTPAdapter(max_retries=retries))
+    # SCRAPE_RECORD / SCRAPE_REPLAY swap in a recording or replaying adapter (see replay.py)
+    adapter = replay.adapter_class()
+    s.mount("https://", adapter(max_retries=retries))
+    if adapter is not HTTPAdapter:
+        s.mount("http://", adapter())
     s.headers.update(HEADERS)
     return s
 
@@ -198,7 +313,7 @@ def strip_tracking_params(url: str) -> str:
         p = urlparse(url)
         qs = parse_qs(p.query)
         keep = {k: v for k, v in qs.items()
-                if not re.match(r'^(utm_|fbclid|gclid|gclsrc|mc_cid|mc_eid|_hsenc|_hsmi|ref|ref_src|spm)$', k)}
+                if not re.match(r'^(utm_.*|fbclid|gclid|gclsrc|mc_cid|mc_eid|_hsenc|_hsmi|ref|ref_src|spm)$', k)}
         q = "&".join([f"{k}={v[0]}" for k, v in keep.items() if v])
         return urlunparse((p.scheme, p.netloc, p.path, p.params, q, ""))
     except Exception:
@@ -209,6 +324,23 @@ def normalize_url(base: str, href: str) -> str | None:
     absu = urljoin(base, href.strip())
     return strip_tracking_params(absu) if is_valid_url(absu) else None
 
+def canonical_url(url: str) -> str:
+    """
+    Key for the seen-URL index: tracking params stripped, scheme and "www."
+    dropped, host lowercased, query sorted, no trailing slash, and the AMP
+    variants fetch_article may return folded back onto the article URL.
+    """
+    p = urlparse(strip_tracking_params(url.strip()))
+    host = p.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = p.path
+    if path.endswith(".amp.html"):
+        path = path[:-9] + ".html"
+    path = path.rstrip("/") or "/"
+    query = "&".join(sorted(q for q in p.query.split("&") if q and not q.startswith("outputType=")))
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
 # ----------------------------------------------------
 # LINK FILTERS
 def should_skip_url(u: str, site_name: str) -> bool:
@@ -224,9 +356,17 @@ def should_skip_url(u: str, site_name: str) -> bool:
 
 # ----------------------------------------------------
 # LINK DISCOVERY
-def get_links_from_listing(session, site):
+def _cached_get(session, url, cache, **kwargs):
+    if cache is None:
+        return session.get(url, **kwargs), False
+    return cache.get(session, url, **kwargs)
+
+def get_links_from_listing(session, site, cache=None):
     try:
-        r = session.get(site["list_url"], timeout=TIMEOUT, headers=domain_headers(site["list_url"]))
+        r, not_modified = _cached_get(session, site["list_url"], cache,
+                                      timeout=TIMEOUT, headers=domain_headers(site["list_url"]))
+        if not_modified:
+            return []
         r.raise_for_status()
         soup = BeautifulSoup(r.text, "html.parser")
         raw = []
@@ -248,18 +388,41 @@ def get_links_from_listing(session, site):
     except requests.RequestException:
         return []
 
-def get_links_from_rss(session, rss_url, base=""):
+def get_links_from_rss(session, rss_url, base="", cache=None):
+    """
+    Article links from one or more feeds. With a FeedCache, unchanged feeds
+    (304) are not parsed at all, and items published at or before the newest
+    item seen on an earlier run are skipped.
+    """
     if not rss_url:
         return []
     feeds = rss_url if isinstance(rss_url, list) else [rss_url]
     links_raw = []
     for feed in feeds:
         try:
-            r = session.get(feed, timeout=TIMEOUT, headers=domain_headers(feed))
+            r, not_modified = _cached_get(session, feed, cache, timeout=TIMEOUT, headers=domain_headers(feed))
+            if not_modified:
+                continue
             r.raise_for_status()
             root = ET.fromstring(r.content)
+            watermark = cache.newest_item(feed) if cache else None
+            newest, n_items, n_old = None, 0, 0
+
+            def is_new(date_text):
+                nonlocal newest, n_items, n_old
+                n_items += 1
+                dt = parse_item_date(date_text)
+                if dt is None:
+                    return True
+                if watermark is not None and dt <= watermark:
+                    n_old += 1
+                    return False
+                newest = dt if newest is None or dt > newest else newest
+                return True
 
             for item in root.findall(".//item"):
+                if not is_new(item.findtext("pubDate")):
+                    continue
                 link_el = item.find("link")
                 link = link_el.text.strip() if (link_el is not None and link_el.text) else None
                 if not link:
@@ -274,6 +437,9 @@ def get_links_from_rss(session, rss_url, base=""):
                     break
 
             for entry in root.findall(".//{http://www.w3.org/2005/Atom}entry"):
+                if not is_new(entry.findtext("{http://www.w3.org/2005/Atom}updated") or
+                              entry.findtext("{http://www.w3.org/2005/Atom}published")):
+                    continue
                 for link_el in entry.findall("{http://www.w3.org/2005/Atom}link"):
                     href = link_el.get("href")
                     if href:
@@ -285,6 +451,12 @@ def get_links_from_rss(session, rss_url, base=""):
                 if len(links_raw) >= MAX_LINKS_PER_SITE:
                     break
 
+            if cache is not None:
+                if newest is not None:
+                    cache.set_newest_item(feed, newest)
+                if n_items and n_old == n_items:
+                    cache.mark_current(feed)
+
         except Exception:
             continue
 
@@ -342,203 +514,560 @@ def extract_title(soup):
     return h1.get_text(strip=True) if h1 else None
 
 def extract_content(soup):
-    def is_noise(t):
-        low = t.lower()
-        bad = ["copyright", "advertisement", "subscribe", "sign up", "newsletter"]
-        return any(b in low for b in bad)
-
     body_section = soup.select_one('section[name="articleBody"]')
     if body_section:
-        ps = [p.get_text(" ", strip=True) for p in body_section.select("p")]
-        ps = [t for t in ps if len(t) > 60 and not is_noise(t)]
+        ps = keep_paragraphs(p.get_text(" ", strip=True) for p in body_section.select("p"))
         if ps:
             return "\n\n".join(ps)
 
     art = soup.find("article")
     candidates = art.find_all("p") if art else soup.find_all("p")
-    paras = [p.get_text(" ", strip=True) for p in candidates]
-    paras = [t for t in paras if len(t) > 60 and not is_noise(t)]
+    paras = keep_paragraphs(p.get_text(" ", strip=True) for p in candidates)
     return "\n\n".join(paras) if paras else None
 
-# ----------------------------------------------------
-# FETCH ARTICLE
-def fetch_article(session, url):
-    t0 = time.time()
+def analyze_page_bs4(html, url=None, timings=None):
+    """Reference engine: BeautifulSoup html.parser + the functions above."""
+    t0 = time.perf_counter()
+    soup = BeautifulSoup(html, "html.parser")
+    t1 = time.perf_counter()
+    is_article = is_article_page(soup, url)
+    t2 = time.perf_counter()
+    if timings is not None:
+        timings["parse"], timings["detect"] = t1 - t0, t2 - t1
+    if not is_article:
+        return None
+    page = {
+        "title": extract_title(soup),
+        "content": extract_content(soup),
+        "h1": [h.get_text(" ", strip=True) for h in soup.find_all("h1")],
+        "h2": [h.get_text(" ", strip=True) for h in soup.find_all("h2")],
+    }
+    if timings is not None:
+        timings["extract"] = time.perf_counter() - t2
+    return page
+
+def analyze_page(html, url=None, timings=None):
+    """
+    Article check + title/body/headings for one document, parsed once.
+    Returns None when the page is not an article. A `timings` dict receives
+    the seconds spent in "parse", "detect" and "extract".
+    """
+    if PARSER_ENGINE == "lxml" and page_extract is not None:
+        return page_extract.analyze_page(html, url, timings)
+    return analyze_page_bs4(html, url, timings)
 
-    def ok_payload(soup, final_url):
-        title = extract_title(soup)
-        body = extract_content(soup)
-        if not title or not body:
-            return None
-        t_sec = round(time.time() - t0, 3)
-        return {
-            "url": final_url,
-            "title": title,
-            "content": body,
-            "fetched_at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-            "t_total_sec": t_sec,
-            "h1": " ".join([h.get_text(" ", strip=True) for h in soup.find_all("h1")]) or title,
-            "h2": " ".join([h.get_text(" ", strip=True) for h in soup.find_all("h2")]),
-        }
+def article_row(page, url):
+    """analyze_page result -> the article's text fields, or None without a title and body."""
+    if not page or not page["title"] or not page["content"]:
+        return None
+    return {
+        "url": url,
+        "title": page["title"],
+        "content": page["content"],
+        "h1": " ".join(page["h1"]) or page["title"],
+        "h2": " ".join(page["h2"]),
+    }
 
+def decode_body(content, encoding):
+    """bytes -> str exactly like requests' Response.text."""
+    if encoding is None:
+        encoding = requests.compat.chardet.detect(content)["encoding"]
     try:
-        if not is_valid_url(url):
-            print(f"    skip reason: invalid-url | {url}")
-            return None
-
-        if "nytimes.com" in url:
-            if any(seg in url for seg in ["/live/", "/interactive/", "/video/"]):
-                print(f"    skip reason: nyt-live-or-interactive | {url}")
-                return None
-            amp_url = url[:-5] + ".amp.html" if url.endswith(".html") else (url.rstrip("/") + ".amp.html")
-            try:
-                r_amp = session.get(amp_url, timeout=TIMEOUT, headers=domain_headers(amp_url))
-                if r_amp.status_code == 200 and "text/html" in (r_amp.headers.get("Content-Type", "")):
-                    soup_amp = BeautifulSoup(r_amp.text, "html.parser")
-                    if is_article_page(soup_amp, amp_url):
-                        payload = ok_payload(soup_amp, amp_url)
-                        if payload: return payload
-            except requests.RequestException:
-                pass
-
-        if "washingtonpost.com" in url:
-            amp_url = url + ("&" if "?" in url else "?") + "outputType=amp"
-            try:
-                r_amp = session.get(amp_url, timeout=TIMEOUT, headers=domain_headers(amp_url))
-                if r_amp.status_code == 200 and "text/html" in (r_amp.headers.get("Content-Type", "")):
-                    soup_amp = BeautifulSoup(r_amp.text, "html.parser")
-                    if is_article_page(soup_amp, amp_url):
-                        payload = ok_payload(soup_amp, amp_url)
-                        if payload: return payload
-            except requests.RequestException:
-                pass
-
-        r = session.get(url, timeout=TIMEOUT, headers=domain_headers(url))
-        if r.status_code == 200 and "text/html" in (r.headers.get("Content-Type", "")):
-            soup = BeautifulSoup(r.text, "html.parser")
-            if is_article_page(soup, url):
-                payload = ok_payload(soup, url)
-                if payload: return payload
-
-        alt = "https://r.jina.ai/" + url
-        try:
-            r_alt = session.get(alt, timeout=TIMEOUT)
-            if r_alt.status_code == 200:
-                soup_alt = BeautifulSoup(r_alt.text, "html.parser")
-                if is_article_page(soup_alt, url):
-                    payload = ok_payload(soup_alt, url)
-                    if payload: return payload
-        except requests.RequestException:
-            pass
-
-        print(f"    skip reason: bad-status-or-content-type({r.status_code if 'r' in locals() else 'NA'}) | {url}")
-        return None
+        return str(content, encoding, errors="replace")
+    except (LookupError, TypeError):
+        return str(content, errors="replace")
 
-    except requests.RequestException as e:
-        try:
-            alt = "https://r.jina.ai/" + url
-            r_alt = session.get(alt, timeout=TIMEOUT)
-            if r_alt.status_code == 200:
-                soup_alt = BeautifulSoup(r_alt.text, "html.parser")
-                if is_article_page(soup_alt, url):
-                    payload = ok_payload(soup_alt, url)
-                    if payload: return payload
-        except requests.RequestException:
-            pass
-        print(f"    skip reason: exception {e.__class__.__name__} | {url}")
-        return None
+def parse_body(content, encoding, url=None, timings=None):
+    """Raw response body -> analyze_page result. Runs in-thread or in a ParsePool worker."""
+    t0 = time.perf_counter()
+    html = decode_body(content, encoding)
+    if timings is not None:
+        timings["decode"] = time.perf_counter() - t0
+    return analyze_page(html, url, timings)
 
 # ----------------------------------------------------
-# STORAGE (CSV)
-CSV_PATH = r"./data/raw/data.csv"
+# STREAMED DOWNLOAD
+_HEAD_DECLARES_ARTICLE = re.compile(
+    rb'og:type["\']\s+content=["\']article["\']|content=["\']article["\']\s+property=["\']og:type'
+    rb'|"@type"\s*:\s*"(?:News)?Article"', re.I)
+
+def body_cap(url):
+    return BODY_CAP_BYTES.get(domain_of(url), MAX_BODY_BYTES)
+
+def _article_complete(buf):
+    """
+    True once `buf` holds a closed <article> with some paragraphs and the
+    page's first <h1>, the head says "article", and nothing names an
+    articleBody section (extract_content would read that instead).
+    """
+    low = buf.lower()
+    end = low.find(b"</article>")
+    if end < 0 or low.count(b"</p>", 0, end) < 3:
+        return False
+    start = low.rfind(b"<article", 0, end)
+    h1 = low.find(b"<h1")
+    if start < 0 or not start < h1 < end or b"articlebody" in low:
+        return False
+    head_end = low.find(b"</head>")
+    return bool(_HEAD_DECLARES_ARTICLE.search(buf, 0, head_end if head_end > 0 else end))
+
+def read_body(r, cap, early_stop=False):
+    """
+    Read a streamed response: (body bytes, outcome) with outcome one of
+    "complete", "early-stop", "capped" (body cut at `cap` bytes) or
+    "too-large" (Content-Length above the cap; nothing read).
+    """
+    length = r.headers.get("Content-Length", "")
+    if length.isdigit() and int(length) > cap:
+        return b"", "too-large"
+    buf = bytearray()
+    seen_close = False
+    for chunk in r.iter_content(CHUNK_BYTES):
+        buf += chunk
+        if len(buf) >= cap:
+            return bytes(buf[:cap]), "capped"
+        if early_stop:
+            # cheap test on the new chunk (plus a little overlap) before the full check
+            seen_close = seen_close or b"</article>" in buf[-len(chunk) - 10:].lower()
+            if seen_close and _article_complete(bytes(buf)):
+                return bytes(buf), "early-stop"
+    return bytes(buf), "complete"
+
+# ----------------------------------------------------
+# FETCH ARTICLE
+def fetch_variants(url):
+    """
+    Default order of ways to get an article:
+    (strategy, fetch_url, page_url, headers, need_html).
+    """
+    variants = []
+    if "nytimes.com" in url:
+        amp_url = url[:-5] + ".amp.html" if url.endswith(".html") else (url.rstrip("/") + ".amp.html")
+        variants.append(("amp", amp_url, amp_url, domain_headers(amp_url), True))
+    if "washingtonpost.com" in url:
+        amp_url = url + ("&" if "?" in url else "?") + "outputType=amp"
+        variants.append(("amp", amp_url, amp_url, domain_headers(amp_url), True))
+    variants.append(("direct", url, url, domain_headers(url), True))
+    variants.append(("proxy", "https://r.jina.ai/" + url, url, None, False))
+    return variants
 
-def load_existing():
+def fetch_article(session, url, strategies=None, trace=None, parse=parse_body, archive=None):
     """
-    Load previous JSON (if exists) and CSV (if exists)
-    to continue IDs. No dedup is applied anymore.
+    Try the fetch variants in order until one yields an article. With a
+    StrategyTable the order is learned per domain (see fetch_strategy.py).
+    If `trace` is a dict, the reason a link was skipped is stored in
+    trace["error"] (e.g. "http-404", "exception:ConnectTimeout", "not-article")
+    and per-stage (stage, seconds, bytes) timings are appended to
+    trace["stages"], one (wire bytes, body bytes, outcome) per request to
+    trace["downloads"] (see scrape_metrics.py and read_body).
+    `parse(content, encoding, url, timings)` turns a body into page fields;
+    pass ParsePool.analyze to move that CPU work off the fetching thread.
+    `archive(url, body, encoding, outcome)` is called with every body read.
     """
-    existing = []
-    seen_titles = set()
-    seen_urls = set()
-    max_id = 0
+    if trace is None:
+        trace = {}
+    stages = trace.setdefault("stages", [])
+    downloads = trace.setdefault("downloads", [])
+    t0 = time.time()
+
+    def ok_payload(page, final_url):
+        row = article_row(page, final_url)
+        if row is not None:
+            row["fetched_at"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+            row["t_total_sec"] = round(time.time() - t0, 3)
+        return row
+
+    if not is_valid_url(url):
+        print(f"    skip reason: invalid-url | {url}")
+        trace["error"] = "invalid-url"
+        return None
+    if "nytimes.com" in url and any(seg in url for seg in ["/live/", "/interactive/", "/video/"]):
+        print(f"    skip reason: nyt-live-or-interactive | {url}")
+        trace["error"] = "nyt-live-or-interactive"
+        return None
+
+    variants = {v[0]: v for v in fetch_variants(url)}
+    default = list(variants)
+    plan = strategies.plan(url, default) if strategies else default
 
-    if os.path.isfile(CSV_PATH):
+    status, error, made = "NA", None, 0
+    for name in plan:
+        _, fetch_url, page_url, headers, need_html = variants[name]
+        t1 = time.perf_counter()
+        payload = None
         try:
-            with open(CSV_PATH, "r", encoding="utf-8-sig", newline="") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    existing.append({
-                        "id": int(row.get("id") or 0) if row.get("id") else None,
-                        "source": row.get("source") or "",
-                        "url": (row.get("url") or "").strip(),
-                        "title": (row.get("title") or "").strip(),
-                        "fetched_at": row.get("fetched_at") or "",
-                        "t_total_sec": float(row.get("t_total_sec") or 0) if row.get("t_total_sec") else 0,
-                        "content": row.get("content") or "",
-                        "h1": row.get("h1") or "",
-                        "h2": row.get("h2") or "",
-                    })
-                    try:
-                        iid = int(row.get("id") or 0)
-                        if iid > max_id: max_id = iid
-                    except Exception:
-                        pass
-        except Exception:
-            pass
-
-    return existing, seen_titles, seen_urls, max_id
-
-def save_csv(path, rows):
-    keys = ["id", "source", "url", "title", "fetched_at", "t_total_sec", "content", "h1", "h2"]
-    if not rows:
-        with open(path, "w", encoding="utf-8-sig", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=keys)
-            w.writeheader()
-        return
-    with open(path, "w", encoding="utf-8-sig", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=keys)
-        w.writeheader()
-        for r in rows:
-            w.writerow({k: r.get(k, "") for k in keys})
+            made += 1
+            r = session.get(fetch_url, timeout=TIMEOUT, headers=headers, stream=True)
+            with r:
+                # r.elapsed stops when the headers are parsed (after any HostLimiter
+                # wait); nothing of the body has been read at that point
+                ttfb = r.elapsed.total_seconds()
+                wait = getattr(r, "host_wait", 0.0)
+                stages.append(("ttfb", ttfb, 0))
+                if wait:
+                    stages.append(("host_wait", wait, 0))
+                if name == "direct":
+                    status = r.status_code
+                t_body = time.perf_counter()
+                if r.status_code != 200:
+                    body, outcome = b"", "skipped-status"
+                elif need_html and "text/html" not in r.headers.get("Content-Type", ""):
+                    body, outcome = b"", "skipped-type"
+                else:
+                    body, outcome = read_body(r, body_cap(fetch_url), EARLY_STOP and need_html)
+                stages.append(("download", time.perf_counter() - t_body, len(body)))
+                downloads.append((r.raw.tell(), len(body), outcome))
+            if body and archive is not None:
+                archive(page_url, body, r.encoding, outcome)
+            if body:
+                timings = {}
+                page = parse(body, r.encoding, page_url, timings)
+                stages.extend((stage, sec, 0) for stage, sec in timings.items())
+                payload = ok_payload(page, page_url)
+        except requests.RequestException as e:
+            if name == "direct":
+                error = e
+        dt = time.perf_counter() - t1
+        stages.append((f"variant:{name}", dt, 0))
+        if made > 1:
+            stages.append(("fallback", dt, 0))
+        if strategies:
+            strategies.record(url, name, payload is not None, dt)
+        if payload:
+            if strategies: strategies.record_fetch(default, name, made)
+            return payload
+
+    if strategies:
+        strategies.record_fetch(default, None, made)
+    if error is not None:
+        print(f"    skip reason: exception {error.__class__.__name__} | {url}")
+        trace["error"] = f"exception:{error.__class__.__name__}"
+    else:
+        print(f"    skip reason: bad-status-or-content-type({status}) | {url}")
+        trace["error"] = f"http-{status}" if status not in (200, "NA") else "not-article"
+    return None
 
 # ----------------------------------------------------
-# MAIN
-def main():
-    session = make_session()
+# STORAGE
+# Raw articles live in an append-only segmented store (see raw_store.py);
+# the original data.csv is adopted as its first segment. SCRAPE_RAW_DIR points
+# a run (e.g. a replay benchmark) at a different store and state directory.
+RAW_DIR = os.getenv("SCRAPE_RAW_DIR", r"./data/raw")
+STATE_DIR = os.path.join(RAW_DIR, "state")
+SEEN_INDEX_PATH = os.path.join(STATE_DIR, "seen_urls")
+NEAR_DUP_PATH = os.path.join(STATE_DIR, "near_dup")
+HTTP_CACHE_PATH = os.path.join(STATE_DIR, "http_cache.json")
+STRATEGY_PATH = os.path.join(STATE_DIR, "fetch_strategies.json")
+HEALTH_PATH = os.path.join(STATE_DIR, "site_health.json")
+METRICS_DIR = os.path.join(STATE_DIR, "metrics")
+ARCHIVE_DIR = os.path.join(RAW_DIR, "archive")
+JOURNAL_PATH = os.path.join(STATE_DIR, "run_journal.jsonl")
+
+# ----------------------------------------------------
+# CRAWL
+def discover_links(session, site, cache=None):
+    links = get_links_from_rss(session, site.get("rss"), site.get("base", ""), cache)
+    # An RSS feed that is unchanged (304 / only old items) means "no new links",
+    # not "feed broken": don't fall back to the listing page then.
+    if not links and not (cache is not None and cache.is_current(site.get("rss"))):
+        links = get_links_from_listing(session, site, cache)
+    return [strip_tracking_params(u) for u in links if is_valid_url(u)][:MAX_LINKS_PER_SITE]
 
-    existing_rows, _seen_titles, _seen_urls, max_id = load_existing()
-    print(f"Loaded existing articles: {len(existing_rows)}, max_id={max_id}")
+def unseen_links(links, seen, attempted):
+    """Drop links already stored (seen-URL index) or already tried in this run."""
+    out = []
+    for u in links:
+        key = canonical_url(u)
+        if key in attempted or (seen is not None and key in seen):
+            continue
+        attempted.add(key)
+        out.append(u)
+    return out
+
+class RunContext:
+    """Optional per-run helpers shared by both crawl modes; any of them may be None."""
+    def __init__(self, seen=None, cache=None, strategies=None, health=None, parser=None, metrics=None,
+                 dups=None, archive=None, journal=None):
+        self.seen = seen
+        self.cache = cache
+        self.strategies = strategies
+        self.health = health
+        self.parser = parser
+        self.metrics = metrics
+        self.dups = dups
+        self.archive = archive
+        self.journal = journal
+        self.dropped = 0
+        self.accepted_urls = set()  # canonical URLs for the seen index, added once the rows are stored
+
+    def active_sites(self, sites):
+        if self.health is None:
+            return list(sites)
+        out = []
+        for site in sites:
+            if self.health.should_skip(site["name"]):
+                print(f"=== {site['name'].upper()} === skipped (circuit open)")
+            else:
+                out.append(site)
+        return out
+
+def accept_article(articles, art, link, site_name, next_id, ctx):
+    """
+    Give a fetched article its id and source and add it to `articles`;
+    returns the next free id. Near-duplicates of earlier articles get
+    dup_of set, or are not added at all with SCRAPE_NEAR_DUP=drop.
+    """
+    ctx.accepted_urls.update({canonical_url(link), canonical_url(art["url"])})
+    if ctx.dups is not None:
+        sig = minhash(art["content"])
+        dup = ctx.dups.find(sig) if sig is not None else None
+        if dup is not None and NEAR_DUP_MODE == "drop":
+            ctx.dropped += 1
+            return next_id
+        if dup is not None:
+            art["dup_of"] = dup
+        elif sig is not None:
+            ctx.dups.add(sig, next_id)
+    art["id"] = next_id
+    art["source"] = site_name
+    articles.append(art)
+    return next_id + 1
+
+def discover_site(session, site, ctx):
+    if ctx.journal is not None and ctx.journal.site_done(site["name"]):
+        # finished before the interruption: its links are in the journal
+        links = ctx.journal.links(site["name"])
+        run = SiteRun(site["name"])
+        run.discovered(len(links), 0.0, False)
+        return links, run
+    t0 = time.perf_counter()
+    links = discover_links(session, site, ctx.cache)
+    run = SiteRun(site["name"])
+    unchanged = ctx.cache is not None and ctx.cache.is_current(site.get("rss"))
+    sec = time.perf_counter() - t0
+    run.discovered(len(links), sec, unchanged)
+    if ctx.metrics is not None:
+        ctx.metrics.observe_stage(site["name"], "discover", sec)
+    return links, run
 
-    all_articles = list(existing_rows)
-    next_id = max_id + 1
+def fetch_timed(session, url, ctx, site_name=None):
+    if ctx.journal is not None:
+        done = ctx.journal.result(url)
+        if done is not None:
+            art, error = done
+            return art, error, 0.0
+    trace = {}
+    t0 = time.perf_counter()
+    parse = ctx.parser.analyze if ctx.parser is not None else parse_body
+    archive = None
+    if ctx.archive is not None:
+        archive = lambda page_url, body, encoding, outcome: \
+            ctx.archive.put(page_url, body, encoding, outcome, source=site_name or "")
+    art = fetch_article(session, url, ctx.strategies, trace, parse, archive)
+    sec = time.perf_counter() - t0
+    if ctx.metrics is not None:
+        ctx.metrics.observe(site_name, url, sec, trace)
+    if ctx.journal is not None:
+        ctx.journal.record(site_name, url, art, trace.get("error"))
+    return art, trace.get("error"), sec
 
-    for site in SITES:
+def crawl_sequential(session, next_id, ctx=None):
+    ctx = ctx or RunContext()
+    articles, attempted = [], set()
+    for site in ctx.active_sites(SITES):
         print(f"\n=== {site['name'].upper()} ===")
-        links = get_links_from_rss(session, site.get("rss"), site.get("base", "")) or \
-                get_links_from_listing(session, site)
-        links = [strip_tracking_params(u) for u in links if is_valid_url(u)][:MAX_LINKS_PER_SITE]
-        print(f"Found links: {len(links)}")
+        found, run = discover_site(session, site, ctx)
+        links = unseen_links(found, ctx.seen, attempted)
+        print(f"Found links: {len(found)} ({len(found) - len(links)} already seen)")
 
         count_ok = 0
         for i, u in enumerate(links, 1):
-            art = fetch_article(session, u)
+            art, error, sec = fetch_timed(session, u, ctx, site["name"])
+            run.fetched(art is not None, sec, error)
             if art:
-                art["id"] = next_id; next_id += 1
-                art["source"] = site["name"]
-                all_articles.append(art)
+                next_id = accept_article(articles, art, u, site["name"], next_id, ctx)
                 count_ok += 1
-                print(f"[+][{site['name']}] {count_ok}/{i} ok ({art['t_total_sec']}s) id={art['id']}")
+                dup = f" dup_of={art['dup_of']}" if art.get("dup_of") is not None else ""
+                print(f"[+][{site['name']}] {count_ok}/{i} ok ({art['t_total_sec']}s) id={art.get('id', 'dropped')}{dup}")
             else:
                 print(f"[-][{site['name']}] {i} skipped")
+            t_sleep = time.perf_counter()
             time.sleep(REQUEST_DELAY_SEC)
+            if ctx.metrics is not None:
+                ctx.metrics.observe_stage(site["name"], "sleep", time.perf_counter() - t_sleep)
+        if ctx.journal is not None:
+            ctx.journal.mark_site_done(site["name"])
+        if ctx.health is not None:
+            ctx.health.record(run)
+    return articles
+
+def _interleave(site_links):
+    """Round-robin (site_idx, link_idx, url) jobs so workers spread over hosts."""
+    jobs, depth = [], max((len(links) for links in site_links), default=0)
+    for li in range(depth):
+        for si, links in enumerate(site_links):
+            if li < len(links):
+                jobs.append((si, li, links[li]))
+    return jobs
+
+def crawl_concurrent(next_id, ctx=None, workers=MAX_CONCURRENCY):
+    """
+    Same output as crawl_sequential (rows, order and ids), but sites and links
+    are fetched by a bounded thread pool. Politeness is enforced per host by a
+    shared HostLimiter; each worker thread keeps its own session.
+    """
+    ctx = ctx or RunContext()
+    sites = ctx.active_sites(SITES)
+    limiter = HostLimiter()
+    local = threading.local()
+
+    def thread_session():
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = make_session(limiter)
+        return s
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        discovered = list(pool.map(lambda site: discover_site(thread_session(), site, ctx), sites))
+        attempted = set()
+        site_links = [unseen_links(found, ctx.seen, attempted) for found, _ in discovered]
+        for site, (found, _), links in zip(sites, discovered, site_links):
+            print(f"=== {site['name'].upper()} === Found links: {len(found)} ({len(found) - len(links)} already seen)")
+        remaining = [len(links) for links in site_links]
+        if ctx.journal is not None:
+            for si in range(len(sites)):
+                if not remaining[si]:
+                    ctx.journal.mark_site_done(sites[si]["name"])
+
+        futures = {pool.submit(lambda u, name: fetch_timed(thread_session(), u, ctx, name), u, sites[si]["name"]): (si, li)
+                   for si, li, u in _interleave(site_links)}
+        results = {}
+        for fut in as_completed(futures):
+            si, li = futures[fut]
+            art, error, sec = fut.result()
+            results[(si, li)] = art
+            discovered[si][1].fetched(art is not None, sec, error)
+            name = sites[si]["name"]
+            remaining[si] -= 1
+            if ctx.journal is not None and not remaining[si]:
+                ctx.journal.mark_site_done(name)
+            if art:
+                print(f"[+][{name}] {li + 1} ok ({art['t_total_sec']}s)")
+            else:
+                print(f"[-][{name}] {li + 1} skipped")
+    if ctx.metrics is not None:
+        ctx.metrics.add_host_waits(limiter.waited)
+
+    articles = []
+    for si, site in enumerate(sites):
+        for li in range(len(site_links[si])):
+            art = results.get((si, li))
+            if art:
+                next_id = accept_article(articles, art, site_links[si][li], site["name"], next_id, ctx)
+        if ctx.health is not None:
+            ctx.health.record(discovered[si][1])
+    return articles
+
+# ----------------------------------------------------
+# MAIN
+def recover_committed(journal, store, seen, dups):
+    """
+    An interrupted run whose segment already reached the store (crash during
+    the commit): add its rows to the seen-URL and near-duplicate indexes.
+    """
+    rows = [r for r in store.iter_rows() if r["id"] is not None and r["id"] > journal.base_id]
+    seen.update(canonical_url(r["url"]) for r in rows if r["url"])
+    seen.update(canonical_url(link) for link in journal.article_links())
+    if dups is not None:
+        dups.seed(r for r in rows if r.get("dup_of") is None)
+    print(f"Recovered indexes for {len(rows)} rows of the interrupted run started {journal.started_at[:19]}")
+
+def main():
+    store = RawStore(RAW_DIR)
+    print(f"Raw store: {store.row_count} articles in {len(store.segments)} segments, max_id={store.max_id}")
+    next_id = store.max_id + 1
+
+    seen = SeenUrlIndex(SEEN_INDEX_PATH)
+    if seen.is_new:
+        n = seen.update(canonical_url(r["url"]) for r in store.iter_rows() if r["url"])
+        print(f"Seeded seen-URL index with {n} stored URLs")
+
+    dups = None
+    if NEAR_DUP_MODE != "off":
+        dups = NearDupIndex(NEAR_DUP_PATH)
+        if dups.is_new:
+            print(f"Seeded near-duplicate index with {dups.seed(store.iter_rows())} stored articles")
+
+    journal = RunJournal(JOURNAL_PATH)
+    if journal.exists and journal.base_id != store.max_id:
+        recover_committed(journal, store, seen, dups)
+        journal.discard()
+    elif journal.exists:
+        print(journal.summary())
+    journal.start(store.max_id)
 
-    print(f"\nTOTAL articles after merge: {len(all_articles)}")
+    ctx = RunContext(
+        seen=seen,
+        cache=FeedCache(HTTP_CACHE_PATH),
+        strategies=StrategyTable(STRATEGY_PATH),
+        health=HealthLedger(HEALTH_PATH),
+        parser=ParsePool(PARSE_WORKERS) if PARSE_WORKERS > 0 else None,
+        metrics=Metrics(),
+        dups=dups,
+        archive=HtmlArchive(ARCHIVE_DIR) if ARCHIVE_PAGES else None,
+        journal=journal,
+    )
 
-    # Save CSV
+    t_start = time.perf_counter()
     try:
-        save_csv(CSV_PATH, all_articles)
-        print(f"Saved CSV : {CSV_PATH}")
-    except Exception as e:
-        print(f"Error saving CSV: {e}")
+        try:
+            if SCRAPE_MODE == "concurrent":
+                new_articles = crawl_concurrent(next_id, ctx)
+            else:
+                new_articles = crawl_sequential(make_session(), next_id, ctx)
+        finally:
+            if journal.resumed_links:
+                print(f"Journal: {journal.resumed_links} links taken from the interrupted run")
+            if ctx.parser is not None:
+                print(ctx.parser.summary())
+                ctx.parser.close()
+            if ctx.archive is not None:
+                print(ctx.archive.summary())
+                ctx.archive.close()
+        for helper in (ctx.cache, ctx.strategies, ctx.health):
+            helper.save()
+            print(helper.summary())
+        elapsed = time.perf_counter() - t_start
+
+        rate = len(new_articles) / elapsed if elapsed > 0 else 0.0
+        print(ctx.metrics.report())
+        path = ctx.metrics.write(METRICS_DIR, mode=SCRAPE_MODE, articles=len(new_articles),
+                                 elapsed_sec=round(elapsed, 3), parse_workers=PARSE_WORKERS, parser=PARSER_ENGINE)
+        print(f"Metrics: {path}")
+        print(f"\nRun ({SCRAPE_MODE}): {len(new_articles)} articles in {elapsed:.1f}s ({rate:.2f} articles/sec)")
+
+        # Commit: the rows go into the store as a new segment first, then into the
+        # indexes that mark them as stored, and only then is the journal dropped.
+        # Small segments are compacted in the background afterwards.
+        try:
+            seg = store.append_segment(new_articles)
+            if seg:
+                print(f"Saved segment: {seg['name']} ({seg['rows']} rows, ids {seg['min_id']}..{seg['max_id']})")
+            print(f"TOTAL articles in store: {store.row_count}")
+            seen.update(ctx.accepted_urls)
+            if dups is not None:
+                dups.commit()
+            journal.finish()
+            store.compact_in_background()  # non-daemon: finishes before the process exits
+        except Exception as e:
+            print(f"Error saving segment: {e} (the run journal is kept; the next run resumes from it)")
+    finally:
+        print(f"Seen-URL index: {len(seen)} URLs, {seen.hits} links skipped this run")
+        seen.close()
+        if dups is not None:
+            action = f"{ctx.dropped} dropped" if NEAR_DUP_MODE == "drop" else f"{dups.hits} marked"
+            print(f"Near-duplicates: {action}, {len(dups)} articles indexed")
+            dups.close()
 
-main()
+if __name__ == "__main__":
+    main()